@@ -2,6 +2,8 @@
 
 #define BAUD_RATE 115200  // Default baud rate from manual
 
+bool binaryMode = true; // forward binary frames as raw bytes, has to match BINARY_PROTOCOL of CanSat_real_time.py
+
 // Define the frequency to be set (in Hz)
 long frequency = 868210000;  // Example: 868.210 MHz
 
@@ -9,6 +11,7 @@ SoftwareSerial Serial1(6, 7);
 
 void readResponse(bool isHex=false);
 String hexToString(String& hexInput);
+void writeHexAsBytes(String& hexInput);
 
 void setup() {
   Serial.begin(9600);           // Start serial communication for feedback
@@ -73,6 +76,11 @@ void loop() {
 void readResponse(bool isHex=false) {
   if (Serial1.available()) {
     String response = Serial1.readStringUntil('\n');  // Read response line by line
+    if (isHex && binaryMode && response.startsWith("radio_rx ")) {
+      // Only the frame goes to the computer, the decoder skips everything else anyway
+      writeHexAsBytes(response);
+      return;
+    }
     Serial.print("Module Response: ");
     Serial.println(response);
     if(isHex) {
@@ -95,4 +103,14 @@ String hexToString(String& hexInput) {
     textString += charValue;
   }
   return textString;
+}
+
+void writeHexAsBytes(String& hexInput) {
+  // Remove "radio_rx " from the input string
+  hexInput.remove(0, 9);
+  hexInput.trim();
+  for (int i = 0; i + 1 < hexInput.length(); i += 2) {
+    char hexChar[3] = {hexInput[i], hexInput[i + 1], '\0'};
+    Serial.write((uint8_t) strtol(hexChar, NULL, 16));
+  }
 }
\ No newline at end of file
@@ -10,6 +10,7 @@
 //Modes of software
 bool restrictedMode = false;
 bool sdCardSaveMode = true;
+bool binaryMode = true; // send binary frames instead of text lines, has to match BINARY_PROTOCOL of CanSat_real_time.py
 
 //pin setup
 BMP280 bmp280;    /// SCL A5, SDA A4, 3,3V.
@@ -21,11 +22,38 @@ SoftwareSerial loraSerial(6, 7); // RX, TX
 // The TinyGPS++ object
 TinyGPSPlus gps;
 
-void bmp280Measurement(float& altitudeArg, char* bmp280Data, size_t dataSize);
+// Binary frame format, keep it in sync with program_files/protocol.py
+const uint8_t FRAME_SYNC[2] = {0xCA, 0x5A};
+const uint8_t BMP280_ID = 1;
+const uint8_t DHT11_ID = 2;
+const uint8_t GPS_ID = 3;
+const size_t FRAME_HEADER_SIZE = 9; // sync, sensor id, sequence, time
+const size_t MAX_PAYLOAD_SIZE = 17;
+
+struct __attribute__((packed)) Bmp280Payload {
+  float temperature;
+  float pressure;
+  float altitude;
+};
+
+struct __attribute__((packed)) GpsPayload {
+  int32_t latitude;  // microdegrees
+  int32_t longitude; // microdegrees
+  float altitude;
+  float speed;
+  uint8_t satellites;
+};
+
+uint16_t frameSequence = 0;
+
+void bmp280Measurement(float& altitudeArg, Bmp280Payload& payload, char* bmp280Data, size_t dataSize);
 void dht11Measurement(char* dht11Data, size_t dataSize);
 void gpsMeasurement(char* gpsData, size_t dataSize, const bool mode);
 void saveData(const char* data);
 void sendLine(const char* input, char* data, size_t dataSize);
+bool gpsFrameData(GpsPayload& payload);
+void sendFrame(uint8_t sensorId, const void* payload, size_t payloadSize);
+uint16_t crc16(const uint8_t* data, size_t length);
 void readResponse();
 
 char fileName[13];
@@ -84,9 +112,14 @@ void loop()
   Serial.println("loop");
   float currentAltitude = 0.0;
   char data[80];
-  bmp280Measurement(currentAltitude, data, sizeof(data));
+  Bmp280Payload bmp280Payload;
+  bmp280Measurement(currentAltitude, bmp280Payload, data, sizeof(data));
   saveData(data);
-  sendLine(data, data, sizeof(data));
+  if (binaryMode) {
+    sendFrame(BMP280_ID, &bmp280Payload, sizeof(bmp280Payload));
+  } else {
+    sendLine(data, data, sizeof(data));
+  }
   memset(data, 0, sizeof(data));
   readResponse();
 
@@ -97,8 +130,15 @@ void loop()
   gpsMeasurement(data, sizeof(data), true);
   saveData(data);
   memset(data, 0, sizeof(data));
-  gpsMeasurement(data, sizeof(data), false);
-  sendLine(data, data, sizeof(data));
+  if (binaryMode) {
+    GpsPayload gpsPayload;
+    if (gpsFrameData(gpsPayload)) {
+      sendFrame(GPS_ID, &gpsPayload, sizeof(gpsPayload));
+    }
+  } else {
+    gpsMeasurement(data, sizeof(data), false);
+    sendLine(data, data, sizeof(data));
+  }
   readResponse();
 
   if (previousAltitude + 1 > currentAltitude || previousAltitude - 1 < currentAltitude) {
@@ -107,7 +147,7 @@ void loop()
   previousAltitude = currentAltitude;
 }
 
-void bmp280Measurement(float& altitudeArg, char* bmp280Data, size_t dataSize)
+void bmp280Measurement(float& altitudeArg, Bmp280Payload& payload, char* bmp280Data, size_t dataSize)
 {
   Serial.println("bmp");
   bmp280.awaitMeasurement();
@@ -128,6 +168,9 @@ void bmp280Measurement(float& altitudeArg, char* bmp280Data, size_t dataSize)
   bmp280Data[dataSize - 1] = '\0'; // Ensure null-termination
   Serial.println(bmp280Data);
   altitudeArg = altitude;
+  payload.temperature = temperature;
+  payload.pressure = pressure;
+  payload.altitude = altitude;
 }
 
 void dht11Measurement(char* dht11Data, size_t dataSize)
@@ -207,6 +250,69 @@ void sendLine(const char* input, char* data, size_t dataSize) {
   loraSerial.println(cmd);
 }
 
+bool gpsFrameData(GpsPayload& payload)
+{
+  if (!gps.location.isValid()) {
+    return false;
+  }
+  payload.latitude = (int32_t)(gps.location.lat() * 1000000.0);
+  payload.longitude = (int32_t)(gps.location.lng() * 1000000.0);
+  payload.altitude = gps.altitude.meters();
+  payload.speed = gps.speed.mps();
+  payload.satellites = gps.satellites.value();
+  return true;
+}
+
+uint16_t crc16(const uint8_t* data, size_t length) {
+  // CRC-16/CCITT-FALSE, the same as binascii.crc_hqx(data, 0xFFFF) in Python
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < length; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+void sendFrame(uint8_t sensorId, const void* payload, size_t payloadSize) {
+  Serial.println("frame");
+  if (millis() - lastTransmissionTime < 4000) {
+    return;
+  } else {
+    lastTransmissionTime = millis();
+  }
+  if (payloadSize > MAX_PAYLOAD_SIZE) {
+    Serial.println(F("payload too long"));
+    return;
+  }
+  // The AVR is little-endian, so the integers can be copied as they are stored in memory
+  uint8_t frame[FRAME_HEADER_SIZE + MAX_PAYLOAD_SIZE + 2];
+  uint32_t now = millis();
+  frame[0] = FRAME_SYNC[0];
+  frame[1] = FRAME_SYNC[1];
+  frame[2] = sensorId;
+  memcpy(&frame[3], &frameSequence, sizeof(frameSequence));
+  memcpy(&frame[5], &now, sizeof(now));
+  memcpy(&frame[FRAME_HEADER_SIZE], payload, payloadSize);
+  size_t frameSize = FRAME_HEADER_SIZE + payloadSize;
+  uint16_t crc = crc16(frame, frameSize);
+  memcpy(&frame[frameSize], &crc, sizeof(crc));
+  frameSize += sizeof(crc);
+  frameSequence++;
+
+  // The radio tx command of the module expects the payload as hex, the radio itself transmits the raw bytes
+  char cmd[20 + sizeof(frame) * 2];
+  size_t cmdLength = snprintf(cmd, sizeof(cmd), "radio tx ");
+  for (size_t i = 0; i < frameSize; i++) {
+    cmdLength += snprintf(&cmd[cmdLength], sizeof(cmd) - cmdLength, "%02X", frame[i]);
+  }
+  snprintf(&cmd[cmdLength], sizeof(cmd) - cmdLength, " 1\r\n");
+
+  Serial.println(cmd);
+  loraSerial.println(cmd);
+}
+
 void readResponse() {
   Serial.println("res");
   char response[50];
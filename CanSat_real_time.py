@@ -4,12 +4,25 @@ This file is used to plot the data from a serial port and save it to a text file
 
 __author__ = 'KarmaDemon'
 
-TEST_MODE = False
+TEST_MODE = False # replays a synthetic flight through the serial path instead of opening SERIAL_PORT
+TEST_RATE = 20 # messages per second in test mode
 
 try:
     from program_files.cansattools import logger_creator as logger_creator
-    from program_files.cansattools import test_data_generator as test_data_generator
+    from program_files.cansattools import start_queue_logging
+    from program_files.serial_reader import SerialReader
+    from program_files.live_plot import LivePlot
+    from program_files.ring_buffer import RingBuffer
+    from program_files.protocol import FrameDecoder, Frame, frame_to_line
+    from program_files.line_parser import LineParser, ParsedLine
+    from program_files.db_writer import BulkWriter
+    from program_files.refinement import OnlineRefiner
+    from program_files.metrics import PipelineMetrics
+    from program_files.raw_archive import RawArchive
+    from program_files import replay, flight_generator
     logger = logger_creator("CanSat_real_time")
+    # The log file is written by a background thread, the plot and the serial reader never wait for the disk
+    start_queue_logging()
 except ImportError:
     print("Error setting up logger. Cansattools can't be imported. Logging is disabled.")
     logger = None
@@ -19,93 +32,212 @@ try:
     import random
     import matplotlib.pyplot as plt
     import matplotlib.animation as animation
+    import numpy as np
+    from time import perf_counter, monotonic
     import mplleaflet
 except ImportError as e:
     logger.error("Error importing module: {e}")
 
 SERIAL_PORT = 'COM3'
 BAUD_RATE = 9600
+BINARY_PROTOCOL = True # has to match binaryMode of the Arduino sketches
+SERIAL_TIMEOUT = 0.5 # seconds, lets the reader thread notice when it has to stop
+READER_CAPACITY = 4096 # lines kept while the plot is busy redrawing
+ONLINE_REFINEMENT = True # outliers are hidden on the plot and every sample is flagged in the live database
+LIVE_WINDOW = 50000 # number of samples per sensor shown on the plot, the raw file keeps everything
+LIVE_DOWNSAMPLING = "minmax" # the lines only get about 2 points per pixel column of the visible range ("minmax" or "lttb"), None draws every sample
+BLIT = True # only redraw the lines on every frame, turn it off if the backend doesn't support blitting
 FILE_NAME = "datas/raw_data.txt"
+LIVE_DATABASE_NAME = "datas/live_data.db" # the received measurements are also written here during the flight, None disables it
+METRICS_FILE = "datas/metrics.jsonl" # the latency percentiles and queue depths are appended here every few seconds, None disables it
+LATENCY_WARNING = 2000 # ms, the status line turns red if 5% of the messages need more time than this from the radio to the plot
+RAW_ARCHIVE_DIRECTORY = "datas/raw_realtime" # every session writes new segments here, the previous sessions are kept
+ARCHIVE_SEGMENT_SIZE = 16 * 2**20 # bytes, a new (and the closed one is gzipped) segment is started after this size
+ARCHIVE_FSYNC_LINES = 100 # the archive is synced to the disk after this many lines..., None disables it
+ARCHIVE_FSYNC_INTERVAL = 1.0 # ...or after this many seconds, None disables it
 
 fig = plt.figure()
 fig_manager = plt.get_current_fig_manager()
 fig_manager.set_window_title('Real time data visualization')
-if not TEST_MODE:
-    try:
-        ser = serial.Serial(SERIAL_PORT,BAUD_RATE)
-    except serial.SerialException as e:
-        logger.error(f"Error opening serial port: {e}", exc_info=True)
+# The third row is reserved for the GPS map
+live_plot = LivePlot(fig, [('Time(ms)', 'Temperature(deg C)', 'yo-'), ('Time(ms)', 'Altitude(m)', 'go-')], rows=3, downsampling=LIVE_DOWNSAMPLING)
+metrics = PipelineMetrics(metrics_file=METRICS_FILE)
+# The frames or lines are decoded and validated on the reader thread, the plot only gets valid telemetry
+decoder = FrameDecoder() if BINARY_PROTOCOL else LineParser()
+try:
+    # Every received byte (including the damaged ones) is queued to the archive by the reader thread,
+    # the decoded lines are archived separately in the text format of txt_to_db. Both are written on their own threads
+    received_archive = RawArchive(RAW_ARCHIVE_DIRECTORY, "received", ".bin" if BINARY_PROTOCOL else ".txt", ARCHIVE_SEGMENT_SIZE,
+                                  fsync_lines=ARCHIVE_FSYNC_LINES, fsync_interval=ARCHIVE_FSYNC_INTERVAL)
+    file = RawArchive(RAW_ARCHIVE_DIRECTORY, "raw_realtime_data", ".txt", ARCHIVE_SEGMENT_SIZE,
+                      fsync_lines=ARCHIVE_FSYNC_LINES, fsync_interval=ARCHIVE_FSYNC_INTERVAL)
+except OSError as e:
+    logger.error(f"Error opening the raw archive: {e}", exc_info=True)
+    received_archive = file = None
 try:
-    file = open("datas/raw_realtime_data.txt",'w')
-except IOError as e:
-    logger.error(f"Error opening file: {e}", exc_info=True)
-    file = None
-
-time: list[int] = []
-temperature: list[float] = []
-altitude: list[float] = []
-time2: list[int] = []
-longitude: list[float] = []
-latitude: list[float] = []
-
-def animate(frame) -> None:
+    if TEST_MODE:
+        ser = replay.FakeSerial(SERIAL_TIMEOUT)
+        replayer = replay.Replayer(ser, replay.messages_from_flight(flight_generator.generate_flight(), BINARY_PROTOCOL), TEST_RATE)
+        replayer.start()
+    else:
+        ser = serial.Serial(SERIAL_PORT,BAUD_RATE, timeout=SERIAL_TIMEOUT)
+    reader = SerialReader(ser, READER_CAPACITY, binary=BINARY_PROTOCOL, parser=decoder, metrics=metrics, archive=received_archive)
+    reader.start()
+except serial.SerialException as e:
+    logger.error(f"Error opening serial port: {e}", exc_info=True)
+    # The window still opens and shows the error, nothing is received
+    ser = reader = None
+db_writer = None
+if LIVE_DATABASE_NAME is not None:
+    try:
+        db_writer = BulkWriter(LIVE_DATABASE_NAME)
+    except Exception as e:
+        logger.error(f"Error opening the live database: {e}", exc_info=True)
+
+status = live_plot.axes[0].text(0.01, 0.98, "", transform=live_plot.axes[0].transAxes, va="top", fontsize=7, family="monospace",
+                                bbox=dict(facecolor="white", alpha=0.7, edgecolor="none"))
+last_dropped = 0 # reader.dropped_lines at the last frame, the counter is only written by the reader thread
+
+bmp280_buffer = RingBuffer({"time": np.int64, "temperature": np.float64, "altitude": np.float64}, LIVE_WINDOW)
+gps_buffer = RingBuffer({"time": np.int64, "longitude": np.float64, "latitude": np.float64}, LIVE_WINDOW)
+bmp280_refiner = OnlineRefiner(["temperature", "pressure", "altitude"])
+gps_refiner = OnlineRefiner(["latitude", "longitude", "altitude"])
+
+def store_bmp280(time: int, temp: float, pressure: float, alt: float) -> None:
+    """
+    Refines a BMP280 sample, adds it to the plot and to the live database.
+    Outliers are stored as NaN in the plot buffer, so they show up as gaps in the lines.
+    """
+    start = perf_counter()
+    missing_data, (temperature_outlier, pressure_outlier, altitude_outlier) = bmp280_refiner.update(time, (temp, pressure, alt)) if ONLINE_REFINEMENT else (False, (False, False, False))
+    refined = perf_counter()
+    bmp280_buffer.append(time, np.nan if temperature_outlier else temp, np.nan if altitude_outlier else alt)
+    buffered = perf_counter()
+    if db_writer is not None:
+        db_writer.add("BMP280", (time, temp, pressure, alt, missing_data, temperature_outlier, pressure_outlier, altitude_outlier),
+                      ("Time", "Temperature", "Pressure", "Height", "MissingData", "IsTemperatureOutlier", "IsPressureOutlier", "IsHeightOutlier"))
+        metrics.record("db_write", perf_counter() - buffered)
+    metrics.record("refine", refined - start)
+    metrics.record("buffer", buffered - refined)
+
+def store_gps(time: int, lat: float, long: float, alt: float) -> None:
+    """
+    Refines a GPS sample, adds it to the plot and to the live database.
+    """
+    start = perf_counter()
+    missing_data, (latitude_outlier, longitude_outlier, altitude_outlier) = gps_refiner.update(time, (lat, long, alt)) if ONLINE_REFINEMENT else (False, (False, False, False))
+    refined = perf_counter()
+    if not (latitude_outlier or longitude_outlier):
+        gps_buffer.append(time, long, lat)
+    buffered = perf_counter()
+    if db_writer is not None:
+        db_writer.add("GPS", (time, lat, long, alt, missing_data, latitude_outlier, longitude_outlier, altitude_outlier),
+                      ("Time", "Latitude", "Longitude", "Altitude", "MissingData", "IsLatitudeOutlier", "IsLongitudeOutlier", "IsAltitudeOutlier"))
+        metrics.record("db_write", perf_counter() - buffered)
+    metrics.record("refine", refined - start)
+    metrics.record("buffer", buffered - refined)
+
+def process_line(parsed: ParsedLine) -> None:
+    """
+    Stores the values of a validated text line and saves it to the raw file.
+    :param parsed: ParsedLine
+    :return: None
+    """
+    values = dict(zip(parsed.columns, parsed.values))
+    if parsed.sensor == "BMP280":
+        store_bmp280(values["Time"], values["Temperature"], values["Pressure"], values["Height"])
+    elif parsed.sensor == "DHT11":
+        if db_writer is not None:
+            db_writer.add("DHT11", parsed.values, parsed.columns)
+    elif parsed.sensor == "GPS":
+        store_gps(values["Time"], values["Latitude"], values["Longitude"], values.get("Altitude", np.nan))
+    if file is not None:
+        file.write(parsed.line)
+
+def process_frame(frame: Frame) -> None:
+    """
+    Stores the values of a decoded binary frame and saves it to the raw file in the text format.
+    :param frame: Frame
+    :return: None
+    """
+    if frame.sensor == "BMP280":
+        temp, pressure, alt = frame.values
+        store_bmp280(frame.time, temp, pressure, alt)
+    elif frame.sensor == "DHT11":
+        temp, humidity = frame.values
+        if db_writer is not None:
+            db_writer.add("DHT11", (frame.time, temp, humidity), ("Time", "Temperature", "Humidity"))
+    elif frame.sensor == "GPS":
+        lat, long, altitude2, speed, sat_number = frame.values
+        store_gps(frame.time, lat, long, altitude2)
+    if file is not None:
+        file.write(frame_to_line(frame))
+
+def animate(frame) -> list:
     """
     This function is called periodically from FuncAnimation
     :param frame: int
-    :return: None
+    :return: list of the updated artists
     """
-    if not TEST_MODE:
-        try:
-            message: bytes = ser.readline()
-        except serial.SerialException as e:
-            logger.error(f"Error reading serial port: {e}")
-            return
-        # message has the following format: time temperature altitude\n
-        line_str = message.decode()  
-        line = line_str.split()  # decode bytes to string and split by whitespace
-        print(line)
-        if len(line) == 5:  # check if the message has the correct format
-            sensor_name, alt, pressure, temp, i = line
-            if not sensor_name == 'ERROR':
-                time.append(int(i))
-                temperature.append(float(temp))
-                altitude.append(float(alt))
-        elif len(line) == 7:
-            sensor_name, long, lat, altitude2, speed, sat_number, i = line
-            if not sensor_name == 'ERROR':
-                time2.append(int(i))
-                longitude.append(float(long))
-                latitude.append(float(lat))
-        file.write(line_str)
-        file.write("\n")
-    else:
-        if random.randint(0, 100)==0:
-            time.append(test_data_generator(time[:-1], 3000000, 0, 20, True))
-            temperature.append(test_data_generator(temperature[:-1], 100, -100, 5))
-            altitude.append(test_data_generator(altitude[:-1], 1000, 20, 20))
-        if random.randint(0, 1000)==0:
-            time2.append(test_data_generator(time2[:-1], 3000000, 0, 20, True))
-            longitude.append(test_data_generator(longitude[:-1], 90, -90, 20))
-            latitude.append(test_data_generator(latitude[:-1], 1000, 20, 20))
-
-    plt.subplot(3, 1, 1)
-    plt.plot(time, temperature, 'yo-')
-    plt.xlabel('Time(ms)')
-    plt.ylabel('Temperature(deg C)')
-
-    plt.subplot(3, 1, 2)
-    plt.plot(time, altitude, 'go-')
-    plt.xlabel('Time(ms)')
-    plt.ylabel('Altitude(m)')
+    global last_dropped
+    if reader is None:
+        status.set_text(f"The serial port {SERIAL_PORT} can't be opened, see the log")
+        status.set_color("red")
+        return [status]
+    # The reader thread keeps draining the port, here we only process what arrived since the last frame
+    messages = reader.drain_timed()
+    drained = monotonic()
+    metrics.record_many("read", [drained - arrival for arrival, _ in messages])
+    for arrival, message in messages:
+        if BINARY_PROTOCOL:
+            process_frame(message)
+        else:
+            process_line(message)
+    dropped = reader.dropped_lines
+    if dropped > last_dropped:
+        logger.warning(f"{dropped - last_dropped} lines were dropped, the plot can't keep up with the serial port")
+        last_dropped = dropped
 
     """plt.subplot(3, 1, 3)
-    plt.scatter(longitude, latitude, c='blue', marker='o')
+    plt.scatter(gps_buffer["longitude"], gps_buffer["latitude"], c='blue', marker='o')
     plt.xlabel('Longitude')
     plt.ylabel('Latitude')
     mplleaflet.display(fig=fig)"""
 
-ani = animation.FuncAnimation(fig, animate, interval=1000, cache_frame_data=False)
+    start = perf_counter()
+    artists = live_plot.update([(bmp280_buffer["time"], bmp280_buffer["temperature"]), (bmp280_buffer["time"], bmp280_buffer["altitude"])])
+    metrics.record("render", perf_counter() - start)
+    rendered = monotonic()
+    metrics.record_many("end_to_end", [rendered - arrival for arrival, _ in messages])
+
+    metrics.set_queue_depth("serial", len(reader.buffer))
+    metrics.set_queue_depth("db", db_writer.pending_rows if db_writer is not None else 0)
+    metrics.set_queue_depth("decoder_bytes", decoder.pending_bytes)
+    metrics.set_queue_depth("archive", sum(archive.pending_writes for archive in (received_archive, file) if archive is not None))
+    if BINARY_PROTOCOL:
+        metrics.set_counter("crc_errors", decoder.crc_errors)
+        metrics.set_counter("lost_frames", decoder.lost_frames)
+    else:
+        for reason, count in decoder.rejects.items():
+            metrics.set_counter(reason, count)
+    metrics.set_counter("dropped", last_dropped)
+    status.set_text(metrics.status_text())
+    end_to_end = metrics.percentiles("end_to_end")
+    status.set_color("red" if end_to_end is not None and end_to_end[1] > LATENCY_WARNING else "black")
+    metrics.maybe_write()
+    return artists + [status]
+
+ani = animation.FuncAnimation(fig, animate, init_func=live_plot.init, interval=1000, blit=BLIT, cache_frame_data=False)
 plt.show()
-if not TEST_MODE:
+if TEST_MODE:
+    replayer.stop()
+if reader is not None:
+    reader.stop()
     ser.close()
-file.close()
\ No newline at end of file
+if db_writer is not None:
+    db_writer.close()
+metrics.close()
+if file is not None:
+    file.close()
+if received_archive is not None:
+    received_archive.close()
\ No newline at end of file
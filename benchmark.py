@@ -0,0 +1,351 @@
+"""
+This file benchmarks the ground station pipeline offline, on synthetic flights of fixed sizes.
+
+Every stage (parse, decode, insert, load, refine, analysis, plot export) is timed separately and its
+throughput and peak memory are reported. The results can be saved as a baseline and later runs
+can be compared against it, so it's visible whether a change helped or hurt.
+
+Usage:
+    python benchmark.py                          # every size, prints the results
+    python benchmark.py --sizes small medium     # only the given sizes
+    python benchmark.py --save-baseline          # stores the results in datas/benchmark_baseline.json
+    python benchmark.py --compare                # compares with the stored baseline, exits with 1 on a regression
+    python benchmark.py --check                  # only runs the correctness checks, exits with 1 on a failure
+"""
+
+__author__ = "KarmaDemon"
+
+# Number of BMP280 samples of every dataset size (DHT11 and GPS are sampled less often), the seed is fixed
+SIZES = {"small": 10_000, "medium": 100_000, "large": 1_000_000}
+SEED = 2024
+# The stages which build per-sample objects are skipped above this size, they would need gigabytes
+OBJECT_LIMIT = 200_000
+BASELINE_FILE = "datas/benchmark_baseline.json"
+TOLERANCE = 0.2 # a stage is a regression if it's more than 20% slower than the baseline
+
+import sys
+
+try:
+    import program_files.cansattools as cansattools
+    logger = cansattools.logger_creator("benchmark")
+except ImportError:
+    print("The benchmark failed. The cansattools module can't be imported.")
+    sys.exit(1)
+
+try:
+    import os
+    import gc
+    import json
+    import time
+    import platform
+    import tempfile
+    import tracemalloc
+    import numpy as np
+    import matplotlib.pyplot as plt
+    import program_files.classes as classes
+    import program_files.refinement as refinement
+    import program_files.kinematics as kinematics
+    import program_files.flight_generator as flight_generator
+    import program_files.replay as replay
+    from program_files.db_writer import line_to_row
+    from program_files.protocol import FrameDecoder, SYNC, encode_frame
+    from program_files.refinement import OnlineRefiner
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+    sys.exit(1)
+
+DATABASE_NAME = "benchmark.db"
+
+def prepare(size: int) -> dict:
+    """
+    Generates the synthetic flight of a dataset and its text and binary form. Not timed.
+    """
+    # About `size` BMP280 samples, the other sensors are sampled less often
+    flight = flight_generator.generate_flight(duration=size * flight_generator.INTERVALS["BMP280"] / 1000, seed=SEED)
+    return {
+        "flight": flight,
+        "lines": flight_generator.flight_to_lines(flight),
+        "frames": b"".join(replay.messages_from_flight(flight, binary=True)),
+        "samples": len(flight.bmp280) + len(flight.dht11) + len(flight.gps),
+    }
+
+def stage_parse(context: dict) -> int:
+    rows = [line_to_row(line) for line in context["lines"]]
+    return len(rows)
+
+def stage_decode(context: dict) -> int:
+    decoder = FrameDecoder()
+    frames = context["frames"]
+    count = 0
+    # The serial reader delivers the bytes in chunks
+    for start in range(0, len(frames), 4096):
+        count += len(decoder.feed(frames[start:start + 4096]))
+    return count
+
+def stage_insert(context: dict) -> int:
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(f"datas/{DATABASE_NAME}{suffix}"):
+            os.remove(f"datas/{DATABASE_NAME}{suffix}")
+    cansattools.txt_to_db(context["lines"], DATABASE_NAME)
+    return len(context["lines"])
+
+def stage_load(context: dict) -> int:
+    database = f"datas/{DATABASE_NAME}"
+    context["bmp280"] = classes.BMP280Columns.load(database)
+    context["dht11"] = classes.DHT11Columns.load(database)
+    context["gps"] = classes.GPSColumns.load(database)
+    return len(context["bmp280"]) + len(context["dht11"]) + len(context["gps"])
+
+def stage_load_objects(context: dict) -> int:
+    objects = classes.BMP280Columns.load(f"datas/{DATABASE_NAME}").objects()
+    return len(objects)
+
+def stage_refine(context: dict) -> int:
+    bmp280, dht11, gps = context["bmp280"], context["dht11"], context["gps"]
+    refinement.refine_columns(bmp280, outlier_threshold=(18, 11), lacking_data_threshold=1000, split_index=refinement.apogee_index(bmp280["height"]))
+    refinement.refine_columns(dht11, lacking_data_threshold=10000)
+    refinement.refine_columns(gps, lacking_data_threshold=10000)
+    return len(bmp280) + len(dht11) + len(gps)
+
+def stage_refine_data(context: dict) -> int:
+    objects = context["flight"].bmp280.objects()
+    for attribute_name in ("temperature", "pressure", "height"):
+        cansattools.refine_data(objects, attribute_name)
+    return len(objects)
+
+def stage_analysis(context: dict) -> int:
+    bmp280 = context["bmp280"]
+    bmp280.calculate_speed()
+    bmp280.calculate_acceleration()
+    refinement.apogee_index(bmp280["height"])
+    return len(bmp280)
+
+def stage_kinematics(context: dict) -> int:
+    bmp280 = context["bmp280"]
+    kinematics.derive_kinematics(bmp280, method="savgol")
+    return len(bmp280)
+
+def stage_plot_export(context: dict) -> int:
+    bmp280 = context["bmp280"]
+    fig, axs = plt.subplots(3, figsize=(8, 12))
+    for ax, name in zip(axs, ("temperature", "pressure", "height")):
+        ax.plot(bmp280["time"], bmp280[name], '-')
+        ax.set_xlabel('Time')
+        ax.set_ylabel(name.capitalize())
+    plt.tight_layout()
+    cansattools.save_graph(fig, "BMP_benchmark")
+    plt.close(fig)
+    return len(bmp280)
+
+# name: (function, uses per-sample objects)
+STAGES = {
+    "parse": (stage_parse, False),
+    "decode": (stage_decode, False),
+    "insert": (stage_insert, False),
+    "load": (stage_load, False),
+    "load_objects": (stage_load_objects, True),
+    "refine": (stage_refine, False),
+    "refine_data": (stage_refine_data, True),
+    "analysis": (stage_analysis, False),
+    "kinematics": (stage_kinematics, False),
+    "plot_export": (stage_plot_export, False),
+}
+
+def check_online_refinement() -> list[str]:
+    """
+    The live refiner must not flag the steady climb of a clean flight (only the launch itself, where the
+    synthetic climb rate jumps from zero, may flag a sample), and it must still find the injected spikes.
+    """
+    failures = []
+    for seed in range(5):
+        clean = flight_generator.generate_flight(duration=60, seed=seed, spike_rate=0)
+        spiky = flight_generator.generate_flight(duration=60, seed=seed)
+        for data, attribute_names in ((clean.bmp280, ("temperature", "pressure", "height")), (clean.gps, ("latitude", "longitude", "altitude"))):
+            flags = _online_flags(data, attribute_names)
+            # From a second after the launch (10 s) to the apogee (22 s)
+            ascent = (data["time"] >= 11000) & (data["time"] <= 22000)
+            for name in attribute_names:
+                if flags[name][ascent].any():
+                    failures.append(f"seed {seed}: {int(flags[name][ascent].sum())} {data.table_name} {name} values of the clean ascent are flagged")
+        for data, attribute_names in ((spiky.bmp280, ("temperature", "pressure", "height")),):
+            flags = _online_flags(data, attribute_names)
+            for name in attribute_names:
+                spikes = spiky.spikes[data.table_name][name]
+                found = int((flags[name] & spikes).sum())
+                if found < 0.9 * spikes.sum():
+                    failures.append(f"seed {seed}: only {found} of the {int(spikes.sum())} {data.table_name} {name} spikes are flagged")
+    return failures
+
+def _online_flags(data, attribute_names: tuple[str, ...]) -> dict[str, np.ndarray]:
+    refiner = OnlineRefiner(list(attribute_names))
+    columns = [data[name] for name in attribute_names]
+    flags = np.array([refiner.update(int(time), tuple(float(column[i]) for column in columns))[1] for i, time in enumerate(data["time"])], dtype=np.bool_)
+    return {name: flags[:, i] for i, name in enumerate(attribute_names)}
+
+def check_frame_boundaries() -> list[str]:
+    """
+    The frame decoder must give the same frames whatever chunks the bytes arrive in, with frames ending in the
+    first sync byte and noise between the frames, and nothing may be left in its buffer at the end.
+    """
+    failures = []
+    frames = [encode_frame("BMP280", sequence, 1000 + sequence, (20.0, 101325.0, 100.0 + sequence)) for sequence in range(200)]
+    # Frames whose last CRC byte is the first sync byte, the decoder must not wait for a sync word after them
+    ending_in_sync = [frame for frame in frames if frame[-1] == SYNC[0]]
+    if not ending_in_sync:
+        return ["no test frame ends with the first sync byte"]
+    frame = ending_in_sync[0]
+    rng = np.random.default_rng(SEED)
+    noise = bytes([SYNC[0], 0x00, SYNC[0]])
+    streams = {
+        "a frame ending in the sync byte": frame,
+        "frames": b"".join(frames[:50]),
+        "frames and noise": b"".join(frames[i] + noise * (i % 3 == 0) for i in range(50)) + frame,
+    }
+    for name, stream in streams.items():
+        expected = FrameDecoder().feed(stream)
+        splits = [[stream[start:start + size] for start in range(0, len(stream), size)] for size in (1, 2, 3, 7, len(frame) - 1, len(frame), len(frame) + 1)]
+        cuts = np.sort(rng.choice(np.arange(1, len(stream)), min(20, len(stream) - 1), replace=False)).tolist()
+        splits.append([stream[start:end] for start, end in zip([0] + cuts, cuts + [len(stream)])])
+        for chunks in splits:
+            decoder = FrameDecoder()
+            decoded = [decoded_frame for chunk in chunks for decoded_frame in decoder.feed(chunk)]
+            if decoded != expected:
+                failures.append(f"{name}: {len(decoded)} frames instead of {len(expected)} in chunks of {len(chunks[0])} bytes")
+            elif decoder.pending_bytes:
+                failures.append(f"{name}: {decoder.pending_bytes} bytes left in the buffer in chunks of {len(chunks[0])} bytes")
+    return failures
+
+# name: function returning the failure messages
+CHECKS = {
+    "online_refinement": check_online_refinement,
+    "frame_boundaries": check_frame_boundaries,
+}
+
+def run_checks() -> list[str]:
+    """
+    Runs every correctness check. Returns the failures.
+    """
+    failures = []
+    for name, function in CHECKS.items():
+        check_failures = function()
+        print(f"  {name:<20}{'FAILED' if check_failures else 'ok'}")
+        failures += [f"{name}: {failure}" for failure in check_failures]
+    return failures
+
+def run_stage(function, context: dict, repeat: int, measure_memory: bool) -> dict:
+    """
+    Runs a stage `repeat` times and keeps the best time, then once more under tracemalloc for the peak memory.
+    """
+    best = float("inf")
+    items = 0
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        items = function(context)
+        best = min(best, time.perf_counter() - start)
+    result = {"seconds": best, "items": items, "throughput": items / best if best else float("inf")}
+    if measure_memory:
+        gc.collect()
+        tracemalloc.start()
+        function(context)
+        result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result
+
+def run(sizes: list[str], stages: list[str], repeat: int = 3, measure_memory: bool = True) -> dict:
+    """
+    Runs the selected stages on the selected dataset sizes.
+
+    Returns:
+        dict: size -> stage -> {"seconds", "items", "throughput", "peak_mb"}.
+    """
+    plt.switch_backend("Agg")
+    results = {}
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        # txt_to_db and save_graph write relative to the working directory
+        os.chdir(directory)
+        for folder in ("datas", "graphs/pngs", "graphs/pkls"):
+            os.makedirs(folder, exist_ok=True)
+        try:
+            for size in sizes:
+                context = prepare(SIZES[size])
+                results[size] = {}
+                print(f"{size}: {context['samples']} samples")
+                # The later stages work on the database and the loaded columns, they are prepared untimed if their stage isn't selected
+                if "insert" not in stages and set(stages) - {"parse", "decode"}:
+                    stage_insert(context)
+                if "load" not in stages and set(stages) & {"refine", "analysis", "kinematics", "plot_export"}:
+                    stage_load(context)
+                for stage in stages:
+                    function, uses_objects = STAGES[stage]
+                    if uses_objects and SIZES[size] > OBJECT_LIMIT:
+                        continue
+                    results[size][stage] = result = run_stage(function, context, repeat, measure_memory)
+                    memory = f"{result['peak_mb']:9.1f} MB" if "peak_mb" in result else ""
+                    print(f"  {stage:<13}{result['seconds'] * 1000:10.1f} ms{result['throughput']:14.0f} items/s{memory}")
+        finally:
+            os.chdir(working_directory)
+    return results
+
+def compare(results: dict, baseline: dict, tolerance: float = TOLERANCE) -> list[str]:
+    """
+    Prints the time of every stage relative to the baseline. Returns the stages which got slower than the tolerance.
+    """
+    regressions = []
+    print(f"Compared with the baseline ({baseline.get('machine', 'unknown machine')}):")
+    for size, stages in results.items():
+        for stage, result in stages.items():
+            reference = baseline.get("results", {}).get(size, {}).get(stage)
+            if reference is None:
+                continue
+            ratio = result["seconds"] / reference["seconds"]
+            marker = ""
+            if ratio > 1 + tolerance:
+                marker = "  REGRESSION"
+                regressions.append(f"{size}/{stage}")
+            elif ratio < 1 - tolerance:
+                marker = "  improved"
+            memory = ""
+            if "peak_mb" in result and "peak_mb" in reference:
+                memory = f"  memory {result['peak_mb']:.1f} MB (was {reference['peak_mb']:.1f} MB)"
+            print(f"  {size}/{stage:<13} {ratio:6.2f}x time{memory}{marker}")
+    return regressions
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmarks the ground station pipeline on synthetic flights.")
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=list(SIZES))
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=3, help="the best of this many runs is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory measurement")
+    parser.add_argument("--save-baseline", nargs="?", const=BASELINE_FILE, help="store the results as the baseline")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_FILE, help="compare the results with the baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--check", action="store_true", help="only run the correctness checks")
+    args = parser.parse_args()
+
+    if args.check:
+        failures = run_checks()
+        for failure in failures:
+            print(failure)
+        sys.exit(1 if failures else 0)
+    results = run(args.sizes, args.stages, args.repeat, not args.no_memory)
+    exit_code = 0
+    if args.compare:
+        try:
+            with open(args.compare, "r") as file:
+                regressions = compare(results, json.load(file), args.tolerance)
+            if regressions:
+                print(f"Slower than the baseline: {', '.join(regressions)}")
+                exit_code = 1
+        except FileNotFoundError:
+            logger.error(f"Baseline {args.compare} not found, save one with --save-baseline")
+            exit_code = 1
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as file:
+            json.dump({"machine": f"{platform.node()} {platform.processor() or platform.machine()} Python {platform.python_version()}",
+                       "created": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}, file, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    sys.exit(exit_code)
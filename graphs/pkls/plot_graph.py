@@ -1,40 +1,130 @@
 """
-This file is used to plot the data from a pickle file. Modify the file_name variable to change the file to plot.
+This file is used to plot a stored graph. Modify the file_name variable to change the file to plot.
 You can also pass a file name as an argument to the script.
+The graphs are stored by program_files/report.py as plot data (.npz), the figure is rebuilt from it.
+Older graphs pickled as a whole Figure (.pkl) can still be opened.
+
+With --browse the thumbnails of every graph of the directory are shown, and a graph is opened by clicking it.
+The thumbnails are cached (see program_files/graph_index.py) and only rendered again if their graph changes.
+The pickled figures don't get a thumbnail, they are only unpickled when they are opened.
 Example:
-    python plot_graph.py plot.pkl
+    python plot_graph.py BMP_raw.npz
+    python plot_graph.py --browse
 """
 
 __author__ = "KarmaDemon"
 
-file_name = "BMP_raw.pkl"
+file_name = "BMP_raw.npz"
+REFRESH_INTERVAL = 2000 # ms, the directory is checked for new and changed graphs this often while browsing
 
 import os
+import sys
 os.chdir(f"{__file__[:len(__file__) - len('/graphs/pkls/plot_graph.py')]}/")
+# program_files is imported from the root of the project, not from the directory of this file
+sys.path.insert(0, os.getcwd())
 try:
     import program_files.cansattools as cansattools
     logger = cansattools.logger_creator("plot_graph")
 except ImportError:
     print("Error setting up logger. Cansattools can't be imported.Logging is disabled.")
 try:
+    import math
     import matplotlib.pyplot as plt
-    import pickle
-    import sys
+    import matplotlib.image as mpimg
+    from program_files.graph_index import GraphIndex, load_figure, signature
 except ImportError as e:
     logger.error(f"Error importing module: {e}")
 
-def plot_graph(file: str = "plot.pkl") -> None:
+def plot_graph(file: str = "plot.npz") -> None:
     os.chdir(f"{__file__[:len(__file__) - len('plot_graph.py')]}/")
     fig: plt.Figure
     try:
-        with open(file, 'rb') as f:
-            fig = pickle.load(f)
+        fig = load_figure(file)
         plt.show()
     except FileNotFoundError:
         logger.error(f"File {file} not found.")
+    except (TypeError, ImportError) as e:
+        # e.g. a pickled plotly figure
+        logger.error(f"File {file} can't be plotted: {e}")
+
+def browse(directory: str = ".") -> None:
+    """
+    Shows the cached thumbnails of the graphs of a directory. Clicking a thumbnail opens its graph, which is
+    only loaded again if its file changed. New and changed graphs are picked up while the window is open.
+    """
+    os.chdir(f"{__file__[:len(__file__) - len('plot_graph.py')]}/")
+    index = GraphIndex(directory)
+    index.refresh()
+    gallery = plt.figure(figsize=(12, 8))
+    gallery.canvas.manager.set_window_title(f"Graphs of {os.path.abspath(directory)}")
+    # The opened graphs by file name, with the signature of the file they were loaded from
+    opened: dict[str, tuple[list[int], plt.Figure]] = {}
+    thumbnails: dict[plt.Axes, str] = {}
+
+    def draw_gallery() -> None:
+        gallery.clear()
+        thumbnails.clear()
+        names = index.names()
+        if not names:
+            gallery.text(0.5, 0.5, f"There are no graphs in {os.path.abspath(directory)}", ha="center", va="center")
+        columns = max(math.ceil(math.sqrt(len(names))), 1)
+        rows = max(math.ceil(len(names) / columns), 1)
+        for position, name in enumerate(names, start=1):
+            ax = gallery.add_subplot(rows, columns, position)
+            thumbnail = index.thumbnail(name)
+            if thumbnail is not None:
+                ax.imshow(mpimg.imread(thumbnail))
+            else:
+                # Pickled figures are only unpickled when they are opened
+                message = "Pickled figure,\nclick to open it" if name.endswith(".pkl") else "Can't be rendered"
+                ax.text(0.5, 0.5, message, ha="center", va="center", transform=ax.transAxes)
+            ax.set_title(f"{index.title(name)}\n{name}" if index.title(name) else name, fontsize=8)
+            ax.axis("off")
+            thumbnails[ax] = name
+        gallery.canvas.draw_idle()
+
+    def open_graph(name: str) -> None:
+        if name in opened:
+            file_signature, fig = opened[name]
+            if plt.fignum_exists(fig.number) and file_signature == signature(index.path(name)):
+                fig.canvas.manager.show()
+                return
+            plt.close(fig)
+        try:
+            file_signature = signature(index.path(name))
+            fig = index.load_figure(name)
+        except Exception as e:
+            logger.error(f"Error opening the graph {name}: {e}")
+            return
+        fig.canvas.manager.set_window_title(name)
+        opened[name] = (file_signature, fig)
+        fig.show()
+
+    def on_click(event) -> None:
+        if event.inaxes in thumbnails:
+            open_graph(thumbnails[event.inaxes])
+
+    def on_timer() -> None:
+        changed = index.refresh(parallel=False)
+        if not changed:
+            return
+        draw_gallery()
+        # The open windows of the changed graphs are loaded again
+        for name in changed:
+            if name in opened and plt.fignum_exists(opened[name][1].number) and os.path.exists(index.path(name)):
+                open_graph(name)
+
+    draw_gallery()
+    gallery.canvas.mpl_connect("button_press_event", on_click)
+    timer = gallery.canvas.new_timer(interval=REFRESH_INTERVAL)
+    timer.add_callback(on_timer)
+    timer.start()
+    plt.show()
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] != "":
+    if len(sys.argv) > 1 and sys.argv[1] == "--browse":
+        browse(sys.argv[2] if len(sys.argv) > 2 else ".")
+    elif len(sys.argv) > 1 and sys.argv[1] != "":
         plot_graph(sys.argv[1])
     else:
         plot_graph(file_name)
\ No newline at end of file
@@ -7,11 +7,36 @@ __author__ = "KarmaDemon"
 
 try:
     import logging
-    from logging.handlers import RotatingFileHandler
+    from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
     import traceback
+    import threading
+    import queue
+    import atexit
 except ImportError:
     print("Error importing logging module. Logging is disabled.")
 
+class CustomFormatter(logging.Formatter):
+    def formatException(self, exc_info):
+        result = super().formatException(exc_info)
+        return f"{result}\n{traceback.format_exc()}"
+
+# Every logger of the process shares one handler, so the log file is opened only once
+_shared_handler: logging.Handler = None
+_file_handler: RotatingFileHandler = None
+_queue_listener: QueueListener = None
+_configured_loggers: set[str] = set()
+_logging_lock = threading.Lock()
+
+def _get_file_handler() -> RotatingFileHandler:
+    global _file_handler, _shared_handler
+    if _file_handler is None:
+        logging.info("Logging system test.")
+        _file_handler = RotatingFileHandler(f"{__file__[:len(__file__) - len('cansattools.py')]}/CanSat.log", mode='a', maxBytes=5*1024*1024, backupCount=2, encoding=None, delay=0)
+        _file_handler.setFormatter(CustomFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        _file_handler.setLevel(logging.INFO)
+        _shared_handler = _file_handler
+    return _file_handler
+
 def logger_creator(name: str = __name__) -> logging.Logger:
     """
     Sets up and returns a logger with a rotating file handler.
@@ -23,36 +48,80 @@ def logger_creator(name: str = __name__) -> logging.Logger:
     are formatted to include the timestamp, logger name, log level, and
     message.
 
+    The handler is created once per process and shared by every logger, and a
+    logger is only configured on its first call. Calling it again (even in a
+    hot loop) only costs a dictionary lookup.
+
     Args:
         name (str): The name of the logger. Defaults to the name of the module.
 
     Returns:
         logging.Logger: The configured logger instance.
     """
-    class CustomFormatter(logging.Formatter):
-        def formatException(self, exc_info):
-            result = super().formatException(exc_info)
-            return f"{result}\n{traceback.format_exc()}"
-
-    logging.info("Logging system test.")
     logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
-    handler = RotatingFileHandler(f"{__file__[:len(__file__) - len('cansattools.py')]}/CanSat.log", mode='a', maxBytes=5*1024*1024, backupCount=2, encoding=None, delay=0)
-    logger.addHandler(handler)
-    formatter = CustomFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    handler.setLevel(logging.INFO)
-
+    if name in _configured_loggers:
+        return logger
+    with _logging_lock:
+        if name not in _configured_loggers:
+            _get_file_handler()
+            logger.setLevel(logging.DEBUG)
+            logger.addHandler(_shared_handler)
+            _configured_loggers.add(name)
     return logger
 
 def free_logger(logger: logging.Logger) -> None:
     """
-    Remove all handlers from a logger.
+    Remove all handlers from a logger, except the shared handler of logger_creator.
+    The shared handler stays open until the end of the process.
     """
     for handler in logger.handlers[:]:
+        if handler is _shared_handler:
+            continue
         logger.removeHandler(handler)
         handler.close()
 
+def start_queue_logging() -> None:
+    """
+    Makes logging non-blocking for every logger created by logger_creator.
+
+    The loggers put the records into a queue and a background thread (QueueListener)
+    writes them to the log file, so threads like the serial reader never wait for the disk.
+    The queue is flushed when the process exits or stop_queue_logging is called.
+    """
+    global _shared_handler, _queue_listener
+    with _logging_lock:
+        if _queue_listener is not None:
+            return
+        file_handler = _get_file_handler()
+        queue_handler = QueueHandler(queue.SimpleQueue())
+        # QueueHandler.prepare formats the record on the thread which logs it, so traceback.format_exc still knows the exception
+        queue_handler.setFormatter(CustomFormatter('%(message)s'))
+        queue_handler.setLevel(logging.INFO)
+        for name in _configured_loggers:
+            logger = logging.getLogger(name)
+            logger.removeHandler(file_handler)
+            logger.addHandler(queue_handler)
+        _shared_handler = queue_handler
+        _queue_listener = QueueListener(queue_handler.queue, file_handler, respect_handler_level=True)
+        _queue_listener.start()
+    atexit.register(stop_queue_logging)
+
+def stop_queue_logging() -> None:
+    """
+    Writes the queued records and switches the loggers back to writing the log file directly.
+    """
+    global _shared_handler, _queue_listener
+    with _logging_lock:
+        if _queue_listener is None:
+            return
+        _queue_listener.stop()
+        for name in _configured_loggers:
+            logger = logging.getLogger(name)
+            logger.removeHandler(_shared_handler)
+            logger.addHandler(_file_handler)
+        _shared_handler = _file_handler
+        _queue_listener = None
+
 logger = logger_creator("cansattools")
 
 try:
@@ -71,7 +140,6 @@ try:
     from bs4 import BeautifulSoup
     import numpy as np
     import random
-    import pickle
     import matplotlib.pyplot as plt
 except ImportError as e:
     logger.error(f"Error importing module: {e}", exc_info=True)
@@ -126,6 +194,66 @@ def test_data_generator(current_data: int | float, upper_bound: int = 100, lower
     free_logger(logger)
     return default_value
 
+def create_tables(cursor: sqlite3.Cursor) -> None:
+    """
+    Creates the BMP280, DHT11 and GPS tables and their indexes if they don't exist yet.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor of the database to create the tables in.
+    """
+    cursor.execute("""CREATE TABLE IF NOT EXISTS BMP280 (
+                    Id INTEGER PRIMARY KEY, 
+                    Time INTEGER, 
+                    Temperature REAL, 
+                    Pressure REAL,
+                    Height REAL,
+                    Speed REAL,
+                    Acceleration REAL,
+                    MissingData BOOLEAN,
+                    IsTemperatureOutlier BOOLEAN,
+                    IsPressureOutlier BOOLEAN,
+                    IsHeightOutlier BOOLEAN,
+                    IsSpeedOutlier BOOLEAN,
+                    IsAccelerationOutlier BOOLEAN)""")
+        
+    cursor.execute("""CREATE TABLE IF NOT EXISTS DHT11 (
+                    Id INTEGER PRIMARY KEY, 
+                    Time INTEGER, 
+                    Humidity REAL,
+                    Temperature REAL,
+                    MissingData BOOLEAN,
+                    IsHumidityOutlier BOOLEAN,
+                    IsTemperatureOutlier BOOLEAN)""")
+        
+    cursor.execute("""CREATE TABLE IF NOT EXISTS GPS (
+                   Id INTEGER PRIMARY KEY, 
+                   Time INTEGER, 
+                   Latitude REAL, 
+                   Longitude REAL,
+                   Altitude REAL,
+                   MissingData BOOLEAN,
+                   IsLatitudeOutlier BOOLEAN,
+                   IsLongitudeOutlier BOOLEAN,
+                   IsAltitudeOutlier BOOLEAN)""")
+
+    create_indexes(cursor)
+
+def create_indexes(cursor: sqlite3.Cursor) -> None:
+    """
+    Creates the indexes used by the time range and flag queries if they don't exist yet.
+
+    Every table gets an index on Time and a partial index which only contains the
+    flagged rows (missing data or any outlier), so the flagged samples of a long
+    recording can be listed without scanning the whole table. It can be called on
+    databases created before the indexes existed.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor of the database to create the indexes in.
+    """
+    for table_name in classes.ROW_CLASSES:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_Time ON {table_name} (Time)")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_Flagged ON {table_name} (Time) WHERE {classes.flag_condition(table_name)}")
+
 def create_db(database_name: str = "raw_data.db", replace_mode: bool = False) -> None:
     """
     Creates a SQLite database with the specified name.
@@ -166,40 +294,7 @@ def create_db(database_name: str = "raw_data.db", replace_mode: bool = False) ->
                 return
         
     cursor = conn.cursor()
-    cursor.execute("""CREATE TABLE IF NOT EXISTS BMP280 (
-                    Id INTEGER PRIMARY KEY, 
-                    Time INTEGER, 
-                    Temperature REAL, 
-                    Pressure REAL,
-                    Height REAL,
-                    Speed REAL,
-                    Acceleration REAL,
-                    MissingData BOOLEAN,
-                    IsTemperatureOutlier BOOLEAN,
-                    IsPressureOutlier BOOLEAN,
-                    IsHeightOutlier BOOLEAN,
-                    IsSpeedOutlier BOOLEAN,
-                    IsAccelerationOutlier BOOLEAN)""")
-        
-    cursor.execute("""CREATE TABLE IF NOT EXISTS DHT11 (
-                    Id INTEGER PRIMARY KEY, 
-                    Time INTEGER, 
-                    Humidity REAL,
-                    Temperature REAL,
-                    MissingData BOOLEAN,
-                    IsHumidityOutlier BOOLEAN,
-                    IsTemperatureOutlier BOOLEAN)""")
-        
-    cursor.execute("""CREATE TABLE IF NOT EXISTS GPS (
-                   Id INTEGER PRIMARY KEY, 
-                   Time INTEGER, 
-                   Latitude REAL, 
-                   Longitude REAL,
-                   Altitude REAL,
-                   MissingData BOOLEAN,
-                   IsLatitudeOutlier BOOLEAN,
-                   IsLongitudeOutlier BOOLEAN,
-                   IsAltitudeOutlier BOOLEAN)""")
+    create_tables(cursor)
 
     try:
         conn.commit()
@@ -212,23 +307,29 @@ def create_db(database_name: str = "raw_data.db", replace_mode: bool = False) ->
 
 def txt_to_db(data: list, database_name: str = "raw_data.db", test_mode: bool = False, replace_mode: bool = False) -> None:
     """
-    This function reads data from a text file and inserts it into a SQLite database.
+    This function inserts the lines of a raw text file into a SQLite database.
+
+    The lines are grouped per table and inserted in batches by db_writer.BulkWriter.
     
+    :param data: The lines of the raw text file.
     :param database_name: The name of the SQLite database to use. Defaults to "raw_data.db".
-    :param txt_name: The name of the text file to read from. Defaults to "raw_data.txt".
     :return: None
     """
 
     logger = logger_creator("txt_to_db")
 
+    try:
+        from db_writer import BulkWriter
+    except ImportError:
+        from program_files.db_writer import BulkWriter
+
     if test_mode:
         os.chdir(f"{__file__[:len(__file__) - len('program_files/cansattools.py')]}/")
     
     create_db(database_name, replace_mode)
 
     try:
-        conn = sqlite3.connect(f'datas/{database_name}')
-        cursor = conn.cursor()
+        writer = BulkWriter(f'datas/{database_name}')
     except Error as e:
         logger.error(f"Error connecting to the database: {e}")
         #freeing up file handler
@@ -236,22 +337,13 @@ def txt_to_db(data: list, database_name: str = "raw_data.db", test_mode: bool =
         return
 
     # Insert the data into the database
-    for line in data:
-        try:
-            if "BMP280" in line:
-                cursor.execute("INSERT INTO BMP280 (Time, Temperature, Pressure, Height) VALUES (?, ?, ?, ?)", line.split()[1:])
-            elif "DHT11" in line:
-                cursor.execute("INSERT INTO DHT11 (Time, Humidity) VALUES (?, ?)", line.split()[1:])
-            elif "GPS" in line:
-                cursor.execute("INSERT INTO GPS (Time, First_coordinate, Second_coordinate, Height) VALUES (?, ?, ?, ?)", line.split()[1:])
-            elif "MPU6050" in line:
-                cursor.execute("INSERT INTO MPU6050 (Time, Acceleration) VALUES (?, ?)", line.split()[1:])
-        except Error as e:
-            logger.error(f"Error inserting data into the database: {e}")
-
-    # Commit the changes and close the connection
-    conn.commit()
-    conn.close()
+    skipped_lines = 0
+    with writer:
+        for line in data:
+            if not writer.add_line(line):
+                skipped_lines += 1
+    if skipped_lines:
+        logger.warning(f"{skipped_lines} lines were not measurements and were skipped")
 
 def get_official_data(website_link: str = "https://koponyeg.hu/elorejelzes/Tat%C3%A1rszentgy%C3%B6rgy", test_mode: bool = False) -> dict:
     """
@@ -324,6 +416,8 @@ def refine_data(objects: list[classes.BMP280 | classes.GPS | classes.DHT11], att
         tuple[list[float], list[int]]:
             A tuple of two lists. The first list contains the refined data, and
             the second list contains the indices of the lacking data.
+
+    See refinement.OnlineRefiner for the streaming version used during the flight.
     """
 
     if len(objects) == 0:
@@ -335,10 +429,11 @@ def refine_data(objects: list[classes.BMP280 | classes.GPS | classes.DHT11], att
     data = [getattr(obj, attribute_name) for obj in objects]
 
     # Detect lacking data by larger differences between timestamps
+    # The mean time step is the same for every index, it is calculated only once
+    time_steps = np.diff(timestamps)
     lacking_data_indices = []
-    for i in range(1, len(timestamps)):
-        if timestamps[i] - timestamps[i-1] > lacking_data_threshold * np.mean(np.diff(timestamps)):
-            lacking_data_indices.append(i)
+    if len(time_steps) > 0:
+        lacking_data_indices = (np.nonzero(time_steps > lacking_data_threshold * np.mean(time_steps))[0] + 1).tolist()
 
     # Remove outliers using the IQR method
     q1 = np.percentile(data, 25)
@@ -352,14 +447,25 @@ def refine_data(objects: list[classes.BMP280 | classes.GPS | classes.DHT11], att
     free_logger(logger)
     return refined_data, lacking_data_indices
 
-def save_graph(fig: plt.Figure, graph_name: str) -> None:
+def save_graph(fig: "plt.Figure | report.FigureSpec", graph_name: str = None) -> None:
+    """
+    Saves a graph as graphs/pngs/<graph_name>.png.
+
+    A report.FigureSpec is also stored as compact plot data (graphs/pkls/<name>.npz), which plot_graph.py can open again.
+    A matplotlib Figure is only saved as a PNG, many graphs are exported faster in parallel with report.export.
+    """
     logger = logger_creator("save_graph")
     try:
-        if os.path.exists(f"graphs/pngs/{graph_name}.png"):
-            os.remove(f'graphs/pngs/{graph_name}.png')
-        plt.savefig(f'graphs/pngs/{graph_name}.png', format='png')
-        with open(f'graphs/pkls/{graph_name}.pkl', 'wb') as file:
-            pickle.dump(fig, file)
+        try:
+            import report
+        except ImportError:
+            import program_files.report as report
+        if isinstance(fig, report.FigureSpec):
+            if graph_name is not None:
+                fig.name = graph_name
+            report.export([fig], parallel=False)
+        else:
+            fig.savefig(f'graphs/pngs/{graph_name}.png', format='png')
     except Exception as e:
         logger.error(f"Error saving the graph data: {e}", exc_info=True)
 
@@ -12,6 +12,7 @@ logger = logger_creator("classes")
 try:
     import sqlite3
     from sqlite3 import Error
+    import re
     import numpy as np
 except ImportError as e:
     logger.error(f"Error importing module: {e}")
@@ -20,26 +21,46 @@ class Data:
     def __init__(self, missing_data: bool = False) -> None:
         self.missing_data = missing_data # Flag to indicate if object is missing before this object
 
+    @property
+    def is_outlier(self) -> bool:
+        """
+        True if any attribute of the object is flagged as an outlier.
+        """
+        return any(value for name, value in vars(self).items() if name.startswith("is_") and name.endswith("_outlier"))
+
     @staticmethod
-    def read_from_db_all(db_name: str, table_name: str, index: int = None) -> list[tuple]:
-        if index is None and c is None:
-            try:
-                conn = sqlite3.connect(db_name)
-            except Error as e:
-                logger.error(f"Error connecting to the database: {e}")
-                free_logger(logger)
-                return
-            c = conn.cursor()
+    def read_from_db_all(db_name: str, table_name: str, index: int = None, start_time: int = None, end_time: int = None) -> list[tuple]:
+        """
+        Reads raw rows of a table. Use TableData.load to get the rows as NumPy columns.
+
+        :param db_name: The path of the SQLite database.
+        :param table_name: The name of the table.
+        :param index: Only the row with this Id is returned. Defaults to None.
+        :param start_time: Only rows with Time >= start_time are returned. Defaults to None.
+        :param end_time: Only rows with Time <= end_time are returned. Defaults to None.
+        :return: The rows, or None if the database can't be read.
+        """
+        try:
+            conn = sqlite3.connect(db_name)
+        except Error as e:
+            logger.error(f"Error connecting to the database: {e}")
+            return
+        c = conn.cursor()
+        try:
             if index is not None:
                 c.execute(f"SELECT * FROM {table_name} WHERE Id = ?", (index,))
-                row: list = c.fetchall()
-                conn.close()
-                return row
-            elif index is None:
+            elif start_time is not None or end_time is not None:
+                # Uses the index on Time
+                c.execute(f"SELECT * FROM {table_name} WHERE Time BETWEEN ? AND ? ORDER BY Time",
+                          (start_time if start_time is not None else -2**63, end_time if end_time is not None else 2**63 - 1))
+            else:
                 c.execute(f"SELECT * FROM {table_name}")
-                rows: list[tuple] = c.fetchall()
-                conn.close()
-                return rows
+            rows: list[tuple] = c.fetchall()
+        except Error as e:
+            logger.error(f"Error fetching data: {e}")
+            rows = None
+        conn.close()
+        return rows
     
     def read_from_db(self, table_name: str, index: int, conn: sqlite3.Connection, c: sqlite3.Cursor) -> None:
         try:
@@ -109,6 +130,9 @@ class Data:
             free_logger(logger)
 
 class BMP280(Data):
+    # Columns of the BMP280 table in the order of to_row
+    COLUMNS = ("Time", "Temperature", "Pressure", "Height", "Speed", "Acceleration", "MissingData", "IsTemperatureOutlier", "IsPressureOutlier", "IsHeightOutlier", "IsSpeedOutlier", "IsAccelerationOutlier")
+
     def __init__(self, time: int, temperature: float, pressure: float, height: float, speed: float, acceleration: float, temperature_outlier: bool = False, pressure_outlier: bool = False, height_outlier: bool = False, speed_outlier: bool = False, acceleration_outlier: bool = False) -> None:
         self.time = time
         self.temperature = temperature
@@ -162,10 +186,28 @@ class BMP280(Data):
         :param table_name: The name of the table to use. Defaults to "BMP280".
         :return: None
         """
-        c.execute(f"INSERT INTO {table_name} (Time, Temperature, Pressure, Height, Speed, Acceleration, MissingData, IsTemperatureOutlier, IsPressureOutlier, IsHeightOutlier, IsSpeedOutlier, IsAccelerationOutlier) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                    (self.time, self.temperature, self.pressure, self.height, self.speed, self.acceleration, 1 if self.missing_data else 0, 1 if self.is_temperature_outlier else 0, 1 if self.is_pressure_outlier else 0, 1 if self.is_height_outlier else 0, 1 if self.is_speed_outlier else 0, 1 if self.is_acceleration_outlier else 0))
+        c.execute(f"INSERT INTO {table_name} ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})", self.to_row())
+
+    def to_row(self) -> tuple:
+        """
+        Returns the values of the object in the order of COLUMNS, flags are converted to 0 or 1.
+        """
+        return (self.time, self.temperature, self.pressure, self.height, self.speed, self.acceleration, 1 if self.missing_data else 0, 1 if self.is_temperature_outlier else 0, 1 if self.is_pressure_outlier else 0, 1 if self.is_height_outlier else 0, 1 if self.is_speed_outlier else 0, 1 if self.is_acceleration_outlier else 0)
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "BMP280":
+        """
+        Creates an object from values in the order of COLUMNS (the inverse of to_row).
+        """
+        time, temperature, pressure, height, speed, acceleration, missing_data, *outliers = row
+        bmp = cls(time, temperature, pressure, height, speed, acceleration, *(bool(outlier) for outlier in outliers))
+        bmp.missing_data = bool(missing_data)
+        return bmp
 
 class DHT11(Data):
+    # Columns of the DHT11 table in the order of to_row
+    COLUMNS = ("Time", "Humidity", "Temperature", "MissingData", "IsHumidityOutlier", "IsTemperatureOutlier")
+
     def __init__(self, time: int, humidity: float, temperature: float, humidity_outlier: bool = False, temperature_outlier: bool = False) -> None:
         self.time = time
         self.humidity = humidity
@@ -182,10 +224,28 @@ class DHT11(Data):
         :param table_name: The name of the table to use. Defaults to "DHT11".
         :return: None
         """
-        c.execute(f"INSERT INTO {table_name} (Time, Humidity, Temperature, MissingData, IsHumidityOutlier, IsTemperatureOutlier) VALUES (?, ?, ?, ?, ?, ?)",
-                    (self.time, self.humidity, self.temperature, 1 if self.missing_data else 0, 1 if self.is_humidity_outlier else 0, 1 if self.is_temperature_outlier else 0))
+        c.execute(f"INSERT INTO {table_name} ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})", self.to_row())
+
+    def to_row(self) -> tuple:
+        """
+        Returns the values of the object in the order of COLUMNS, flags are converted to 0 or 1.
+        """
+        return (self.time, self.humidity, self.temperature, 1 if self.missing_data else 0, 1 if self.is_humidity_outlier else 0, 1 if self.is_temperature_outlier else 0)
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "DHT11":
+        """
+        Creates an object from values in the order of COLUMNS (the inverse of to_row).
+        """
+        time, humidity, temperature, missing_data, *outliers = row
+        dht = cls(time, humidity, temperature, *(bool(outlier) for outlier in outliers))
+        dht.missing_data = bool(missing_data)
+        return dht
 
 class GPS(Data):
+    # Columns of the GPS table in the order of to_row
+    COLUMNS = ("Time", "Latitude", "Longitude", "Altitude", "MissingData", "IsLatitudeOutlier", "IsLongitudeOutlier", "IsAltitudeOutlier")
+
     def __init__(self, time: int, latitude: float, longitude: float, altitude: float, latitude_outlier: bool = False, longitude_outlier: bool = False, altitude_outlier: bool = False) -> None:
         self.time = time
         self.latitude = latitude
@@ -204,5 +264,295 @@ class GPS(Data):
         :param table_name: The name of the table to use. Defaults to "GPS".
         :return: None
         """
-        c.execute(f"INSERT INTO {table_name} (Time, Latitude, Longitude, Altitude, MissingData, IsLatitudeOutlier, IsLongitudeOutlier, IsAltitudeOutlier) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                    (self.time, self.latitude, self.longitude, self.altitude, 1 if self.missing_data else 0, 1 if self.is_latitude_outlier else 0, 1 if self.is_longitude_outlier else 0, 1 if self.is_altitude_outlier else 0))
+        c.execute(f"INSERT INTO {table_name} ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})", self.to_row())
+
+    def to_row(self) -> tuple:
+        """
+        Returns the values of the object in the order of COLUMNS, flags are converted to 0 or 1.
+        """
+        return (self.time, self.latitude, self.longitude, self.altitude, 1 if self.missing_data else 0, 1 if self.is_latitude_outlier else 0, 1 if self.is_longitude_outlier else 0, 1 if self.is_altitude_outlier else 0)
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "GPS":
+        """
+        Creates an object from values in the order of COLUMNS (the inverse of to_row).
+        """
+        time, latitude, longitude, altitude, missing_data, *outliers = row
+        gps = cls(time, latitude, longitude, altitude, *(bool(outlier) for outlier in outliers))
+        gps.missing_data = bool(missing_data)
+        return gps
+
+ROW_CLASSES = {"BMP280": BMP280, "DHT11": DHT11, "GPS": GPS}
+
+def flag_condition(table_name: str) -> str:
+    """
+    Returns the SQL condition of the flagged rows (missing data or any outlier) of a table.
+    The partial index of cansattools.create_indexes is built with the same expression,
+    queries have to use it as it is, otherwise SQLite can't use the index.
+    """
+    flags = [column for column in ROW_CLASSES[table_name].COLUMNS if column == "MissingData" or column.startswith("Is")]
+    return f"({' OR '.join(flags)})"
+
+# NumPy types of the SQLite column types used in cansattools.create_tables
+SQL_TYPES = {"INTEGER": np.int64, "REAL": np.float64, "BOOLEAN": np.bool_}
+
+def column_to_attribute(column_name: str) -> str:
+    """
+    Converts a database column name to the attribute name of the classes, e.g. IsHeightOutlier -> is_height_outlier.
+    """
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', column_name).lower()
+
+class TableData:
+    """
+    The whole content (or a time range) of a database table, loaded with a single query into NumPy columns.
+
+    The columns are named after the attributes of the classes (time, temperature, is_height_outlier, ...)
+    and the row ids are available as "id". NULL values become NaN in REAL columns and 0 (False) in the
+    others. BMP280, DHT11 or GPS objects are only created if `objects` is called.
+
+    Example:
+        bmp280 = TableData.load("datas/raw_data.db", "BMP280")
+        plt.plot(bmp280["time"], bmp280["height"])
+    """
+    def __init__(self, table_name: str, columns: dict[str, np.ndarray]) -> None:
+        self.table_name = table_name
+        self.columns = columns
+        self._objects: list[Data] = None
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, attribute_name: str) -> np.ndarray:
+        return self.columns[attribute_name]
+
+    @classmethod
+    def load(cls, db_name: str, table_name: str, start_time: int = None, end_time: int = None, step: int = None, flagged_only: bool = False, conn: sqlite3.Connection = None) -> "TableData":
+        """
+        Loads a table in one query.
+
+        A time window is served by the index on Time and `flagged_only` by the partial index of
+        the flagged rows (see cansattools.create_indexes), so zooming into a phase of a long
+        recording doesn't read the whole table.
+
+        Args:
+            db_name (str): The path of the SQLite database. Ignored if `conn` is given.
+            table_name (str): The name of the table (BMP280, DHT11 or GPS).
+            start_time (int, optional): Only rows with Time >= start_time are loaded. Defaults to None.
+            end_time (int, optional): Only rows with Time <= end_time are loaded. Defaults to None.
+            step (int, optional): Only every step-th row of the selection is loaded (decimation). Defaults to None.
+            flagged_only (bool, optional): Only rows with missing data or an outlier flag are loaded. Defaults to False.
+            conn (sqlite3.Connection, optional): An already opened connection. Defaults to None.
+
+        Returns:
+            TableData: The loaded columns, or None if the table can't be read.
+        """
+        own_connection = conn is None
+        try:
+            if own_connection:
+                conn = sqlite3.connect(db_name)
+            c = conn.cursor()
+            c.execute(f"PRAGMA table_info({table_name})")
+            table_info = c.fetchall()
+            if not table_info:
+                logger.error(f"Table {table_name} doesn't exist in the database")
+                return None
+            names = [column[1] for column in table_info]
+            types = [SQL_TYPES.get(column[2].upper(), np.float64) for column in table_info]
+            selected = [name if column_type == np.float64 else f"IFNULL({name}, 0) AS {name}" for name, column_type in zip(names, types)]
+
+            conditions, parameters = [], []
+            if start_time is not None:
+                conditions.append("Time >= ?")
+                parameters.append(start_time)
+            if end_time is not None:
+                conditions.append("Time <= ?")
+                parameters.append(end_time)
+            if flagged_only:
+                conditions.append(flag_condition(table_name))
+            where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+            # Ordering by Time lets SQLite walk the Time index instead of sorting when a window is requested
+            order = "Time" if conditions else "Id"
+            query = f"SELECT {', '.join(selected)} FROM {table_name}{where} ORDER BY {order}"
+            if step is not None and step > 1:
+                # The numbering and the result are ordered explicitly, the order of a subquery isn't guaranteed to be kept
+                query = (f"SELECT * FROM (SELECT *, ROW_NUMBER() OVER (ORDER BY {order}) - 1 AS RowNumber FROM ({query})) "
+                         f"WHERE RowNumber % {int(step)} = 0 ORDER BY RowNumber")
+            c.execute(query, parameters)
+            rows = c.fetchall()
+            if step is not None and step > 1:
+                rows = [row[:-1] for row in rows]
+        except Error as e:
+            logger.error(f"Error fetching data: {e}")
+            return None
+        finally:
+            if own_connection and conn is not None:
+                conn.close()
+
+        values = list(zip(*rows)) if rows else [()] * len(names)
+        columns = {column_to_attribute(name): np.array(column_values, dtype=column_type) for name, column_type, column_values in zip(names, types, values)}
+        return cls(table_name, columns)
+
+    def to_structured(self) -> np.ndarray:
+        """
+        Returns the columns as a single structured array.
+        """
+        array = np.zeros(len(self), dtype=[(name, column.dtype) for name, column in self.columns.items()])
+        for name, column in self.columns.items():
+            array[name] = column
+        return array
+
+    def objects(self) -> list[Data]:
+        """
+        Returns the rows as BMP280, DHT11 or GPS objects. They are created on the first call only.
+        """
+        if self._objects is None:
+            row_class = ROW_CLASSES[self.table_name]
+            columns = [self.columns[column_to_attribute(name)].tolist() for name in row_class.COLUMNS]
+            self._objects = [row_class.from_row(row) for row in zip(*columns)]
+        return self._objects
+
+
+class RowView:
+    """
+    A lightweight view of one row of a SensorColumns container.
+
+    It has no instance dictionary, reading or writing an attribute (bmp.height, bmp.is_height_outlier)
+    goes straight to the column arrays, so code written for the BMP280/DHT11/GPS objects can
+    work on the columnar form without copying the data.
+    """
+    __slots__ = ("_columns", "_index")
+
+    def __init__(self, columns: dict[str, np.ndarray], index: int) -> None:
+        object.__setattr__(self, "_columns", columns)
+        object.__setattr__(self, "_index", index)
+
+    def __getattr__(self, attribute_name: str):
+        try:
+            return self._columns[attribute_name][self._index].item()
+        except KeyError:
+            raise AttributeError(attribute_name) from None
+
+    def __setattr__(self, attribute_name: str, value) -> None:
+        if attribute_name not in self._columns:
+            raise AttributeError(attribute_name)
+        self._columns[attribute_name][self._index] = value
+
+    def __repr__(self) -> str:
+        return f"RowView({', '.join(f'{name}={column[self._index]}' for name, column in self._columns.items())})"
+
+class SensorColumns(TableData):
+    """
+    Struct-of-arrays container of the measurements of one sensor.
+
+    Every attribute of the per-sample class is stored in one NumPy column (int64 time, float64
+    values, bool flags), so millions of samples take a fraction of the memory of the objects and
+    the analysis can work on whole columns. Rows are available as RowView objects.
+
+    Args:
+        table_name (str, optional): The name of the table. Defaults to TABLE_NAME of the class.
+        columns (dict[str, np.ndarray], optional): The columns. Defaults to empty columns.
+        size (int, optional): The number of rows allocated if `columns` is not given. Defaults to 0.
+    """
+    TABLE_NAME: str = None
+
+    def __init__(self, table_name: str = None, columns: dict[str, np.ndarray] = None, size: int = 0) -> None:
+        table_name = table_name if table_name is not None else self.TABLE_NAME
+        if columns is None:
+            columns = {column_to_attribute(name): np.zeros(size, dtype=self.column_type(name)) for name in ROW_CLASSES[table_name].COLUMNS}
+        super().__init__(table_name, columns)
+
+    @staticmethod
+    def column_type(column_name: str) -> type:
+        """
+        Returns the NumPy type used for a database column.
+        """
+        if column_name == "Time":
+            return np.int64
+        if column_name == "MissingData" or column_name.startswith("Is"):
+            return np.bool_
+        return np.float64
+
+    @classmethod
+    def load(cls, db_name: str, table_name: str = None, **kwargs) -> "SensorColumns":
+        """
+        Loads the table of the sensor. See TableData.load for the arguments.
+        """
+        return super().load(db_name, table_name if table_name is not None else cls.TABLE_NAME, **kwargs)
+
+    @classmethod
+    def from_objects(cls, objects: list[Data]) -> "SensorColumns":
+        """
+        Converts a list of BMP280, DHT11 or GPS objects to the columnar form.
+        """
+        columns = {}
+        for name in ROW_CLASSES[cls.TABLE_NAME].COLUMNS:
+            attribute_name = column_to_attribute(name)
+            columns[attribute_name] = np.array([getattr(obj, attribute_name) for obj in objects], dtype=cls.column_type(name))
+        return cls(cls.TABLE_NAME, columns)
+
+    def row(self, index: int) -> RowView:
+        """
+        Returns a view of one row. Negative indices count from the end.
+        """
+        return RowView(self.columns, index if index >= 0 else len(self) + index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield RowView(self.columns, index)
+
+    def rows(self) -> list[tuple]:
+        """
+        Returns the rows in the order of COLUMNS, flags are converted to 0 or 1 (the same as to_row of the objects).
+        """
+        columns = []
+        for name in ROW_CLASSES[self.table_name].COLUMNS:
+            column = self.columns[column_to_attribute(name)]
+            columns.append(column.astype(np.int64).tolist() if column.dtype == np.bool_ else column.tolist())
+        return list(zip(*columns))
+
+    def insert_into_db(self, table_name: str = None, c: sqlite3.Cursor = None) -> None:
+        """
+        Inserts every row into the specified table with a single executemany.
+
+        :param table_name: The name of the table to use. Defaults to the table of the sensor.
+        :param c: A cursor of the database.
+        :return: None
+        """
+        table_name = table_name if table_name is not None else self.table_name
+        columns = ROW_CLASSES[self.table_name].COLUMNS
+        c.executemany(f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", self.rows())
+
+class BMP280Columns(SensorColumns):
+    TABLE_NAME = "BMP280"
+
+    def calculate_speed(self) -> None:
+        """
+        Calculates the speed of every sample from the height and time difference with the previous sample,
+        the same way as BMP280.calculate_speed. The first sample and samples with the same time as the previous one get 0.
+        """
+        self.columns["speed"] = self._finite_difference(self.columns["height"])
+
+    def calculate_acceleration(self) -> None:
+        """
+        Calculates the acceleration of every sample from the speed and time difference with the previous sample,
+        the same way as BMP280.calculate_acceleration.
+        """
+        self.columns["acceleration"] = self._finite_difference(self.columns["speed"])
+
+    def _finite_difference(self, values: np.ndarray) -> np.ndarray:
+        result = np.zeros(len(values), dtype=np.float64)
+        if len(values) < 2:
+            return result
+        time_differences = np.diff(self.columns["time"])
+        valid = time_differences != 0
+        result[1:][valid] = np.abs(np.diff(values)[valid]) / time_differences[valid]
+        return result
+
+class DHT11Columns(SensorColumns):
+    TABLE_NAME = "DHT11"
+
+class GPSColumns(SensorColumns):
+    TABLE_NAME = "GPS"
+
+# The columnar container of every table
+COLUMN_CLASSES = {"BMP280": BMP280Columns, "DHT11": DHT11Columns, "GPS": GPSColumns}
@@ -0,0 +1,245 @@
+"""
+This module provides a batched SQLite writer for the CanSat databases.
+Rows are collected per table and inserted with executemany inside one transaction per batch.
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator, create_tables
+    import classes
+except ImportError:
+    from program_files.cansattools import logger_creator, create_tables
+    import program_files.classes as classes
+logger = logger_creator("db_writer")
+
+try:
+    import sqlite3
+    from sqlite3 import Error
+    import time
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+TABLE_COLUMNS = {
+    "BMP280": classes.BMP280.COLUMNS,
+    "DHT11": classes.DHT11.COLUMNS,
+    "GPS": classes.GPS.COLUMNS,
+}
+
+# Order of the values in the text lines of Arduino_onboard.ino (after the sensor name), the timestamp is always the last one
+RAW_LINE_COLUMNS = {
+    "BMP280": ("Temperature", "Pressure", "Height", "Time"),
+    "DHT11": ("Temperature", "Humidity", "Time"),
+    "GPS": ("Latitude", "Longitude", "Altitude", None, None, "Time"), # speed and satellites are not stored
+    "GPS_short": ("Latitude", "Longitude", "Time"),
+}
+
+def line_to_row(line: str) -> tuple[str, tuple[str, ...], tuple] | None:
+    """
+    Converts a text line of the onboard sketch to a database row.
+
+    Args:
+        line (str): A line like "BMP280\t21.50\t101325.00\t120.25\t15000".
+
+    Returns:
+        tuple[str, tuple[str, ...], tuple] | None: The table name, the column names and the values,
+            or None if the line is not a measurement.
+    """
+    fields = line.split()
+    if len(fields) < 2:
+        return None
+    table = fields[0]
+    if table == "GPS" and len(fields) == 4:
+        columns = RAW_LINE_COLUMNS["GPS_short"]
+    else:
+        columns = RAW_LINE_COLUMNS.get(table)
+    if columns is None or len(fields) - 1 != len(columns):
+        return None
+    names = tuple(name for name in columns if name is not None)
+    values = tuple(value for name, value in zip(columns, fields[1:]) if name is not None)
+    return table, names, values
+
+def _insert_statement(table: str, columns: tuple[str, ...]) -> str:
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+class BulkWriter:
+    """
+    Collects rows per table and writes them in batches.
+
+    Every batch is inserted with executemany inside a single explicit transaction. The database
+    is switched to WAL journal mode, so the analysis can read it while the ground station is
+    writing. The pending rows are written when `batch_size` rows are collected, when
+    `flush_interval` seconds passed since the last write (so a live stream shows up in the
+    database quickly), and when the writer is closed. If the database can't be written (e.g. it's
+    locked or the disk is full) the rows are kept and written by a later flush, only the rows
+    which can't be written even on close, or which the database rejects, are given up.
+
+    Args:
+        database_name (str): The path of the SQLite database. The tables are created if they don't exist.
+        batch_size (int, optional): The number of rows collected before writing. Defaults to 10000.
+        flush_interval (float, optional): The maximum time in seconds a row waits before it's written. Defaults to 1.0.
+        synchronous (str, optional): The synchronous pragma. NORMAL is safe with WAL, OFF is faster for replays. Defaults to "NORMAL".
+
+    Example:
+        with BulkWriter("datas/raw_data.db") as writer:
+            for line in lines:
+                writer.add_line(line)
+    """
+    def __init__(self, database_name: str, batch_size: int = 10000, flush_interval: float = 1.0, synchronous: str = "NORMAL") -> None:
+        self.database_name = database_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self.rows_lost = 0
+        self._failed = False # the last flush couldn't write, the next one waits `flush_interval` before retrying
+        # (table, columns) -> rows
+        self._pending: dict[tuple[str, tuple[str, ...]], list[tuple]] = {}
+        self._pending_count = 0
+        self._last_flush = time.monotonic()
+
+        # Transactions are handled by the writer, not by the sqlite3 module
+        self.conn = sqlite3.connect(database_name, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA synchronous={synchronous}")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("PRAGMA cache_size=-65536") # 64 MB
+        cursor = self.conn.cursor()
+        cursor.execute("BEGIN")
+        create_tables(cursor)
+        cursor.execute("COMMIT")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @property
+    def pending_rows(self) -> int:
+        """
+        The number of rows waiting to be written.
+        """
+        return self._pending_count
+
+    def add(self, table: str, row: tuple, columns: tuple[str, ...] = None) -> None:
+        """
+        Adds one row to the batch.
+
+        Args:
+            table (str): The name of the table.
+            row (tuple): The values of the row.
+            columns (tuple[str, ...], optional): The columns of the values. Defaults to every column of the table.
+        """
+        key = (table, columns if columns is not None else TABLE_COLUMNS[table])
+        rows = self._pending.get(key)
+        if rows is None:
+            rows = self._pending[key] = []
+        rows.append(row)
+        self._pending_count += 1
+        if self._pending_count >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def add_many(self, table: str, rows: list[tuple], columns: tuple[str, ...] = None) -> None:
+        """
+        Adds many rows of the same table to the batch.
+        """
+        key = (table, columns if columns is not None else TABLE_COLUMNS[table])
+        self._pending.setdefault(key, []).extend(rows)
+        self._pending_count += len(rows)
+        if self._pending_count >= self.batch_size:
+            self.flush()
+
+    def add_objects(self, objects: list) -> None:
+        """
+        Adds BMP280, DHT11 or GPS objects. The table is chosen by the class of the objects.
+        """
+        for obj in objects:
+            self.add(type(obj).__name__, obj.to_row(), type(obj).COLUMNS)
+
+    def add_line(self, line: str) -> bool:
+        """
+        Adds a text line of the onboard sketch. Returns False if the line is not a measurement.
+        """
+        parsed = line_to_row(line)
+        if parsed is None:
+            return False
+        table, columns, values = parsed
+        self.add(table, values, columns)
+        return True
+
+    def flush(self, force: bool = False) -> bool:
+        """
+        Writes every pending row in a single transaction.
+
+        If the database can't be written, the rows are kept for the next flush. After a failure the next try
+        waits `flush_interval` (unless `force` is set), so a locked database isn't retried on every added row.
+        If the database rejects the rows themselves (e.g. a constraint), they are written one by one and
+        only the rejected ones are given up.
+
+        Returns:
+            bool: True if every pending row was written or given up.
+        """
+        now = time.monotonic()
+        if self._pending_count == 0 or (self._failed and not force and now - self._last_flush < self.flush_interval):
+            return self._pending_count == 0
+        self._last_flush = now
+        cursor = self.conn.cursor()
+        try:
+            try:
+                cursor.execute("BEGIN")
+                for (table, columns), rows in self._pending.items():
+                    if rows:
+                        cursor.executemany(_insert_statement(table, columns), rows)
+            except sqlite3.OperationalError:
+                raise
+            except Error as e:
+                logger.error(f"Error inserting data into the database, the rows are inserted one by one: {e}")
+                cursor.execute("ROLLBACK")
+                cursor.execute("BEGIN")
+                self._insert_one_by_one(cursor)
+            cursor.execute("COMMIT")
+        except Error as e:
+            logger.error(f"Error writing the database, {self._pending_count} rows are kept for the next try: {e}")
+            if self.conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            self._failed = True
+            return False
+        self.rows_written += self._pending_count
+        self._pending.clear()
+        self._pending_count = 0
+        self._failed = False
+        return True
+
+    def _insert_one_by_one(self, cursor: sqlite3.Cursor) -> None:
+        """
+        Inserts the pending rows one by one and leaves out the rows the database rejects.
+        An OperationalError (the database can't be written at all) is raised, the rows are kept then.
+        """
+        for (table, columns), rows in self._pending.items():
+            statement = _insert_statement(table, columns)
+            accepted = []
+            for row in rows:
+                try:
+                    cursor.execute(statement, row)
+                    accepted.append(row)
+                except sqlite3.OperationalError:
+                    raise
+                except Error as e:
+                    logger.error(f"A row of {table} is given up, the database rejected it: {row} ({e})")
+            self.rows_lost += len(rows) - len(accepted)
+            self._pending_count -= len(rows) - len(accepted)
+            rows[:] = accepted
+
+    def close(self) -> None:
+        """
+        Writes the pending rows and closes the connection. The rows which still can't be written are given up.
+        """
+        if not self.flush(force=True):
+            logger.error(f"{self._pending_count} rows are given up, the database can't be written")
+            self.rows_lost += self._pending_count
+            self._pending.clear()
+            self._pending_count = 0
+        try:
+            self.conn.close()
+        except Error as e:
+            logger.error(f"Error closing the database connection: {e}")
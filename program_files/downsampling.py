@@ -0,0 +1,165 @@
+"""
+This module selects the points of a long time series which are worth drawing at the current zoom level.
+A screen can't show more than a couple of points per pixel column, so a plot only gets the visible range,
+reduced to the minimum and maximum of every pixel column (or to LTTB points), and it's reduced again on zoom and pan.
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+except ImportError:
+    from program_files.cansattools import logger_creator
+logger = logger_creator("downsampling")
+
+try:
+    import numpy as np
+    import matplotlib.pyplot as plt
+    from matplotlib.lines import Line2D
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+METHODS = ("minmax", "lttb")
+
+def visible_range(x: np.ndarray, x_min: float = None, x_max: float = None) -> tuple[int, int]:
+    """
+    Returns the (start, stop) indices of the samples between x_min and x_max of a sorted series, plus one sample
+    on both sides, so the line reaches the edges of the axes.
+    """
+    start = 0 if x_min is None else max(int(np.searchsorted(x, x_min, side="left")) - 1, 0)
+    stop = len(x) if x_max is None else min(int(np.searchsorted(x, x_max, side="right")) + 1, len(x))
+    return start, stop
+
+def minmax_indices(y: np.ndarray, start: int, stop: int, buckets: int) -> np.ndarray:
+    """
+    Splits y[start:stop] into `buckets` parts of equal length and returns the indices of the minimum and the maximum
+    of every part (plus the first and the last sample) in order. The envelope of the series, every spike included,
+    is kept. NaN values are only selected if a part has nothing else, so the gaps stay visible.
+    """
+    count = stop - start
+    if count <= 2 * buckets:
+        return np.arange(start, stop)
+    size = -(-count // buckets)
+    # The last part is padded by repeating its last sample
+    positions = np.minimum(np.arange(size * buckets), count - 1).reshape(buckets, size) + start
+    values = y[positions]
+    nan = np.isnan(values)
+    low = np.argmin(np.where(nan, np.inf, values), axis=1)
+    high = np.argmax(np.where(nan, -np.inf, values), axis=1)
+    rows = np.arange(buckets)
+    indices = np.concatenate(([start, stop - 1], positions[rows, low], positions[rows, high]))
+    return np.unique(indices)
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, start: int, stop: int, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets (Steinarsson, 2013): keeps the first and the last sample and, from every bucket,
+    the sample which forms the largest triangle with the previously kept sample and the average of the next bucket.
+    It keeps the visual shape with fewer points than min/max, but a spike can be lost if its bucket has a larger one.
+    """
+    count = stop - start
+    if count <= threshold or threshold < 3:
+        return np.arange(start, stop)
+    x = np.asarray(x[start:stop], dtype=np.float64)
+    y = np.asarray(y[start:stop], dtype=np.float64)
+    edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+    selected = np.zeros(threshold, dtype=np.int64)
+    selected[-1] = count - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        first, last = edges[bucket], edges[bucket + 1]
+        next_first, next_last = last, edges[bucket + 2] if bucket + 2 < len(edges) else count
+        average_x = x[next_first:next_last].mean()
+        average_y = np.nanmean(y[next_first:next_last]) if np.isfinite(y[next_first:next_last]).any() else y[previous]
+        areas = np.abs((x[previous] - average_x) * (y[first:last] - y[previous]) - (x[previous] - x[first:last]) * (average_y - y[previous]))
+        previous = first + (int(np.nanargmax(areas)) if np.isfinite(areas).any() else 0)
+        selected[bucket + 1] = previous
+    return selected + start
+
+def downsample(x: np.ndarray, y: np.ndarray, x_min: float = None, x_max: float = None, pixels: int = 1000, method: str = "minmax") -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the points of a series to draw between x_min and x_max on an axes `pixels` wide.
+
+    Args:
+        x (np.ndarray): The sorted x values (e.g. the times).
+        y (np.ndarray): The y values.
+        x_min (float, optional): The left limit of the axes. Defaults to None (the first sample).
+        x_max (float, optional): The right limit of the axes. Defaults to None (the last sample).
+        pixels (int, optional): The width of the axes in pixels. Defaults to 1000.
+        method (str, optional): "minmax" (2 points per pixel column, keeps every spike) or "lttb". Defaults to "minmax".
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The selected x and y values.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    start, stop = visible_range(x, x_min, x_max)
+    pixels = max(int(pixels), 1)
+    if method == "lttb":
+        indices = lttb_indices(x, y, start, stop, 2 * pixels)
+    else:
+        if method != "minmax":
+            logger.error(f"Unknown downsampling method: {method}, use one of {METHODS}")
+        indices = minmax_indices(y, start, stop, pixels)
+    return x[indices], y[indices]
+
+class LODLine:
+    """
+    A line which only draws the points visible at the current zoom level (level of detail).
+
+    The full series is kept, and the drawn points are selected again with `downsample` whenever the x limits
+    of the axes change (zoom, pan, a new live window), so zooming into a long flight shows every sample again.
+
+    Args:
+        ax (plt.Axes): The axes to draw on.
+        x (np.ndarray, optional): The sorted x values. Defaults to no data.
+        y (np.ndarray, optional): The y values. Defaults to no data.
+        fmt (str, optional): The format string of the line. Defaults to "-".
+        method (str, optional): The downsampling method, see downsample. Defaults to "minmax".
+        **kwargs: Passed to ax.plot (color, label, ...).
+
+    Example:
+        LODLine(ax, bmp280["time"], bmp280["height"], '-', color='blue', label='BMP280')
+    """
+    def __init__(self, ax: plt.Axes, x: np.ndarray = None, y: np.ndarray = None, fmt: str = "-", method: str = "minmax", **kwargs) -> None:
+        self.ax = ax
+        self.method = method
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.line: Line2D = ax.plot([], [], fmt, **kwargs)[0]
+        self._callback = ax.callbacks.connect("xlim_changed", lambda ax: self.refresh())
+        if x is not None:
+            self.set_data(x, y, autoscale=True)
+
+    def set_data(self, x: np.ndarray, y: np.ndarray, autoscale: bool = False) -> None:
+        """
+        Replaces the full series and draws the points of the current x limits.
+
+        Args:
+            autoscale (bool, optional): Extend the data limits of the axes to the whole series. Defaults to False.
+        """
+        self.x = np.asarray(x)
+        self.y = np.asarray(y, dtype=np.float64)
+        if autoscale and len(self.x):
+            finite = np.isfinite(self.y)
+            if finite.any():
+                self.ax.update_datalim([(self.x[0], np.min(self.y[finite])), (self.x[-1], np.max(self.y[finite]))])
+                self.ax.autoscale_view()
+        self.refresh()
+
+    def refresh(self) -> None:
+        """
+        Selects the drawn points for the current x limits and the width of the axes.
+        """
+        if len(self.x) == 0:
+            self.line.set_data([], [])
+            return
+        x_min, x_max = self.ax.get_xlim()
+        pixels = self.ax.bbox.width if self.ax.bbox.width > 1 else 1000
+        self.line.set_data(*downsample(self.x, self.y, x_min, x_max, pixels, self.method))
+
+    def remove(self) -> None:
+        """
+        Removes the line and stops following the limits of the axes.
+        """
+        self.ax.callbacks.disconnect(self._callback)
+        self.line.remove()
@@ -0,0 +1,211 @@
+"""
+This module generates whole synthetic CanSat flights with NumPy, for load testing and replaying without the CanSat.
+A flight has a pad phase, a powered ascent to the apogee, a parachute descent with wind drift and a landing.
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+    import classes
+except ImportError:
+    from program_files.cansattools import logger_creator
+    import program_files.classes as classes
+logger = logger_creator("flight_generator")
+
+try:
+    import math
+    from collections import namedtuple
+    import numpy as np
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+EARTH_RADIUS = 6371000.0 # m
+SEA_LEVEL_PRESSURE = 101325.0 # Pa
+TEMPERATURE_LAPSE_RATE = 0.0065 # deg C / m
+
+# The standard deviation of the sensor noise of every generated attribute
+NOISE = {
+    "BMP280": {"temperature": 0.05, "pressure": 2.0, "height": 0.2},
+    "DHT11": {"humidity": 0.5, "temperature": 0.3},
+    "GPS": {"latitude": 2e-6, "longitude": 2e-6, "altitude": 3.0},
+}
+
+# The mean time between two samples of every sensor in ms. The BMP280 and the GPS follow the recorded flight
+# (the medians of datas/raw_data.db), the DHT11 stays below the 100 ms gap threshold of the refinement.
+# Together with the jitter they stay below the gap thresholds of pipeline.REFINEMENT_SETTINGS, so only the dropouts are detected as missing data.
+INTERVALS = {"BMP280": 11.0, "DHT11": 50.0, "GPS": 246.0}
+
+# The size of the injected spikes of every attribute, the sign is random
+SPIKES = {
+    "BMP280": {"temperature": 15.0, "pressure": 2000.0, "height": 150.0},
+    "DHT11": {"humidity": 30.0, "temperature": 15.0},
+    "GPS": {"latitude": 0.01, "longitude": 0.01, "altitude": 300.0},
+}
+
+# The columns of every sensor plus the masks of the injected spikes (table -> attribute -> bool array)
+SyntheticFlight = namedtuple("SyntheticFlight", ["bmp280", "dht11", "gps", "spikes"])
+
+def flight_height(times: np.ndarray, launch_time: float = 10.0, apogee: float = 1000.0, ascent_time: float = 12.0, descent_rate: float = 8.0, ground_height: float = 100.0) -> np.ndarray:
+    """
+    Returns the true height above sea level at the given times.
+
+    The ascent decelerates evenly to zero speed at the apogee, then the CanSat sinks with a constant
+    parachute descent rate until it reaches the ground again.
+
+    Args:
+        times (np.ndarray): The times in seconds.
+        launch_time (float, optional): The time of the launch in seconds. Defaults to 10.0.
+        apogee (float, optional): The highest point above the ground in metres. Defaults to 1000.0.
+        ascent_time (float, optional): The duration of the ascent in seconds. Defaults to 12.0.
+        descent_rate (float, optional): The speed under the parachute in m/s. Defaults to 8.0.
+        ground_height (float, optional): The height of the launch site above sea level in metres. Defaults to 100.0.
+
+    Returns:
+        np.ndarray: The heights in metres.
+    """
+    elapsed = np.asarray(times, dtype=np.float64) - launch_time
+    ascent = np.clip(elapsed / ascent_time, 0, 1)
+    height = apogee * (1 - (1 - ascent) ** 2)
+    descent = np.clip(elapsed - ascent_time, 0, None) * descent_rate
+    return ground_height + np.clip(height - descent, 0, None)
+
+def sample_times(duration: float, interval: float, jitter: float, rng: np.random.Generator) -> np.ndarray:
+    """
+    Returns strictly increasing timestamps in milliseconds with the given mean interval (ms) and relative jitter.
+    """
+    count = max(int(duration * 1000 / interval), 1)
+    steps = interval * (1 + rng.uniform(-jitter, jitter, count))
+    return np.maximum(np.cumsum(np.maximum(steps, 1)).astype(np.int64), 1)
+
+def dropout_mask(times: np.ndarray, dropout_rate: float, mean_dropout_duration: float, min_dropout_duration: float, rng: np.random.Generator) -> np.ndarray:
+    """
+    Returns a mask of the lost samples. Every sample starts a dropout with `dropout_rate` probability. A dropout
+    lasts `min_dropout_duration` plus an exponential time with `mean_dropout_duration` mean (ms), so it's always
+    longer than a gap threshold of at most `min_dropout_duration`, whatever the interval of the sensor is.
+    """
+    count = len(times)
+    if dropout_rate <= 0 or count == 0:
+        return np.zeros(count, dtype=np.bool_)
+    starts = rng.random(count) < dropout_rate
+    durations = min_dropout_duration + rng.exponential(max(mean_dropout_duration - min_dropout_duration, 0), count)
+    # A sample is lost if it's before the end of any dropout started at or before it
+    ends = np.where(starts, times + durations, -np.inf)
+    return times < np.maximum.accumulate(ends)
+
+def add_spikes(values: np.ndarray, spike_rate: float, magnitude: float, rng: np.random.Generator) -> np.ndarray:
+    """
+    Adds single-sample spikes of ±magnitude to the values in place. Returns the mask of the spikes.
+    """
+    spikes = rng.random(len(values)) < spike_rate
+    values[spikes] += magnitude * rng.choice((-1.0, 1.0), int(spikes.sum()))
+    return spikes
+
+def generate_flight(duration: float = 200.0, seed: int = None, bmp280_interval: float = INTERVALS["BMP280"], dht11_interval: float = INTERVALS["DHT11"],
+                    gps_interval: float = INTERVALS["GPS"], jitter: float = 0.1, launch_time: float = 10.0, apogee: float = 1000.0, ascent_time: float = 12.0, descent_rate: float = 8.0,
+                    ground_height: float = 100.0, ground_temperature: float = 20.0, ground_humidity: float = 50.0, launch_site: tuple[float, float] = (47.4979, 19.0402),
+                    wind_speed: float = 5.0, wind_direction: float = 270.0, dropout_rate: float = 0.001, mean_dropout_duration: float = 1500.0,
+                    min_dropout_duration: float = 600.0, spike_rate: float = 0.002) -> SyntheticFlight:
+    """
+    Generates a whole synthetic flight in one call.
+
+    Every sensor gets its own timestamps (with jitter), the values follow the same flight profile
+    (see flight_height) with Gaussian sensor noise. The pressure and the temperature follow the standard
+    atmosphere, the GPS position drifts with the wind, which gets stronger with the height. Dropouts remove
+    runs of samples (so refinement finds missing data) and spikes are added to single samples (so refinement
+    finds outliers). The same seed always gives the same flight.
+
+    The speed, the acceleration and the flags are left zero, as they come from the sensors.
+    Millions of samples are generated in about a second, e.g. with duration=20000.
+
+    Args:
+        duration (float, optional): The length of the recording in seconds. Defaults to 200.0.
+        seed (int, optional): The seed of the random generator. Defaults to None (a different flight every time).
+        bmp280_interval (float, optional): The mean time between BMP280 samples in ms. Defaults to 11.0 (see INTERVALS).
+        dht11_interval (float, optional): The mean time between DHT11 samples in ms. Defaults to 50.0.
+        gps_interval (float, optional): The mean time between GPS samples in ms. Defaults to 246.0.
+        jitter (float, optional): The relative random variation of the intervals. Defaults to 0.1.
+        launch_time, apogee, ascent_time, descent_rate, ground_height: The flight profile, see flight_height.
+        ground_temperature (float, optional): The temperature on the ground in deg C. Defaults to 20.0.
+        ground_humidity (float, optional): The relative humidity on the ground in %. Defaults to 50.0.
+        launch_site (tuple[float, float], optional): The latitude and longitude of the launch. Defaults to Budapest.
+        wind_speed (float, optional): The wind speed at 1000 m above the ground in m/s. Defaults to 5.0.
+        wind_direction (float, optional): The direction the wind blows from, in degrees (270 = western wind). Defaults to 270.0.
+        dropout_rate (float, optional): The probability of a dropout starting at a sample. Defaults to 0.001.
+        mean_dropout_duration (float, optional): The mean length of a dropout in ms. Defaults to 1500.0.
+        min_dropout_duration (float, optional): The shortest dropout in ms, longer than every gap threshold. Defaults to 600.0.
+        spike_rate (float, optional): The probability of a spike on a value. Defaults to 0.002.
+
+    Returns:
+        SyntheticFlight: The BMP280Columns, DHT11Columns and GPSColumns of the flight and the masks of the spikes.
+    """
+    rng = np.random.default_rng(seed)
+    profile = dict(launch_time=launch_time, apogee=apogee, ascent_time=ascent_time, descent_rate=descent_rate, ground_height=ground_height)
+    spikes: dict[str, dict[str, np.ndarray]] = {}
+
+    def sensor_columns(columns_class: type, interval: float) -> tuple[classes.SensorColumns, np.ndarray]:
+        times = sample_times(duration, interval, jitter, rng)
+        times = times[~dropout_mask(times, dropout_rate, mean_dropout_duration, min_dropout_duration, rng)]
+        data = columns_class(size=len(times))
+        data.columns["time"] = times
+        return data, flight_height(times / 1000, **profile)
+
+    def finish(data: classes.SensorColumns) -> None:
+        noise, magnitudes = NOISE[data.table_name], SPIKES[data.table_name]
+        spikes[data.table_name] = {}
+        for name, deviation in noise.items():
+            values = data.columns[name]
+            values += rng.normal(0, deviation, len(values))
+            spikes[data.table_name][name] = add_spikes(values, spike_rate, magnitudes[name], rng)
+
+    # BMP280: temperature and pressure of the standard atmosphere
+    bmp280, height = sensor_columns(classes.BMP280Columns, bmp280_interval)
+    bmp280.columns["height"] = height
+    bmp280.columns["temperature"] = ground_temperature - TEMPERATURE_LAPSE_RATE * (height - ground_height)
+    bmp280.columns["pressure"] = SEA_LEVEL_PRESSURE * (1 - height / 44330) ** 5.255
+    finish(bmp280)
+
+    # DHT11: the air gets drier with the height
+    dht11, height = sensor_columns(classes.DHT11Columns, dht11_interval)
+    dht11.columns["temperature"] = ground_temperature - TEMPERATURE_LAPSE_RATE * (height - ground_height)
+    dht11.columns["humidity"] = np.clip(ground_humidity - 0.01 * (height - ground_height), 0, 100)
+    finish(dht11)
+
+    # GPS: the drift is the integral of the wind speed, which grows with the height above the ground
+    gps, height = sensor_columns(classes.GPSColumns, gps_interval)
+    seconds = gps.columns["time"] / 1000
+    wind = wind_speed * np.sqrt(np.clip(height - ground_height, 0, None) / 1000)
+    time_steps = np.diff(seconds, prepend=seconds[:1])
+    drift = np.cumsum(wind * time_steps)
+    # The wind blows towards the opposite of its direction
+    heading = math.radians(wind_direction + 180)
+    east, north = drift * math.sin(heading), drift * math.cos(heading)
+    latitude, longitude = launch_site
+    gps.columns["latitude"] = latitude + np.degrees(north / EARTH_RADIUS)
+    gps.columns["longitude"] = longitude + np.degrees(east / (EARTH_RADIUS * math.cos(math.radians(latitude))))
+    gps.columns["altitude"] = height
+    finish(gps)
+
+    return SyntheticFlight(bmp280, dht11, gps, spikes)
+
+def flight_to_lines(flight: SyntheticFlight) -> list[str]:
+    """
+    Formats a synthetic flight as the text lines of Arduino_onboard.ino, ordered by time,
+    so it can be written to a raw file or passed to txt_to_db.
+    """
+    lines = []
+    for data, attribute_names in ((flight.bmp280, ("temperature", "pressure", "height")), (flight.dht11, ("temperature", "humidity")), (flight.gps, ("latitude", "longitude"))):
+        times = data.columns["time"]
+        # Same precision as the sketch sends
+        precision = 6 if data.table_name == "GPS" else 2
+        fields = [np.char.mod(f"%.{precision}f", data.columns[name]) for name in attribute_names]
+        lines.append((times, np.char.add(f"{data.table_name}\t", np.char.add(np.char.add(_join(fields), "\t"), times.astype(str)))))
+    times = np.concatenate([times for times, _ in lines])
+    order = np.argsort(times, kind="stable")
+    return np.concatenate([formatted for _, formatted in lines])[order].tolist()
+
+def _join(fields: list[np.ndarray]) -> np.ndarray:
+    joined = fields[0]
+    for field in fields[1:]:
+        joined = np.char.add(np.char.add(joined, "\t"), field)
+    return joined
@@ -0,0 +1,198 @@
+"""
+This module keeps an index of the stored graphs of a directory with a small thumbnail of every graph.
+The index remembers the modification time and the size of every source, so a thumbnail is only rendered again
+if its graph changed. Browsing the graphs only reads the index and the thumbnails, a graph is loaded when it's opened.
+Only the plot data (.npz) gets a thumbnail. The older pickled figures (.pkl) are listed, but a pickle can run any
+code when it's loaded, so it's only unpickled when the user opens it.
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+    import report
+except ImportError:
+    from program_files.cansattools import logger_creator
+    import program_files.report as report
+logger = logger_creator("graph_index")
+
+try:
+    import os
+    import json
+    import pickle
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    import matplotlib
+    import matplotlib.figure
+    import matplotlib.pyplot as plt
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+GRAPH_EXTENSIONS = (".npz", ".pkl") # plot data stored by report, and the older pickled figures
+CACHE_DIRECTORY_NAME = ".thumbnails"
+INDEX_FILE_NAME = "index.json"
+THUMBNAIL_SIZE = 240 # pixels, the longer side of a thumbnail
+
+def signature(path: str) -> list[int]:
+    """
+    Returns the [modification time in ns, size] of a file, a graph is rendered again if it changes.
+    """
+    status = os.stat(path)
+    return [status.st_mtime_ns, status.st_size]
+
+def load_figure(path: str, pyplot: bool = True) -> "plt.Figure":
+    """
+    Loads a stored graph as a figure, from plot data (.npz) or from a pickled figure (.pkl).
+    Only open a pickled figure if you trust the file, unpickling it can run any code.
+
+    Raises:
+        TypeError: The pickle is not a matplotlib figure (e.g. a plotly figure).
+    """
+    if path.endswith(".pkl"):
+        with open(path, "rb") as file:
+            fig = pickle.load(file)
+        if not isinstance(fig, matplotlib.figure.Figure):
+            raise TypeError(f"{path} is a pickled {type(fig).__module__}.{type(fig).__name__}, not a matplotlib figure")
+        return fig
+    return report.build_figure(report.load(path), pyplot=pyplot)
+
+def _title(fig: "plt.Figure") -> str:
+    suptitle = fig.get_suptitle()
+    titles = [ax.get_title() for ax in fig.axes if ax.get_title()]
+    return suptitle or (titles[0] if titles else "")
+
+def make_thumbnail(path: str, thumbnail_path: str) -> tuple[str, str, str | None]:
+    """
+    Renders the thumbnail of the plot data of a graph. It runs in a worker process, so the errors are returned instead of raised.
+
+    Returns:
+        tuple[str, str, str | None]: The path of the graph, its title and the error message.
+    """
+    try:
+        fig = report.build_figure(report.load(path), pyplot=False)
+        width, height = fig.get_size_inches()
+        fig.savefig(thumbnail_path, format="png", dpi=THUMBNAIL_SIZE / max(width, height, 1e-3))
+        title = _title(fig)
+        plt.close(fig)
+        return path, title, None
+    except Exception as e:
+        return path, "", str(e)
+
+class GraphIndex:
+    """
+    The index and the thumbnail cache of the graphs of a directory, stored in <directory>/.thumbnails.
+
+    Args:
+        directory (str, optional): The directory of the stored graphs. Defaults to report.DATA_DIRECTORY.
+
+    Example:
+        index = GraphIndex("graphs/pkls")
+        index.refresh()
+        for name in index.names():
+            print(name, index.title(name), index.thumbnail(name))
+        fig = index.load_figure("BMP_raw.npz")
+    """
+    def __init__(self, directory: str = report.DATA_DIRECTORY) -> None:
+        self.directory = directory
+        self.cache_directory = os.path.join(directory, CACHE_DIRECTORY_NAME)
+        self.index_path = os.path.join(self.cache_directory, INDEX_FILE_NAME)
+        # file name -> {"signature": [mtime_ns, size], "title": str, "thumbnail": file name in the cache or None}
+        self.entries: dict[str, dict] = {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as file:
+                self.entries = json.load(file)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading the graph index {self.index_path}, it's built again: {e}")
+
+    def names(self) -> list[str]:
+        """
+        Returns the file names of the indexed graphs in alphabetical order.
+        """
+        return sorted(self.entries)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def title(self, name: str) -> str:
+        return self.entries[name]["title"]
+
+    def thumbnail(self, name: str) -> str | None:
+        """
+        Returns the path of the thumbnail of a graph, None for a pickled figure or if it couldn't be rendered.
+        """
+        thumbnail = self.entries[name]["thumbnail"]
+        return os.path.join(self.cache_directory, thumbnail) if thumbnail is not None else None
+
+    def signature(self, name: str) -> list[int]:
+        return self.entries[name]["signature"]
+
+    def changed(self, name: str) -> bool:
+        """
+        Returns True if the source of a graph was modified or removed since it was indexed.
+        """
+        try:
+            return signature(self.path(name)) != self.entries[name]["signature"]
+        except (OSError, KeyError):
+            return True
+
+    def refresh(self, parallel: bool = True, workers: int = None) -> list[str]:
+        """
+        Scans the directory: new and modified plot data gets a new thumbnail (in a process pool if there are several),
+        pickled figures are only listed, removed graphs are left out. The index is only written if anything changed.
+
+        Returns:
+            list[str]: The names of the graphs which were added, modified or removed.
+        """
+        files = {name: signature(self.path(name)) for name in os.listdir(self.directory)
+                 if name.endswith(GRAPH_EXTENSIONS) and os.path.isfile(self.path(name))}
+        removed = [name for name in self.entries if name not in files]
+        outdated = [name for name, file_signature in files.items()
+                    if name not in self.entries or self.entries[name]["signature"] != file_signature]
+        for name in removed:
+            self._remove_thumbnail(name)
+            del self.entries[name]
+        if not removed and not outdated:
+            return []
+
+        os.makedirs(self.cache_directory, exist_ok=True)
+        for name in outdated:
+            # A changed graph loses its old thumbnail even if it doesn't get a new one
+            if name in self.entries:
+                self._remove_thumbnail(name)
+            if name.endswith(".pkl"):
+                self.entries[name] = {"signature": files[name], "title": "", "thumbnail": None}
+        tasks = [(self.path(name), os.path.join(self.cache_directory, name + ".png")) for name in outdated if not name.endswith(".pkl")]
+        if not parallel or len(tasks) < 2:
+            results = [make_thumbnail(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(tasks))) as pool:
+                results = [future.result() for future in as_completed([pool.submit(make_thumbnail, *task) for task in tasks])]
+        for path, title, error in results:
+            name = os.path.basename(path)
+            if error is not None:
+                logger.error(f"Error rendering the thumbnail of {path}: {error}")
+            self.entries[name] = {"signature": files[name], "title": title, "thumbnail": None if error is not None else name + ".png"}
+        self.save()
+        return removed + outdated
+
+    def save(self) -> None:
+        """
+        Writes the index. It's replaced at once, so an interrupted write doesn't leave a broken index.
+        """
+        os.makedirs(self.cache_directory, exist_ok=True)
+        temporary_path = self.index_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump(self.entries, file, indent=1)
+        os.replace(temporary_path, self.index_path)
+
+    def load_figure(self, name: str) -> "plt.Figure":
+        """
+        Loads a graph as a pyplot figure, only when it's opened. A pickled figure is unpickled here, never before.
+        """
+        return load_figure(self.path(name))
+
+    def _remove_thumbnail(self, name: str) -> None:
+        thumbnail = self.thumbnail(name)
+        if thumbnail is not None and os.path.exists(thumbnail):
+            os.remove(thumbnail)
@@ -0,0 +1,177 @@
+"""
+This module derives the vertical speed and acceleration of the CanSat from the BMP280 height for a whole series at once.
+The timestamps may be irregular, and the series is split at the gaps flagged as missing data, so a derivative never spans lost data.
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+    import classes
+except ImportError:
+    from program_files.cansattools import logger_creator
+    import program_files.classes as classes
+logger = logger_creator("kinematics")
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+METHODS = ("difference", "central", "savgol")
+CHUNK_SIZE = 65536 # windows fitted at once by the Savitzky-Golay filter, limits the temporary arrays
+
+def segment_ids(length: int, missing_data: np.ndarray = None) -> np.ndarray:
+    """
+    Numbers the continuous parts of a series. A sample flagged as missing data starts a new part, because data was lost before it.
+    """
+    if missing_data is None:
+        return np.zeros(length, dtype=np.int64)
+    return np.cumsum(np.asarray(missing_data, dtype=np.bool_), dtype=np.int64)
+
+def one_sided_derivative(times: np.ndarray, values: np.ndarray, segments: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the backward and the forward difference quotient of every sample, NaN where the neighbour is in another
+    segment, doesn't exist or has the same timestamp.
+    """
+    backward = np.full(len(values), np.nan)
+    forward = np.full(len(values), np.nan)
+    if len(values) < 2:
+        return backward, forward
+    steps = np.diff(times)
+    valid = (steps > 0) & (segments[1:] == segments[:-1])
+    quotients = np.divide(np.diff(values), steps, out=np.full(len(steps), np.nan), where=valid)
+    backward[1:] = quotients
+    forward[:-1] = quotients
+    return backward, forward
+
+def central_derivative(times: np.ndarray, values: np.ndarray, segments: np.ndarray) -> np.ndarray:
+    """
+    The second order central difference for irregular timestamps. The ends of the segments get the one-sided
+    difference, samples without a usable neighbour get 0.
+    """
+    backward, forward = one_sided_derivative(times, values, segments)
+    result = np.where(np.isnan(backward), forward, np.where(np.isnan(forward), backward, np.nan))
+    both = ~np.isnan(backward) & ~np.isnan(forward)
+    if both.any():
+        # Weighted by the opposite steps: exact for a parabola even if the steps differ
+        step_before = np.zeros(len(values))
+        step_after = np.zeros(len(values))
+        step_before[1:] = np.diff(times)
+        step_after[:-1] = np.diff(times)
+        h1, h2 = step_before[both], step_after[both]
+        result[both] = (h2 * backward[both] + h1 * forward[both]) / (h1 + h2)
+    return np.nan_to_num(result, nan=0.0)
+
+def savgol_derivatives(times: np.ndarray, values: np.ndarray, segments: np.ndarray, window: int = 11, order: int = 2) -> tuple[np.ndarray, np.ndarray] | None:
+    """
+    Savitzky-Golay filter for irregular timestamps: a polynomial is fitted by least squares to the `window` samples
+    around every sample (using their real timestamps), and its first and second derivatives at the sample are returned.
+
+    Every window is fitted at once with batched normal equations, CHUNK_SIZE windows at a time.
+    Samples whose window would reach over the end of a segment are NaN.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray] | None: The first and the second derivative, None if the arguments are invalid.
+    """
+    if window % 2 == 0 or window <= order:
+        logger.error(f"The window of the Savitzky-Golay filter has to be odd and longer than the order ({window}, {order})")
+        return None
+    length = len(values)
+    first = np.full(length, np.nan)
+    second = np.full(length, np.nan)
+    half = window // 2
+    if length < window:
+        return first, second
+    time_windows = sliding_window_view(times, window)
+    value_windows = sliding_window_view(values, window)
+    # The windows which lie in a single segment, the segment numbers never decrease
+    usable = segments[window - 1:] == segments[:length - window + 1]
+    powers = np.arange(order + 1)
+    for start in range(0, len(time_windows), CHUNK_SIZE):
+        stop = min(start + CHUNK_SIZE, len(time_windows))
+        offsets = time_windows[start:stop] - time_windows[start:stop, half:half + 1]
+        # Scaled to [-1, 1] so the normal equations stay well conditioned
+        scale = np.max(np.abs(offsets), axis=1)
+        usable_chunk = usable[start:stop] & (scale > 0)
+        scale[~usable_chunk] = 1.0
+        offsets /= scale[:, None]
+        # The normal equations only need the sums of the powers of the offsets
+        offset_powers = np.ones((stop - start, window))
+        moments = [np.full(stop - start, float(window))]
+        right_side = [value_windows[start:stop].sum(axis=1)]
+        for power in range(1, 2 * order + 1):
+            offset_powers = offset_powers * offsets
+            moments.append(offset_powers.sum(axis=1))
+            if power <= order:
+                right_side.append((offset_powers * value_windows[start:stop]).sum(axis=1))
+        normal_matrix = np.stack(moments, axis=1)[:, powers[:, None] + powers]
+        right_side = np.stack(right_side, axis=1)
+        # A window with too few distinct timestamps can't be fitted
+        usable_chunk &= np.abs(np.linalg.det(normal_matrix)) > 1e-12
+        normal_matrix[~usable_chunk] = np.eye(order + 1)
+        coefficients = np.linalg.solve(normal_matrix, right_side[:, :, None])[:, :, 0]
+        centers = np.arange(start, stop) + half
+        first[centers[usable_chunk]] = coefficients[usable_chunk, 1] / scale[usable_chunk]
+        if order >= 2:
+            second[centers[usable_chunk]] = 2 * coefficients[usable_chunk, 2] / scale[usable_chunk] ** 2
+    return first, second
+
+def derive(times: np.ndarray, heights: np.ndarray, missing_data: np.ndarray = None, method: str = "savgol", window: int = 11, order: int = 2, outliers: np.ndarray = None) -> tuple[np.ndarray, np.ndarray] | None:
+    """
+    Derives the vertical speed and acceleration of a series.
+
+    Args:
+        times (np.ndarray): The timestamps in milliseconds, they may be irregular.
+        heights (np.ndarray): The heights in metres.
+        missing_data (np.ndarray, optional): The missing data flags, the derivatives don't span the flagged gaps. Defaults to None.
+        method (str, optional): "difference" (backward difference), "central" (second order central difference)
+            or "savgol" (smoothing local polynomial fit). Defaults to "savgol".
+        window (int, optional): The number of samples of a Savitzky-Golay fit, odd. Defaults to 11.
+        order (int, optional): The order of the Savitzky-Golay polynomial. Defaults to 2.
+        outliers (np.ndarray, optional): The height outlier flags, flagged heights are replaced by the interpolation
+            of their neighbours, so a single spike doesn't dominate the derivatives. Defaults to None.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray] | None: The speed in m/s and the acceleration in m/s^2, positive upwards,
+            or None if the method is unknown.
+    """
+    times = np.asarray(times, dtype=np.float64) / 1000
+    heights = np.asarray(heights, dtype=np.float64)
+    segments = segment_ids(len(times), missing_data)
+    if outliers is not None and np.any(outliers) and not np.all(outliers):
+        outliers = np.asarray(outliers, dtype=np.bool_)
+        heights = heights.copy()
+        heights[outliers] = np.interp(times[outliers], times[~outliers], heights[~outliers])
+    if method == "difference":
+        backward, _ = one_sided_derivative(times, heights, segments)
+        speed = np.nan_to_num(backward, nan=0.0)
+        backward, _ = one_sided_derivative(times, speed, segments)
+        return speed, np.nan_to_num(backward, nan=0.0)
+    if method == "central":
+        speed = central_derivative(times, heights, segments)
+        return speed, central_derivative(times, speed, segments)
+    if method == "savgol":
+        result = savgol_derivatives(times, heights, segments, window, order)
+        if result is None:
+            return None
+        speed, acceleration = result
+        # The ends of the segments, which have no full window, get the central differences
+        fallback_speed = central_derivative(times, heights, segments)
+        speed = np.where(np.isnan(speed), fallback_speed, speed)
+        if order < 2:
+            acceleration = np.full(len(speed), np.nan)
+        acceleration = np.where(np.isnan(acceleration), central_derivative(times, speed, segments), acceleration)
+        return speed, acceleration
+    logger.error(f"Unknown derivation method: {method}, use one of {METHODS}")
+    return None
+
+def derive_kinematics(data: "classes.BMP280Columns", method: str = "savgol", window: int = 11, order: int = 2) -> None:
+    """
+    Derives the speed and the acceleration of a BMP280 series and writes them into its columns (see derive).
+    The gaps and the height outliers are taken from the flags, so call it after the refinement if they should be respected.
+    """
+    result = derive(data["time"], data["height"], data["missing_data"], method, window, order, data["is_height_outlier"])
+    if result is not None:
+        data.columns["speed"], data.columns["acceleration"] = result
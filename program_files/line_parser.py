@@ -0,0 +1,170 @@
+"""
+This module parses the text telemetry of the ground station from a raw byte stream.
+Damaged lines are rejected (and counted by reason) instead of raising or reaching the raw file and the database.
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+    from db_writer import RAW_LINE_COLUMNS
+except ImportError:
+    from program_files.cansattools import logger_creator
+    from program_files.db_writer import RAW_LINE_COLUMNS
+logger = logger_creator("line_parser")
+
+try:
+    import re
+    from collections import namedtuple, Counter
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+# Every field of the lines of Arduino_onboard.ino, RAW_LINE_COLUMNS tells which of them are stored
+LINE_FIELDS = {
+    "BMP280": ("Temperature", "Pressure", "Height", "Time"),
+    "DHT11": ("Temperature", "Humidity", "Time"),
+    "GPS": ("Latitude", "Longitude", "Altitude", "Speed", "Satellites", "Time"),
+    "GPS_short": ("Latitude", "Longitude", "Time"),
+}
+INTEGER_FIELDS = {"Time", "Satellites"}
+
+# (sensor, field): the physically possible values, from the datasheets of the sensors
+FIELD_RANGES = {
+    ("BMP280", "Temperature"): (-40.0, 85.0),
+    ("BMP280", "Pressure"): (30000.0, 110000.0), # Pa
+    ("BMP280", "Height"): (-500.0, 10000.0),
+    ("DHT11", "Temperature"): (-20.0, 60.0),
+    ("DHT11", "Humidity"): (0.0, 100.0),
+    ("GPS", "Latitude"): (-90.0, 90.0),
+    ("GPS", "Longitude"): (-180.0, 180.0),
+    ("GPS", "Altitude"): (-500.0, 20000.0),
+    ("GPS", "Speed"): (0.0, 500.0),
+    ("GPS", "Satellites"): (0, 50),
+}
+TIME_RANGE = (0, 2**32 - 1) # millis() of the CanSat
+
+# The last sensor name of a line marks the start of the telemetry, anything before it is noise or a line
+# which lost its line ending
+SENSOR_PATTERN = re.compile(r"(BMP280|DHT11|GPS)(?=[ \t])")
+
+# columns are the database columns of the stored values, line is the cleaned text line for the raw file
+ParsedLine = namedtuple("ParsedLine", ["sensor", "columns", "values", "line"])
+
+class LineParser:
+    """
+    Splits a byte stream into lines and converts the telemetry lines to validated values.
+
+    The bytes can arrive in chunks of any size. Bytes which are not ASCII are replaced, so a bad byte only
+    damages its own field. The parser resynchronizes on line endings and on the sensor names: noise before
+    the sensor name is skipped, and overlong lines (a lost line ending) are dropped up to the next line ending.
+    Every field is checked for its type and its range (see FIELD_RANGES).
+
+    It has the same `feed` interface as protocol.FrameDecoder, so SerialReader can run either of them on its thread.
+
+    Args:
+        max_line_length (int, optional): Lines longer than this are rejected. Defaults to 256.
+
+    Attributes:
+        accepted (int): The number of valid telemetry lines.
+        rejects (Counter): The number of rejected lines by reason (not_telemetry, error_message, field_count,
+            bad_value, out_of_range, too_long).
+        resynchronized (int): The number of accepted lines which had noise before the sensor name.
+    """
+    def __init__(self, max_line_length: int = 256) -> None:
+        self.max_line_length = max_line_length
+        self.accepted = 0
+        self.rejects: Counter = Counter()
+        self.resynchronized = 0
+        self._buffer = bytearray()
+        self._discarding = False
+
+    @property
+    def pending_bytes(self) -> int:
+        """
+        The number of received bytes waiting for their line ending.
+        """
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> list[ParsedLine]:
+        """
+        Adds received bytes to the buffer and returns every complete, valid line.
+
+        Args:
+            data (bytes): The received bytes.
+
+        Returns:
+            list[ParsedLine]: The parsed lines in the order they were received.
+        """
+        buffer = self._buffer
+        buffer += data
+        parsed = []
+        end = buffer.rfind(b"\n")
+        if end >= 0:
+            lines = bytes(buffer[:end]).split(b"\n")
+            del buffer[:end + 1]
+            if self._discarding:
+                # The rest of an overlong line
+                lines = lines[1:]
+                self._discarding = False
+            for raw_line in lines:
+                result = self.parse_line(raw_line)
+                if result is not None:
+                    parsed.append(result)
+        if len(buffer) > self.max_line_length:
+            # The line ending was lost, drop everything until the next one
+            if not self._discarding:
+                self.rejects["too_long"] += 1
+            self._discarding = True
+            buffer.clear()
+        return parsed
+
+    def parse_line(self, raw_line: bytes) -> ParsedLine | None:
+        """
+        Validates and converts one line (without its line ending). Returns None and counts the reason if it's rejected.
+        """
+        if not raw_line.strip():
+            return None
+        if len(raw_line) > self.max_line_length:
+            self.rejects["too_long"] += 1
+            return None
+        text = raw_line.decode("ascii", "replace")
+        if text.lstrip().startswith("ERROR"):
+            # Error report of the CanSat, e.g. "ERROR\tSetup\tBMP280 sensor is missing"
+            self.rejects["error_message"] += 1
+            return None
+        match = None
+        for match in SENSOR_PATTERN.finditer(text):
+            pass
+        if match is None:
+            self.rejects["not_telemetry"] += 1
+            return None
+
+        fields = text[match.start():].split()
+        sensor = fields[0]
+        layout = "GPS_short" if sensor == "GPS" and len(fields) == len(LINE_FIELDS["GPS_short"]) + 1 else sensor
+        names = LINE_FIELDS[layout]
+        if len(fields) - 1 != len(names):
+            self.rejects["field_count"] += 1
+            return None
+
+        columns = []
+        values = []
+        for name, stored_name, field in zip(names, RAW_LINE_COLUMNS[layout], fields[1:]):
+            try:
+                value = int(field) if name in INTEGER_FIELDS else float(field)
+            except ValueError:
+                self.rejects["bad_value"] += 1
+                return None
+            low, high = TIME_RANGE if name == "Time" else FIELD_RANGES[(sensor, name)]
+            # NaN (a failed reading of the sensor) is out of every range
+            if not low <= value <= high:
+                self.rejects["out_of_range"] += 1
+                return None
+            if stored_name is not None:
+                columns.append(stored_name)
+                values.append(value)
+
+        self.accepted += 1
+        if match.start() > 0:
+            self.resynchronized += 1
+        return ParsedLine(sensor, tuple(columns), tuple(values), "\t".join(fields))
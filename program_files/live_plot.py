@@ -0,0 +1,137 @@
+"""
+This module provides a real-time plot which creates its line artists only once.
+Every frame only updates the data of the existing lines, so the cost of a frame doesn't grow during the flight.
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+    import downsampling
+except ImportError:
+    from program_files.cansattools import logger_creator
+    import program_files.downsampling as downsampling
+logger = logger_creator("live_plot")
+
+try:
+    import numpy as np
+    import matplotlib.pyplot as plt
+    from matplotlib.lines import Line2D
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+class LivePlot:
+    """
+    A stack of time-series panels with one persistent Line2D artist per panel.
+
+    The axis limits are only changed when new data leaves the visible area. The limits are
+    extended with some headroom, so a full redraw of the figure (ticks, labels) is only needed
+    a few times during a flight. Every other frame only redraws the lines, which can be blitted.
+
+    The full series of every panel is kept, but a line only gets the points which are visible at the current
+    zoom level (see downsampling), so a long window stays cheap to draw. Zooming or panning selects them again.
+
+    Args:
+        fig (plt.Figure): The figure to draw on.
+        panels (list[tuple[str, str, str]]): (x label, y label, line format) for every panel, from top to bottom.
+        rows (int, optional): The number of subplot rows of the figure. Defaults to the number of panels.
+        headroom (float, optional): The ratio of the data range added as free space when the limits are extended. Defaults to 0.25.
+        downsampling (str, optional): The downsampling method ("minmax" or "lttb"), None draws every sample. Defaults to "minmax".
+    """
+    def __init__(self, fig: plt.Figure, panels: list[tuple[str, str, str]], rows: int = None, headroom: float = 0.25, downsampling: str = "minmax") -> None:
+        self.fig = fig
+        self.headroom = headroom
+        self.downsampling = downsampling
+        self.axes: list[plt.Axes] = []
+        self.lines: list[Line2D] = []
+        rows = rows if rows is not None else len(panels)
+        for i, (xlabel, ylabel, line_format) in enumerate(panels, start=1):
+            ax = fig.add_subplot(rows, 1, i)
+            ax.set_xlabel(xlabel)
+            ax.set_ylabel(ylabel)
+            line, = ax.plot([], [], line_format)
+            self.axes.append(ax)
+            self.lines.append(line)
+            ax.callbacks.connect("xlim_changed", lambda ax, index=i - 1: self._draw_visible(index))
+        # None means that the panel has no data yet
+        self.limits: list[tuple[float, float, float, float] | None] = [None] * len(panels)
+        # The full (x, y) series of every panel, the lines only get the visible part
+        self.series: list[tuple[np.ndarray, np.ndarray]] = [(np.zeros(0), np.zeros(0))] * len(panels)
+
+    def init(self) -> list[Line2D]:
+        """
+        Init function for FuncAnimation. Returns the artists which are redrawn on every frame.
+        """
+        for line in self.lines:
+            line.set_data([], [])
+        return self.lines
+
+    def _draw_visible(self, index: int) -> None:
+        """
+        Gives the line of a panel the points of its series which are visible at the current x limits.
+        """
+        x, y = self.series[index]
+        if self.downsampling is None or len(x) == 0:
+            self.lines[index].set_data(x, y)
+            return
+        ax = self.axes[index]
+        x_min, x_max = ax.get_xlim()
+        pixels = ax.bbox.width if ax.bbox.width > 1 else 1000
+        self.lines[index].set_data(*downsampling.downsample(x, y, x_min, x_max, pixels, self.downsampling))
+
+    def _extend_limits(self, index: int, x, y) -> bool:
+        """
+        Extends the limits of a panel if the data doesn't fit. Returns True if the limits changed.
+        """
+        # NaN values (e.g. hidden outliers) are ignored
+        if np.isnan(y).all():
+            return False
+        x_min, x_max, y_min, y_max = np.nanmin(x), np.nanmax(x), np.nanmin(y), np.nanmax(y)
+        limits = self.limits[index]
+        if limits is not None and x_min - limits[0] > (limits[1] - limits[0]) / 2:
+            # The data window slid forward (old samples left the buffer), fit the limits again
+            limits = None
+        if limits is not None and limits[0] <= x_min and x_max <= limits[1] and limits[2] <= y_min and y_max <= limits[3]:
+            return False
+
+        x_margin = (x_max - x_min) * self.headroom or 1
+        y_margin = (y_max - y_min) * self.headroom or 1
+        if limits is None:
+            limits = (x_min, x_max + x_margin, y_min - y_margin, y_max + y_margin)
+        else:
+            # Only the violated bounds are moved, the others are kept
+            limits = (min(limits[0], x_min),
+                      x_max + x_margin if x_max > limits[1] else limits[1],
+                      y_min - y_margin if y_min < limits[2] else limits[2],
+                      y_max + y_margin if y_max > limits[3] else limits[3])
+        self.limits[index] = limits
+        self.axes[index].set_xlim(limits[0], limits[1])
+        self.axes[index].set_ylim(limits[2], limits[3])
+        return True
+
+    def update(self, series: list[tuple]) -> list[Line2D]:
+        """
+        Updates the lines with the given data. Returns the artists for FuncAnimation.
+
+        Args:
+            series (list[tuple]): (x values, y values) for every panel, in the order of the panels.
+                The values can be lists or NumPy arrays (e.g. the columns of a RingBuffer).
+
+        Returns:
+            list[Line2D]: The updated line artists.
+        """
+        limits_changed = False
+        for index, (x, y) in enumerate(series):
+            if len(x) == 0 or len(x) != len(y):
+                continue
+            x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+            self.series[index] = (x, y)
+            # The limits are fitted to the full series, changing them draws the visible points too
+            if self._extend_limits(index, x, y):
+                limits_changed = True
+            else:
+                self._draw_visible(index)
+        if limits_changed:
+            # Ticks and labels are not part of the blitted artists, the whole figure has to be redrawn
+            self.fig.canvas.draw()
+        return self.lines
@@ -0,0 +1,216 @@
+"""
+This module reads large raw telemetry logs without loading them into memory.
+The log is memory-mapped and a line index (offset, sensor, time) is built once and cached beside the file.
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+except ImportError:
+    from program_files.cansattools import logger_creator
+logger = logger_creator("log_reader")
+
+try:
+    import os
+    import mmap
+    import json
+    import numpy as np
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+# Sensor codes of the index, 0 is a line which is not a measurement
+SENSORS = ("", "BMP280", "DHT11", "GPS", "MPU6050")
+SENSOR_CODES = {name: code for code, name in enumerate(SENSORS) if name}
+
+INDEX_DTYPE = np.dtype([("offset", "<i8"), ("length", "<i4"), ("sensor", "u1"), ("time", "<i8")])
+INDEX_VERSION = 1
+CHUNK_SIZE = 64 * 2**20 # bytes scanned at once while indexing
+MAX_TIME_DIGITS = 10 # millis() fits into 10 digits
+
+def build_index(data: np.ndarray) -> np.ndarray:
+    """
+    Builds the line index of a log with NumPy, without creating a Python object per line.
+
+    Args:
+        data (np.ndarray): The bytes of the log as a uint8 array (usually a view of the memory map).
+
+    Returns:
+        np.ndarray: One INDEX_DTYPE record per line: offset, length (without the line ending), sensor code
+            and the timestamp (the last field of the line, -1 if it's not a number).
+    """
+    size = len(data)
+    # The line endings, found chunk by chunk so the temporary arrays stay small
+    newlines = [np.flatnonzero(data[start:start + CHUNK_SIZE] == 10) + start for start in range(0, size, CHUNK_SIZE)]
+    ends = np.concatenate(newlines) if newlines else np.zeros(0, dtype=np.int64)
+    if size and (len(ends) == 0 or ends[-1] != size - 1):
+        # The last line has no line ending
+        ends = np.append(ends, size)
+    starts = np.concatenate(([0], ends[:-1] + 1)).astype(np.int64) if len(ends) else np.zeros(0, dtype=np.int64)
+    ends = ends.astype(np.int64)
+    # Drop the carriage returns of the Arduino line endings
+    has_cr = (ends > starts) & (data[np.maximum(ends - 1, 0)] == 13)
+    ends = ends - has_cr
+
+    index = np.zeros(len(starts), dtype=INDEX_DTYPE)
+    index["offset"] = starts
+    index["length"] = ends - starts
+
+    # The sensor is the beginning of the line, followed by a tab or a space
+    for name, code in SENSOR_CODES.items():
+        pattern = np.frombuffer(name.encode(), dtype=np.uint8)
+        matches = index["length"] > len(pattern)
+        for i, byte in enumerate(pattern):
+            matches &= data[np.minimum(starts + i, size - 1)] == byte
+        separator = data[np.minimum(starts + len(pattern), size - 1)]
+        matches &= (separator == 9) | (separator == 32)
+        index["sensor"][matches] = code
+
+    # The timestamp is the last field: the digits after the last tab or space of the line
+    index["time"] = -1
+    digits_start = ends.copy()
+    for i in range(1, MAX_TIME_DIGITS + 2):
+        position = np.maximum(ends - i, 0)
+        is_separator = (ends - i >= starts) & ((data[position] == 9) | (data[position] == 32)) & (digits_start == ends)
+        digits_start[is_separator] = ends[is_separator] - i + 1
+    lengths = ends - digits_start
+    valid = (lengths > 0) & (lengths <= MAX_TIME_DIGITS)
+    times = np.zeros(len(starts), dtype=np.int64)
+    for i in range(MAX_TIME_DIGITS):
+        in_number = valid & (i < lengths)
+        digit = data[np.minimum(digits_start + i, size - 1)].astype(np.int64) - 48
+        valid &= ~in_number | ((digit >= 0) & (digit <= 9))
+        times = np.where(in_number, times * 10 + digit, times)
+    index["time"][valid] = times[valid]
+    return index
+
+class RawLogReader:
+    """
+    Lazy, random access reader of a raw text log (e.g. datas/raw_data.txt).
+
+    The file is memory-mapped, so opening it doesn't read it. The line index is built on the first open
+    and saved as <file>.idx.npy (with <file>.idx.json describing the indexed file). Later opens map the
+    cached index too, so even multi-gigabyte logs open instantly. The index is rebuilt when the size or
+    the modification time of the log changes.
+
+    Lines are returned without the line ending, as bytes (`line_bytes`) or str (`line`, indexing).
+
+    Args:
+        file_name (str): The path of the log.
+        use_cache (bool, optional): Read and write the cached index. Defaults to True.
+
+    Example:
+        with RawLogReader("datas/raw_data.txt") as raw_log:
+            for line in raw_log.lines(sensor="BMP280", start_time=60000, end_time=120000):
+                ...
+    """
+    def __init__(self, file_name: str, use_cache: bool = True) -> None:
+        self.file_name = file_name
+        self._file = open(file_name, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # An empty file can't be mapped
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._data = np.frombuffer(self._map, dtype=np.uint8) if size else np.zeros(0, dtype=np.uint8)
+        self.index = self._load_index() if use_cache else None
+        if self.index is None:
+            self.index = build_index(self._data)
+            if use_cache:
+                self._save_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _signature(self) -> dict:
+        stat = os.stat(self.file_name)
+        return {"version": INDEX_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def _load_index(self) -> np.ndarray | None:
+        try:
+            with open(f"{self.file_name}.idx.json", "r") as file:
+                if json.load(file) != self._signature():
+                    return None
+            return np.load(f"{self.file_name}.idx.npy", mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+    def _save_index(self) -> None:
+        try:
+            np.save(f"{self.file_name}.idx.npy", self.index)
+            with open(f"{self.file_name}.idx.json", "w") as file:
+                json.dump(self._signature(), file)
+        except OSError as e:
+            # The log is still readable, only the next open will be slower
+            logger.warning(f"The index of {self.file_name} can't be saved: {e}")
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, line_number: int) -> str:
+        return self.line(line_number)
+
+    def line_bytes(self, line_number: int) -> bytes:
+        """
+        Returns a line as bytes, without the line ending.
+        """
+        record = self.index[line_number]
+        offset = int(record["offset"])
+        return self._map[offset:offset + int(record["length"])] if self._map is not None else b""
+
+    def line(self, line_number: int) -> str:
+        """
+        Returns a line as str, without the line ending. Bytes which are not ASCII are replaced.
+        """
+        return self.line_bytes(line_number).decode("ascii", "replace")
+
+    def select(self, sensor: str | tuple[str, ...] = None, start_time: int = None, end_time: int = None) -> np.ndarray:
+        """
+        Returns the numbers of the lines of the given sensor(s) in a time range (both ends included).
+
+        Args:
+            sensor (str | tuple[str, ...], optional): A sensor name or several of them. Defaults to every measurement.
+            start_time (int, optional): The first timestamp. Defaults to None (no lower limit).
+            end_time (int, optional): The last timestamp. Defaults to None (no upper limit).
+
+        Returns:
+            np.ndarray: The line numbers in the order of the file.
+        """
+        if sensor is None:
+            mask = self.index["sensor"] != 0
+        else:
+            codes = [SENSOR_CODES[name] for name in ((sensor,) if isinstance(sensor, str) else sensor)]
+            mask = np.isin(self.index["sensor"], codes)
+        if start_time is not None:
+            mask &= self.index["time"] >= start_time
+        if end_time is not None:
+            mask &= (self.index["time"] <= end_time) & (self.index["time"] >= 0)
+        return np.flatnonzero(mask)
+
+    def lines(self, sensor: str | tuple[str, ...] = None, start_time: int = None, end_time: int = None):
+        """
+        Yields the selected lines (see select) as str, one at a time.
+        """
+        for line_number in self.select(sensor, start_time, end_time).tolist():
+            yield self.line(line_number)
+
+    def sensor_counts(self) -> dict[str, int]:
+        """
+        Returns the number of lines of every sensor.
+        """
+        counts = np.bincount(self.index["sensor"], minlength=len(SENSORS))
+        return {name: int(counts[code]) for name, code in SENSOR_CODES.items()}
+
+    def close(self) -> None:
+        # The index and the data arrays are views of the maps, they have to be released first
+        self.index = None
+        self._data = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A line or an array still references the map, it's closed when it's freed
+                pass
+            self._map = None
+        self._file.close()
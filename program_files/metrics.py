@@ -0,0 +1,140 @@
+"""
+This module collects the latency of the stages of the live ingest path and the depth of its queues.
+The ground station shows them in a status line and writes them to a metrics file, so it's visible
+during the flight whether the ground station is falling behind the radio.
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+except ImportError:
+    from program_files.cansattools import logger_creator
+logger = logger_creator("metrics")
+
+try:
+    import json
+    import time
+    from collections import deque
+    import numpy as np
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+# The stages of the live path in the order the data goes through them
+STAGES = ("read", "decode", "parse", "refine", "buffer", "db_write", "render", "end_to_end")
+
+class PipelineMetrics:
+    """
+    Rolling latency percentiles per stage and the current queue depths.
+
+    Recording a duration is a deque append, the percentiles are only calculated when they are
+    requested (usually once per plot frame), so the instrumentation doesn't slow down the ingest.
+
+    Stages of the ground station:
+        read        time a message waited in the SerialReader buffer
+        decode      FrameDecoder.feed of a received chunk (on the reader thread)
+        parse       LineParser.feed of a received line (on the reader thread)
+        refine      OnlineRefiner.update of a sample
+        buffer      appending to the plot ring buffer
+        db_write    adding to the BulkWriter (including the flushes)
+        render      updating the plot
+        end_to_end  from receiving the message until its point was rendered
+
+    Args:
+        stages (tuple[str, ...], optional): The names of the stages. Defaults to STAGES.
+        window (int, optional): The number of recent durations kept per stage. Defaults to 1000.
+        metrics_file (str, optional): A file the summaries are appended to as JSON lines. Defaults to None.
+        write_interval (float, optional): The minimum time between two summaries in the file, in seconds. Defaults to 5.0.
+    """
+    def __init__(self, stages: tuple[str, ...] = STAGES, window: int = 1000, metrics_file: str = None, write_interval: float = 5.0) -> None:
+        self.stages = stages
+        self.durations = {stage: deque(maxlen=window) for stage in stages}
+        self.counts = {stage: 0 for stage in stages}
+        self.queue_depths: dict[str, int] = {}
+        self.counters: dict[str, int] = {}
+        self.write_interval = write_interval
+        self._last_write = time.monotonic()
+        self.file = None
+        if metrics_file is not None:
+            try:
+                self.file = open(metrics_file, "a")
+            except IOError as e:
+                logger.error(f"Error opening the metrics file: {e}")
+
+    def record(self, stage: str, seconds: float) -> None:
+        """
+        Adds the duration of one pass of a stage.
+        """
+        self.durations[stage].append(seconds)
+        self.counts[stage] += 1
+
+    def record_many(self, stage: str, seconds: list[float]) -> None:
+        """
+        Adds the durations of many passes of a stage, e.g. the waiting times of a drained batch.
+        """
+        self.durations[stage].extend(seconds)
+        self.counts[stage] += len(seconds)
+
+    def set_queue_depth(self, name: str, depth: int) -> None:
+        self.queue_depths[name] = depth
+
+    def set_counter(self, name: str, value: int) -> None:
+        """
+        Stores a running total, e.g. the dropped lines or the CRC errors.
+        """
+        self.counters[name] = value
+
+    def percentiles(self, stage: str) -> tuple[float, float, float] | None:
+        """
+        Returns the p50, p95 and p99 latency of a stage in milliseconds, or None if it wasn't recorded yet.
+        """
+        durations = self.durations[stage]
+        if not durations:
+            return None
+        return tuple(np.percentile(np.fromiter(durations, dtype=np.float64, count=len(durations)), (50, 95, 99)) * 1000)
+
+    def summary(self) -> dict:
+        """
+        Returns the percentiles of every recorded stage, the queue depths and the counters.
+        """
+        latencies = {}
+        for stage in self.stages:
+            result = self.percentiles(stage)
+            if result is not None:
+                latencies[stage] = {"p50": result[0], "p95": result[1], "p99": result[2], "count": self.counts[stage]}
+        return {"time": time.time(), "latency_ms": latencies, "queues": dict(self.queue_depths), "counters": dict(self.counters)}
+
+    def status_text(self) -> str:
+        """
+        Formats the summary as a few short lines for the status panel of the plot.
+        """
+        summary = self.summary()
+        parts = [f"{stage} {values['p50']:.3g}/{values['p95']:.3g}/{values['p99']:.3g}" for stage, values in summary["latency_ms"].items()]
+        lines = ["p50/p95/p99 ms: " + ", ".join(parts[:4]), "  " + ", ".join(parts[4:])]
+        queues = [f"{name} {depth}" for name, depth in summary["queues"].items()]
+        counters = [f"{name} {value}" for name, value in summary["counters"].items()]
+        lines.append("queues: " + ", ".join(queues) + ("   " + ", ".join(counters) if counters else ""))
+        return "\n".join(lines)
+
+    def maybe_write(self) -> None:
+        """
+        Appends the summary to the metrics file if `write_interval` passed since the last one.
+        """
+        if self.file is None or time.monotonic() - self._last_write < self.write_interval:
+            return
+        self._last_write = time.monotonic()
+        try:
+            self.file.write(json.dumps(self.summary()) + "\n")
+            self.file.flush()
+        except (IOError, ValueError) as e:
+            logger.error(f"Error writing the metrics file: {e}")
+
+    def close(self) -> None:
+        """
+        Writes a last summary and closes the metrics file.
+        """
+        if self.file is not None:
+            self._last_write = float("-inf")
+            self.maybe_write()
+            self.file.close()
+            self.file = None
@@ -0,0 +1,188 @@
+"""
+This module post-processes a flight with every sensor stream in its own process.
+The raw log is parsed in chunks and every sensor is refined in a process pool, the results are
+written to the database by the main process, so there is only one writer.
+
+Usage:
+    python -m program_files.pipeline datas/raw_data.txt datas/raw_data.db
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+    import classes
+    import refinement
+    import kinematics
+    from db_writer import BulkWriter, RAW_LINE_COLUMNS
+    from log_reader import RawLogReader
+    from line_parser import LineParser
+except ImportError:
+    from program_files.cansattools import logger_creator
+    import program_files.classes as classes
+    import program_files.refinement as refinement
+    import program_files.kinematics as kinematics
+    from program_files.db_writer import BulkWriter, RAW_LINE_COLUMNS
+    from program_files.log_reader import RawLogReader
+    from program_files.line_parser import LineParser
+logger = logger_creator("pipeline")
+
+try:
+    import os
+    from collections import Counter
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    import numpy as np
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+SENSORS = ("BMP280", "DHT11", "GPS")
+
+# The refinement of every sensor, the pairs are (launch, descent) thresholds split at the apogee
+REFINEMENT_SETTINGS = {
+    "BMP280": {"outlier_threshold": (18, 11), "lacking_data_threshold": 100},
+    "DHT11": {"lacking_data_threshold": 100},
+    "GPS": {"lacking_data_threshold": 500},
+}
+
+# The derivation of the BMP280 speed and acceleration, see kinematics.derive
+KINEMATICS_SETTINGS = {"method": "savgol", "window": 11, "order": 2}
+
+CHUNK_LINES = 250_000 # lines of one sensor parsed by one task
+
+def refine_sensor(data: "classes.SensorColumns") -> "classes.SensorColumns":
+    """
+    Refines the columns of a sensor with REFINEMENT_SETTINGS and derives the vertical speed and acceleration of the BMP280.
+    The kinematics are derived after the refinement, because they use its gaps and height outliers. They are not flagged
+    themselves, the spikes of the height are already left out of them. The columns are modified in place and returned,
+    so it can run in a worker process.
+    """
+    settings = REFINEMENT_SETTINGS[data.table_name]
+    if not isinstance(data, classes.BMP280Columns):
+        refinement.refine_columns(data, **settings)
+        return data
+    split_index = refinement.apogee_index(data["height"])
+    refinement.refine_columns(data, split_index=split_index, attribute_names=["temperature", "pressure", "height"], **settings)
+    kinematics.derive_kinematics(data, **KINEMATICS_SETTINGS)
+    return data
+
+def parse_lines(file_name: str, sensor: str, first: int, last: int) -> tuple[str, int, "classes.SensorColumns", dict]:
+    """
+    Parses the lines of one sensor from `first` to `last` (counting only the lines of the sensor) of a raw log.
+
+    Returns:
+        tuple[str, int, classes.SensorColumns, dict]: The sensor, `first`, the parsed columns and the rejected lines by reason.
+    """
+    # The stored columns of every line layout of the sensor (GPS has a short and a full one)
+    names = [name for name in classes.ROW_CLASSES[sensor].COLUMNS
+             if any(name in columns for layout, columns in RAW_LINE_COLUMNS.items() if layout.split("_")[0] == sensor)]
+    values: dict[str, list] = {name: [] for name in names}
+    parser = LineParser()
+    with RawLogReader(file_name) as raw_log:
+        for line_number in raw_log.select(sensor)[first:last].tolist():
+            parsed = parser.parse_line(raw_log.line_bytes(line_number))
+            if parsed is None or parsed.sensor != sensor:
+                continue
+            row = dict(zip(parsed.columns, parsed.values))
+            for name in names:
+                values[name].append(row.get(name, 0.0))
+    data = classes.COLUMN_CLASSES[sensor](size=len(values["Time"]))
+    for name in names:
+        data.columns[classes.column_to_attribute(name)] = np.array(values[name], dtype=data.column_type(name))
+    return sensor, first, data, dict(parser.rejects)
+
+def concatenate(parts: list["classes.SensorColumns"]) -> "classes.SensorColumns":
+    """
+    Joins the columns of the chunks of a sensor in order.
+    """
+    first = parts[0]
+    if len(parts) == 1:
+        return first
+    columns = {name: np.concatenate([part.columns[name] for part in parts]) for name in first.columns}
+    return type(first)(first.table_name, columns)
+
+def run(database_name: str, file_name: str = None, data: dict[str, "classes.SensorColumns"] = None, sensors: tuple[str, ...] = SENSORS,
+        parallel: bool = True, workers: int = None, chunk_lines: int = CHUNK_LINES) -> dict[str, "classes.SensorColumns"]:
+    """
+    Parses (from a raw log) or takes the columns of every sensor, refines them and writes them to the database.
+
+    Every chunk of the log and every sensor is a separate task of a process pool. A sensor is refined as soon as
+    all of its chunks are parsed, and it's written by the main process as soon as it's refined, so the writing of
+    one sensor overlaps the work on the others.
+
+    Args:
+        database_name (str): The database the refined rows are inserted into. The tables are created if they don't exist.
+        file_name (str, optional): A raw log to parse. Either this or `data` is required.
+        data (dict[str, classes.SensorColumns], optional): Already parsed columns per sensor, e.g. from the flight generator.
+        sensors (tuple[str, ...], optional): The sensors to process. Defaults to SENSORS.
+        parallel (bool, optional): Use a process pool, otherwise everything runs in this process. Defaults to True.
+        workers (int, optional): The number of worker processes. Defaults to the number of CPUs.
+        chunk_lines (int, optional): The number of lines parsed by one task. Defaults to CHUNK_LINES.
+
+    Returns:
+        dict[str, classes.SensorColumns]: The refined columns of every sensor.
+    """
+    tasks = []
+    if file_name is not None:
+        # The index is built once here, the workers map the cached one
+        with RawLogReader(file_name) as raw_log:
+            counts = raw_log.sensor_counts()
+        for sensor in sensors:
+            tasks.extend((parse_lines, (file_name, sensor, first, first + chunk_lines)) for first in range(0, max(counts[sensor], 1), chunk_lines))
+    elif data is None:
+        logger.error("Either a raw log or the columns have to be given")
+        return {}
+
+    results: dict[str, classes.SensorColumns] = {}
+    rejects: Counter = Counter()
+    with BulkWriter(database_name) as writer:
+        def write(refined: classes.SensorColumns) -> None:
+            results[refined.table_name] = refined
+            writer.add_many(refined.table_name, refined.rows(), classes.ROW_CLASSES[refined.table_name].COLUMNS)
+            writer.flush()
+
+        if not parallel:
+            chunks: dict[str, list] = {sensor: [] for sensor in sensors}
+            for function, arguments in tasks:
+                sensor, first, part, part_rejects = function(*arguments)
+                chunks[sensor].append(part)
+                rejects.update(part_rejects)
+            for sensor in sensors:
+                write(refine_sensor(concatenate(chunks[sensor]) if file_name is not None else data[sensor]))
+        else:
+            with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+                pending_chunks = Counter(arguments[1] for _, arguments in tasks)
+                chunks = {sensor: {} for sensor in sensors}
+                futures = {pool.submit(function, *arguments): "parse" for function, arguments in tasks}
+                if file_name is None:
+                    futures.update({pool.submit(refine_sensor, data[sensor]): "refine" for sensor in sensors})
+                while futures:
+                    future = next(as_completed(futures))
+                    kind = futures.pop(future)
+                    if kind == "refine":
+                        write(future.result())
+                        continue
+                    sensor, first, part, part_rejects = future.result()
+                    chunks[sensor][first] = part
+                    rejects.update(part_rejects)
+                    pending_chunks[sensor] -= 1
+                    if pending_chunks[sensor] == 0:
+                        parts = [chunks[sensor][first] for first in sorted(chunks[sensor])]
+                        futures[pool.submit(refine_sensor, concatenate(parts))] = "refine"
+    if rejects:
+        logger.warning(f"Rejected lines of {file_name}: {dict(rejects)}")
+    return results
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Parses, refines and stores a raw CanSat log with a process per sensor stream.")
+    parser.add_argument("file_name", help="the raw log, e.g. datas/raw_data.txt")
+    parser.add_argument("database_name", help="the database of the refined rows, e.g. datas/raw_data.db")
+    parser.add_argument("--sequential", action="store_true", help="process everything in this process")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    refined = run(args.database_name, args.file_name, parallel=not args.sequential, workers=args.workers)
+    print(", ".join(f"{sensor}: {len(columns)} rows" for sensor, columns in refined.items()) + f" in {time.perf_counter() - start:.2f} s")
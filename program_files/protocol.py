@@ -0,0 +1,163 @@
+"""
+This module provides the binary telemetry frame format of the MGZ CanSat and a decoder for it.
+
+Frame layout (little-endian, as the AVR stores it in memory):
+    sync        2 bytes   0xCA 0x5A
+    sensor id   uint8     1 = BMP280, 2 = DHT11, 3 = GPS
+    sequence    uint16    incremented by the CanSat for every transmitted frame, wraps around
+    time        uint32    millis() of the CanSat
+    payload     depends on the sensor id (see PAYLOADS)
+    crc         uint16    CRC-16/CCITT-FALSE of every byte before it
+
+The layout has to be kept in sync with sendFrame in Arduino_onboard.ino.
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+except ImportError:
+    from program_files.cansattools import logger_creator
+logger = logger_creator("protocol")
+
+try:
+    import struct
+    import binascii
+    from collections import namedtuple
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+SYNC = b'\xCA\x5A'
+HEADER = struct.Struct('<2sBHI')
+CRC = struct.Struct('<H')
+CRC_INITIAL_VALUE = 0xFFFF
+
+# sensor id: (sensor name, payload format, field names, scale of the fields or None)
+PAYLOADS = {
+    1: ("BMP280", struct.Struct('<fff'), ("temperature", "pressure", "altitude"), None),
+    2: ("DHT11", struct.Struct('<ff'), ("temperature", "humidity"), None),
+    # Coordinates are sent as microdegrees, a float32 would lose precision
+    3: ("GPS", struct.Struct('<iiffB'), ("latitude", "longitude", "altitude", "speed", "satellites"), (1e-6, 1e-6, 1, 1, 1)),
+}
+SENSOR_IDS = {name: sensor_id for sensor_id, (name, _, _, _) in PAYLOADS.items()}
+
+Frame = namedtuple("Frame", ["sensor", "sequence", "time", "values"])
+
+def encode_frame(sensor: str, sequence: int, time: int, values: tuple) -> bytes:
+    """
+    Builds a binary frame. It is the Python equivalent of sendFrame in Arduino_onboard.ino,
+    used for replaying and testing without the CanSat.
+
+    Args:
+        sensor (str): The name of the sensor (BMP280, DHT11 or GPS).
+        sequence (int): The sequence number of the frame.
+        time (int): The timestamp in milliseconds.
+        values (tuple): The values of the sensor in the order of PAYLOADS.
+
+    Returns:
+        bytes: The encoded frame including the CRC.
+    """
+    sensor_id = SENSOR_IDS[sensor]
+    _, payload, _, scales = PAYLOADS[sensor_id]
+    if scales is not None:
+        values = tuple(round(value / scale) if scale != 1 else value for value, scale in zip(values, scales))
+    body = HEADER.pack(SYNC, sensor_id, sequence & 0xFFFF, time & 0xFFFFFFFF) + payload.pack(*values)
+    return body + CRC.pack(binascii.crc_hqx(body, CRC_INITIAL_VALUE))
+
+def frame_to_line(frame: Frame) -> str:
+    """
+    Formats a decoded frame as a line of the text protocol (sensor, values, time separated by tabs),
+    so the raw files stay readable by txt_to_db.
+    """
+    return "\t".join([frame.sensor, *(f"{value:.6f}" if isinstance(value, float) else str(value) for value in frame.values), str(frame.time)])
+
+class FrameDecoder:
+    """
+    Decodes binary frames from a byte stream.
+
+    The bytes can arrive in chunks of any size, incomplete frames are kept until the rest
+    arrives. Bytes which don't belong to a valid frame (noise, debug text of the Arduino)
+    are skipped by searching for the next sync word. The values are unpacked straight from
+    the receive buffer with struct, no intermediate strings are created.
+
+    Attributes:
+        skipped_bytes (int): The number of bytes which were not part of a valid frame.
+        crc_errors (int): The number of frames rejected because of a wrong CRC.
+        unknown_sensors (int): The number of frames with an unknown sensor id.
+        lost_frames (int): The number of frames missing according to the sequence numbers.
+    """
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._last_sequence: int = None
+        self.skipped_bytes = 0
+        self.crc_errors = 0
+        self.unknown_sensors = 0
+        self.lost_frames = 0
+
+    @property
+    def pending_bytes(self) -> int:
+        """
+        The number of received bytes waiting for the rest of their frame.
+        """
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> list[Frame]:
+        """
+        Adds received bytes to the buffer and returns every complete frame.
+
+        Args:
+            data (bytes): The received bytes.
+
+        Returns:
+            list[Frame]: The decoded frames in the order they were received.
+        """
+        buffer = self._buffer
+        buffer += data
+        frames: list[Frame] = []
+        position = 0
+        length = len(buffer)
+        view = memoryview(buffer)
+        try:
+            while True:
+                start = buffer.find(SYNC, position)
+                if start < 0:
+                    # Keep a trailing first sync byte (not the end of the last frame), the second one might arrive with the next chunk
+                    keep = 1 if position < length and buffer[-1] == SYNC[0] else 0
+                    self.skipped_bytes += length - keep - position
+                    position = length - keep
+                    break
+                self.skipped_bytes += start - position
+                position = start
+                if length - start < HEADER.size:
+                    break
+                _, sensor_id, sequence, time = HEADER.unpack_from(view, start)
+                payload_format = PAYLOADS.get(sensor_id)
+                if payload_format is None:
+                    self.unknown_sensors += 1
+                    self.skipped_bytes += 1
+                    position = start + 1
+                    continue
+                sensor, payload, _, scales = payload_format
+                end = start + HEADER.size + payload.size + CRC.size
+                if end > length:
+                    break
+                if binascii.crc_hqx(view[start:end - CRC.size], CRC_INITIAL_VALUE) != CRC.unpack_from(view, end - CRC.size)[0]:
+                    self.crc_errors += 1
+                    self.skipped_bytes += 1
+                    position = start + 1
+                    continue
+                values = payload.unpack_from(view, start + HEADER.size)
+                if scales is not None:
+                    values = tuple(value * scale if scale != 1 else value for value, scale in zip(values, scales))
+                if self._last_sequence is not None:
+                    gap = (sequence - self._last_sequence - 1) & 0xFFFF
+                    # A huge gap means that the CanSat restarted, not that frames were lost
+                    if gap < 0x8000:
+                        self.lost_frames += gap
+                self._last_sequence = sequence
+                frames.append(Frame(sensor, sequence, time, values))
+                position = end
+        finally:
+            view.release()
+        del buffer[:position]
+        return frames
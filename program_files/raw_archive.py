@@ -0,0 +1,272 @@
+"""
+This module provides a buffered, rotating archive for the raw telemetry of the ground station.
+Every session writes new segment files, so a restart never overwrites the data of the previous session.
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+except ImportError:
+    from program_files.cansattools import logger_creator
+logger = logger_creator("raw_archive")
+
+try:
+    import os
+    import glob
+    import gzip
+    import shutil
+    import queue
+    import threading
+    import time
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+class RawArchive:
+    """
+    Writes the received data to segment files in batches on a background writer thread.
+
+    `write` only puts the data into a queue, so the serial reader and the plot never wait for the disk.
+    The writer thread collects the data and writes it with a single write call when `buffer_size` bytes are
+    collected or when the durability policy requires it. The durability policy is chosen by the operator:
+    the segment is flushed and fsynced after every `fsync_lines` writes and/or after `fsync_interval`
+    seconds, whichever comes first (None disables the condition). A segment is closed when it reaches
+    `max_segment_bytes` or `max_segment_seconds`, and closed segments are compressed with gzip on another
+    background thread, so the writer never waits for the compression.
+
+    The segments are named <prefix>_<session start>_<index><suffix>, e.g. raw_realtime_20241005-101500_0001.txt.
+    The data of a segment is only kept in memory until the next flush, call `flush` or `close` before exiting.
+
+    Args:
+        directory (str): The folder of the segments. It's created if it doesn't exist.
+        prefix (str, optional): The beginning of the file names. Defaults to "raw".
+        suffix (str, optional): The extension of the segments. Defaults to ".txt".
+        max_segment_bytes (int, optional): The size of a segment before a new one is started. Defaults to 16 MB.
+        max_segment_seconds (float, optional): The age of a segment before a new one is started, None disables it. Defaults to 600.
+        compress (bool, optional): Compress the closed segments. Defaults to True.
+        fsync_lines (int, optional): fsync after this many writes, None disables it. Defaults to 100.
+        fsync_interval (float, optional): fsync after this many seconds, None disables it. Defaults to 1.0.
+        buffer_size (int, optional): The number of bytes collected before writing. Defaults to 64 kB.
+    """
+    def __init__(self, directory: str, prefix: str = "raw", suffix: str = ".txt", max_segment_bytes: int = 16 * 2**20, max_segment_seconds: float = 600,
+                 compress: bool = True, fsync_lines: int = 100, fsync_interval: float = 1.0, buffer_size: int = 64 * 2**10) -> None:
+        self.directory = directory
+        self.prefix = prefix
+        self.suffix = suffix
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_seconds = max_segment_seconds
+        self.compress = compress
+        self.fsync_lines = fsync_lines
+        self.fsync_interval = fsync_interval
+        self.buffer_size = buffer_size
+        self.bytes_written = 0
+        self.fsyncs = 0
+        self.segment_name: str = None
+        self._session = time.strftime("%Y%m%d-%H%M%S")
+        self._index = 0
+        self._file = None
+        self._segment_bytes = 0
+        self._segment_start = 0.0
+        # Only used by the writer thread
+        self._pending: list[bytes] = []
+        self._pending_bytes = 0
+        self._unsynced_writes = 0
+        self._last_sync = time.monotonic()
+        self._compressors: list[threading.Thread] = []
+        # The data to write, (sync, threading.Event) flush requests and None to stop the writer
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        os.makedirs(directory, exist_ok=True)
+        self._open_segment()
+        self._writer = threading.Thread(target=self._run, name="RawArchiveWriter", daemon=True)
+        self._writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @property
+    def pending_writes(self) -> int:
+        """
+        The number of writes waiting for the writer thread (approximate).
+        """
+        return self._queue.qsize()
+
+    def write(self, data: bytes | str) -> None:
+        """
+        Adds data (a received chunk or line) to the archive. Strings are written as text lines.
+        It never waits for the disk, the data is written by the writer thread.
+        """
+        if isinstance(data, str):
+            data = (data + "\n").encode()
+        self._queue.put(data)
+
+    def flush(self, sync: bool = None) -> None:
+        """
+        Waits until the writer thread has written everything written before the call.
+
+        Args:
+            sync (bool, optional): fsync the segment. Defaults to the durability policy.
+        """
+        if not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put((sync, done))
+        done.wait()
+
+    def close(self) -> None:
+        """
+        Writes and syncs the collected data, closes the last segment and waits for the compressions.
+        """
+        if not self._writer.is_alive():
+            return
+        self._queue.put(None)
+        self._writer.join()
+        for thread in self._compressors:
+            thread.join()
+        self._compressors.clear()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                item = self._queue.get(timeout=self._time_to_deadline())
+            except queue.Empty:
+                self._poll()
+                continue
+            if item is None:
+                self._flush(sync=True)
+                self._close_segment()
+                return
+            if isinstance(item, tuple):
+                sync, done = item
+                self._flush(sync)
+                done.set()
+                continue
+            self._pending.append(item)
+            self._pending_bytes += len(item)
+            self._unsynced_writes += 1
+            if self._pending_bytes >= self.buffer_size or (self.fsync_lines is not None and self._unsynced_writes >= self.fsync_lines):
+                self._flush()
+            else:
+                self._poll()
+
+    def _time_to_deadline(self) -> float | None:
+        """
+        Returns the seconds until the fsync interval or the age of the segment is over, None if nothing is due.
+        """
+        deadlines = []
+        if self.fsync_interval is not None and (self._unsynced_writes or self._pending):
+            deadlines.append(self._last_sync + self.fsync_interval)
+        if self.max_segment_seconds is not None and (self._segment_bytes or self._pending):
+            deadlines.append(self._segment_start + self.max_segment_seconds)
+        return max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+
+    def _poll(self) -> None:
+        # Flushes the archive if the fsync interval or the age of the segment is over
+        now = time.monotonic()
+        if self.fsync_interval is not None and now - self._last_sync >= self.fsync_interval and self._unsynced_writes:
+            self._flush()
+        elif self.max_segment_seconds is not None and now - self._segment_start >= self.max_segment_seconds and (self._segment_bytes or self._pending):
+            self._flush()
+
+    def _flush(self, sync: bool = None) -> None:
+        """
+        Writes the collected data to the segment and rotates the segment if it's full.
+        """
+        if self._file is None:
+            return
+        if self._pending:
+            data = b"".join(self._pending)
+            self._pending.clear()
+            self._pending_bytes = 0
+            try:
+                self._file.write(data)
+                self._segment_bytes += len(data)
+                self.bytes_written += len(data)
+            except OSError as e:
+                logger.error(f"Error writing the raw archive: {e}")
+        if sync is None:
+            sync = self.fsync_lines is not None or self.fsync_interval is not None
+        if sync and self._unsynced_writes:
+            try:
+                os.fsync(self._file.fileno())
+                self.fsyncs += 1
+            except OSError as e:
+                logger.error(f"Error syncing the raw archive: {e}")
+        self._unsynced_writes = 0
+        self._last_sync = time.monotonic()
+        if self._segment_bytes >= self.max_segment_bytes or (self.max_segment_seconds is not None and self._segment_bytes and time.monotonic() - self._segment_start >= self.max_segment_seconds):
+            self._rotate()
+
+    def _open_segment(self) -> None:
+        while True:
+            self._index += 1
+            name = os.path.join(self.directory, f"{self.prefix}_{self._session}_{self._index:04d}{self.suffix}")
+            # Never reuse the file of another session started in the same second
+            if not os.path.exists(name) and not os.path.exists(name + ".gz"):
+                break
+        self.segment_name = name
+        self._file = open(name, "ab", buffering=0)
+        self._segment_bytes = 0
+        self._segment_start = time.monotonic()
+
+    def _rotate(self) -> None:
+        # Closes the current segment (compressing it in the background) and starts a new one
+        self._close_segment()
+        self._open_segment()
+
+    def _close_segment(self) -> None:
+        try:
+            os.fsync(self._file.fileno())
+            self._file.close()
+        except OSError as e:
+            logger.error(f"Error closing the raw archive segment: {e}")
+        self._file = None
+        if self.compress and self._segment_bytes:
+            self._compressors = [thread for thread in self._compressors if thread.is_alive()]
+            thread = threading.Thread(target=compress_segment, args=(self.segment_name,), name="RawArchiveCompressor")
+            thread.start()
+            self._compressors.append(thread)
+        elif not self._segment_bytes:
+            os.remove(self.segment_name)
+
+def compress_segment(file_name: str) -> None:
+    """
+    Compresses a closed segment to <file_name>.gz and deletes the original after the compressed file is synced.
+    """
+    try:
+        with open(file_name, "rb") as source, open(file_name + ".gz.tmp", "wb") as target:
+            with gzip.GzipFile(os.path.basename(file_name), "wb", 6, target) as compressed:
+                shutil.copyfileobj(source, compressed, 2**20)
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(file_name + ".gz.tmp", file_name + ".gz")
+        os.remove(file_name)
+    except OSError as e:
+        logger.error(f"Error compressing {file_name}: {e}")
+
+def segments(directory: str, prefix: str = "raw") -> list[str]:
+    """
+    Returns the segments of an archive (compressed or not) in the order they were written.
+    """
+    names = [name for name in glob.glob(os.path.join(directory, f"{prefix}_*")) if not name.endswith(".tmp")]
+    # A segment being compressed exists in both forms for a moment
+    names = [name for name in names if not (name.endswith(".gz") and name[:-3] in names)]
+    return sorted(names, key=lambda name: name[:-3] if name.endswith(".gz") else name)
+
+def open_segment(file_name: str):
+    """
+    Opens a segment for reading in binary mode, decompressing it if needed.
+    """
+    return gzip.open(file_name, "rb") if file_name.endswith(".gz") else open(file_name, "rb")
+
+def read_lines(directory: str, prefix: str = "raw") -> list[str]:
+    """
+    Reads every line of a text archive, e.g. to pass them to cansattools.txt_to_db.
+    """
+    lines = []
+    for name in segments(directory, prefix):
+        with open_segment(name) as file:
+            lines.extend(line.decode("ascii", "replace") for line in file)
+    return lines
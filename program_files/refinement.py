@@ -0,0 +1,303 @@
+"""
+This module provides the vectorized refinement of the CanSat measurements.
+It flags spike outliers and missing data for a whole series at once, with the same rules as Data.refine.
+OnlineRefiner does the same sample by sample for the live telemetry.
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+    import classes
+except ImportError:
+    from program_files.cansattools import logger_creator
+    import program_files.classes as classes
+logger = logger_creator("refinement")
+
+try:
+    import math
+    import numpy as np
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+def apogee_index(heights: np.ndarray) -> int:
+    """
+    Returns the index of the first maximum of the height, where the ascent ends and the descent begins.
+    """
+    if len(heights) == 0:
+        return 0
+    return int(np.nanargmax(heights))
+
+def phase_thresholds(length: int, threshold: float | tuple[float, float], split_index: int = None) -> float | np.ndarray:
+    """
+    Expands an (ascent, descent) threshold pair to one threshold per sample.
+
+    Args:
+        length (int): The number of samples.
+        threshold (float | tuple[float, float]): A single threshold or an (ascent, descent) pair.
+        split_index (int, optional): The first sample of the descent (see apogee_index). Required for a pair.
+
+    Returns:
+        float | np.ndarray: The threshold itself, or an array with the threshold of every sample.
+    """
+    if not isinstance(threshold, (tuple, list)):
+        return threshold
+    ascent_threshold, descent_threshold = threshold
+    if split_index is None:
+        logger.warning("Phase thresholds were given without a split index, the ascent threshold is used everywhere")
+        return ascent_threshold
+    thresholds = np.full(length, descent_threshold, dtype=np.float64)
+    thresholds[:split_index] = ascent_threshold
+    return thresholds
+
+def detect_outliers(values: np.ndarray, threshold: float | np.ndarray = 10) -> np.ndarray:
+    """
+    Flags spikes: samples which are above (or below) both neighbours and differ from at least one of them by more than the threshold.
+
+    The first and the last sample are never flagged, because they don't have two neighbours.
+    NaN values and their neighbours are never flagged.
+
+    Args:
+        values (np.ndarray): The values of one attribute.
+        threshold (float | np.ndarray, optional): The allowed step, a single value or one per sample. Defaults to 10.
+
+    Returns:
+        np.ndarray: A boolean array, True for the outliers.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    flags = np.zeros(len(values), dtype=np.bool_)
+    if len(values) < 3:
+        return flags
+    current, previous, following = values[1:-1], values[:-2], values[2:]
+    if isinstance(threshold, np.ndarray):
+        threshold = threshold[1:-1]
+    high = (current > previous) & (current > following) & ((current > following + threshold) | (current > previous + threshold))
+    low = (current < previous) & (current < following) & ((current < following - threshold) | (current < previous - threshold))
+    flags[1:-1] = high | low
+    return flags
+
+def detect_gaps(times: np.ndarray, threshold: float | np.ndarray) -> np.ndarray:
+    """
+    Flags samples which arrived more than `threshold` later than the previous one (data was lost before them).
+
+    Like Data.refine, only samples with both neighbours are checked, so the first and the last sample are never flagged.
+
+    Args:
+        times (np.ndarray): The timestamps.
+        threshold (float | np.ndarray): The largest normal time difference, a single value or one per sample.
+
+    Returns:
+        np.ndarray: A boolean array, True for the samples after a gap.
+    """
+    times = np.asarray(times)
+    flags = np.zeros(len(times), dtype=np.bool_)
+    if len(times) < 3:
+        return flags
+    if isinstance(threshold, np.ndarray):
+        threshold = threshold[1:-1]
+    flags[1:-1] = np.abs(np.diff(times[:-1])) > threshold
+    return flags
+
+def refine_columns(data: "classes.SensorColumns", outlier_threshold: float | tuple[float, float] = 10, lacking_data_threshold: float | tuple[float, float] = None, attribute_names: list[str] = None, split_index: int = None) -> None:
+    """
+    Flags the outliers and the missing data of a whole series in one pass.
+
+    It is the vectorized equivalent of calling Data.refine(previous, next, ...) for every sample
+    with both neighbours, and produces the same flags. Flags are only ever set, never cleared,
+    like in Data.refine.
+
+    Args:
+        data (classes.SensorColumns): The columns to refine, modified in place.
+        outlier_threshold (float | tuple[float, float], optional): The allowed step, or an (ascent, descent) pair. Defaults to 10.
+        lacking_data_threshold (float | tuple[float, float], optional): The largest normal time difference, or an
+            (ascent, descent) pair. Missing data is not checked if it is None. Defaults to None.
+        attribute_names (list[str], optional): The attributes to check. Defaults to every attribute with an outlier flag.
+        split_index (int, optional): The first sample of the descent, used by the threshold pairs. Defaults to None.
+    """
+    length = len(data)
+    columns = data.columns
+    if attribute_names is None:
+        attribute_names = [name for name in columns if f"is_{name}_outlier" in columns]
+    try:
+        thresholds = phase_thresholds(length, outlier_threshold, split_index)
+        for attribute_name in attribute_names:
+            flag_name = f"is_{attribute_name}_outlier"
+            columns[flag_name] = columns[flag_name] | detect_outliers(columns[attribute_name], thresholds)
+        if lacking_data_threshold is not None:
+            gap_thresholds = phase_thresholds(length, lacking_data_threshold, split_index)
+            columns["missing_data"] = columns["missing_data"] | detect_gaps(columns["time"], gap_thresholds)
+    except KeyError as e:
+        logger.error(f"Error during refinement, missing column: {e}", exc_info=True)
+
+class P2Quantile:
+    """
+    Running estimate of one quantile with the P-square algorithm (Jain and Chlamtac, 1985).
+
+    It keeps only five markers, so the memory and the cost of an update are constant,
+    no matter how many samples were seen.
+
+    Args:
+        quantile (float): The quantile to estimate, between 0 and 1 (e.g. 0.25 for Q1).
+    """
+    def __init__(self, quantile: float) -> None:
+        self.quantile = quantile
+        self.heights: list[float] = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired_positions = [1, 1 + 2 * quantile, 1 + 4 * quantile, 3 + 2 * quantile, 5]
+        self.increments = [0, quantile / 2, quantile, (1 + quantile) / 2, 1]
+
+    def add(self, value: float) -> None:
+        heights = self.heights
+        if len(heights) < 5:
+            heights.append(value)
+            heights.sort()
+            return
+        positions = self.positions
+
+        # Find the cell of the new value and move the extreme markers if needed
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired_positions[i] += self.increments[i]
+
+        # Adjust the middle markers with the parabolic (or linear) formula
+        for i in range(1, 4):
+            difference = self.desired_positions[i] - positions[i]
+            if (difference >= 1 and positions[i + 1] - positions[i] > 1) or (difference <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if difference > 0 else -1
+                height = heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+                    (positions[i] - positions[i - 1] + step) * (heights[i + 1] - heights[i]) / (positions[i + 1] - positions[i])
+                    + (positions[i + 1] - positions[i] - step) * (heights[i] - heights[i - 1]) / (positions[i] - positions[i - 1]))
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def value(self) -> float:
+        """
+        Returns the current estimate, or None if no value was added yet.
+        """
+        if len(self.heights) == 5:
+            return self.heights[2]
+        if not self.heights:
+            return None
+        # Not enough values for the markers yet, use the exact quantile
+        return float(np.percentile(self.heights, self.quantile * 100))
+
+class OnlineRefiner:
+    """
+    Refines a live series sample by sample, the streaming counterpart of cansattools.refine_data.
+
+    Every value is compared with the prediction of the recent trend: the line through the last two accepted values,
+    extrapolated to the time of the sample (the residual is scaled by the noise of the extrapolation, which grows
+    with its distance). The residual is an outlier outside [Q1 - k * IQR, Q3 + k * IQR], where the
+    quartiles are running P-square estimates of the earlier residuals. The steady climb and descent of the altitude is
+    in the trend, not in the residuals, so it's not flagged, only the spikes are. A flagged value doesn't move the trend,
+    but if `max_consecutive` values in a row are flagged the series really changed, and the trend starts again from them.
+    So a sudden change of the rate (e.g. the launch) can flag a single value, a steady change flags none.
+    Missing data is a time step larger than `lacking_data_threshold` times the running mean time step.
+    Every update costs the same, so it can run on the live stream.
+
+    Args:
+        attribute_names (list[str]): The names of the values passed to `update`, in order.
+        outlier_iqr_multiplier (float, optional): The multiplier of the IQR. Defaults to 4.0.
+        lacking_data_threshold (float, optional): The allowed multiple of the mean time step. Defaults to 10.
+        warmup (int, optional): The number of samples before anything is flagged. Defaults to 20.
+        max_consecutive (int, optional): The number of flagged values in a row after which the trend starts again. Defaults to 2.
+    """
+    def __init__(self, attribute_names: list[str], outlier_iqr_multiplier: float = 4.0, lacking_data_threshold: float = 10, warmup: int = 20,
+                 max_consecutive: int = 2) -> None:
+        self.attribute_names = attribute_names
+        self.outlier_iqr_multiplier = outlier_iqr_multiplier
+        self.lacking_data_threshold = lacking_data_threshold
+        self.warmup = warmup
+        self.max_consecutive = max_consecutive
+        # The quartiles of the residuals of every attribute
+        self.quartiles = [(P2Quantile(0.25), P2Quantile(0.75)) for _ in attribute_names]
+        # The last two accepted (time, value) pairs of every attribute, the trend is the line through them
+        self.trends: list[list[tuple[int, float]]] = [[] for _ in attribute_names]
+        # The smallest non-zero residual, so the values of a quantized sensor which rarely change aren't flagged
+        self.resolutions = [math.inf for _ in attribute_names]
+        self.residual_counts = [0 for _ in attribute_names]
+        self.consecutive_outliers = [0 for _ in attribute_names]
+        self.count = 0
+        self.previous_time = None
+        self.mean_time_step = 0.0
+        self.missing_data_count = 0
+        self.outlier_counts = {name: 0 for name in attribute_names}
+
+    def update(self, time: int, values: tuple) -> tuple[bool, list[bool]]:
+        """
+        Adds a sample and returns its flags.
+
+        Args:
+            time (int): The timestamp of the sample.
+            values (tuple): The values in the order of `attribute_names`.
+
+        Returns:
+            tuple[bool, list[bool]]: The missing data flag and the outlier flag of every value.
+        """
+        missing_data = False
+        if self.previous_time is not None:
+            time_step = time - self.previous_time
+            steps = self.count - 1 # number of time steps before this one
+            if steps > 0 and self.count > self.warmup and time_step > self.lacking_data_threshold * self.mean_time_step:
+                missing_data = True
+                self.missing_data_count += 1
+            self.mean_time_step += (time_step - self.mean_time_step) / (steps + 1)
+        self.previous_time = time
+
+        outliers = []
+        for index, (name, value) in enumerate(zip(self.attribute_names, values)):
+            outliers.append(self._update_value(index, name, time, value))
+        self.count += 1
+        return missing_data, outliers
+
+    def _update_value(self, index: int, name: str, time: int, value: float) -> bool:
+        # NaN values (e.g. a GPS fix without altitude) are neither flagged nor used
+        if value is None or math.isnan(value):
+            return False
+        trend = self.trends[index]
+        if len(trend) < 2:
+            trend.append((time, value))
+            return False
+        (first_time, first_value), (last_time, last_value) = trend
+        horizon = (time - last_time) / (last_time - first_time) if last_time != first_time else 0.0
+        residual = value - (last_value + (last_value - first_value) * horizon)
+        # The noise of the extrapolation grows with the horizon (e.g. after lost data), the residual is scaled
+        # to the noise of an extrapolation by one regular step
+        residual /= math.sqrt((1 + (1 + horizon) ** 2 + horizon ** 2) / 6)
+
+        first_quartile, third_quartile = self.quartiles[index]
+        is_outlier = False
+        if self.residual_counts[index] >= self.warmup:
+            q1, q3 = first_quartile.value(), third_quartile.value()
+            iqr = max(q3 - q1, self.resolutions[index]) if math.isfinite(self.resolutions[index]) else q3 - q1
+            is_outlier = iqr > 0 and not (q1 - self.outlier_iqr_multiplier * iqr <= residual <= q3 + self.outlier_iqr_multiplier * iqr)
+        if is_outlier:
+            self.consecutive_outliers[index] += 1
+            if self.consecutive_outliers[index] < self.max_consecutive:
+                self.outlier_counts[name] += 1
+                return True
+            # Not a spike, the series changed: the trend starts again from this value
+            self.consecutive_outliers[index] = 0
+            trend[:] = [(time, value)]
+            return False
+        self.consecutive_outliers[index] = 0
+        first_quartile.add(residual)
+        third_quartile.add(residual)
+        self.residual_counts[index] += 1
+        if residual != 0:
+            self.resolutions[index] = min(self.resolutions[index], abs(residual))
+        trend[:] = [trend[1], (time, value)]
+        return False
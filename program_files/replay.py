@@ -0,0 +1,360 @@
+"""
+This module replays recorded or synthetic telemetry as if it arrived from the ground station, so the
+real serial path (SerialReader, FrameDecoder, the line parser) can be tested and benchmarked without hardware.
+
+The data can be sent to an in-process FakeSerial, or to a pseudo terminal (Linux) which any program
+(e.g. CanSat_real_time.py) can open like a real serial port.
+
+Usage (prints the name of the port to open, then replays until it's stopped with Ctrl+C):
+    python -m program_files.replay --file datas/raw_realtime_data.txt --rate 50 --pty
+    python -m program_files.replay --synthetic --binary --rate 5000 --measure
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+    import protocol
+    import flight_generator
+except ImportError:
+    from program_files.cansattools import logger_creator
+    import program_files.protocol as protocol
+    import program_files.flight_generator as flight_generator
+logger = logger_creator("replay")
+
+try:
+    import os
+    import gzip
+    import time
+    import threading
+    from collections import deque
+    import numpy as np
+    import serial
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+def messages_from_file(file_name: str) -> list[bytes]:
+    """
+    Reads the lines of a raw text file or archive segment (e.g. datas/raw_realtime/received_<session>_0001.txt.gz)
+    as messages, with line endings.
+    """
+    with (gzip.open(file_name, "rb") if file_name.endswith(".gz") else open(file_name, "rb")) as file:
+        return [line if line.endswith(b"\n") else line + b"\n" for line in file if line.strip()]
+
+def messages_from_flight(flight: "flight_generator.SyntheticFlight", binary: bool = False) -> list[bytes]:
+    """
+    Converts a synthetic flight to the messages of the ground station, ordered by time.
+
+    Args:
+        flight (flight_generator.SyntheticFlight): The flight to send.
+        binary (bool, optional): Encode protocol frames instead of text lines. Defaults to False.
+
+    Returns:
+        list[bytes]: The messages.
+    """
+    if not binary:
+        return [f"{line}\r\n".encode() for line in flight_generator.flight_to_lines(flight)]
+    sources = (
+        ("BMP280", flight.bmp280, ("temperature", "pressure", "height")),
+        ("DHT11", flight.dht11, ("temperature", "humidity")),
+        # Speed and satellites are not simulated
+        ("GPS", flight.gps, ("latitude", "longitude", "altitude", None, None)),
+    )
+    times = np.concatenate([data["time"] for _, data, _ in sources])
+    rows = []
+    for sensor, data, attribute_names in sources:
+        columns = [data[name].tolist() for name in attribute_names if name is not None]
+        if sensor == "GPS":
+            columns += [[0.0] * len(data), [0] * len(data)]
+        rows.extend((sensor, values) for values in zip(*columns))
+    messages = []
+    for sequence, index in enumerate(np.argsort(times, kind="stable").tolist()):
+        sensor, values = rows[index]
+        messages.append(protocol.encode_frame(sensor, sequence, int(times[index]), values))
+    return messages
+
+def corrupt(message: bytes, rng: np.random.Generator) -> bytes:
+    """
+    Damages a message like radio noise does: a random byte is changed, or the message is cut short.
+    """
+    if len(message) < 2:
+        return message
+    if rng.random() < 0.5:
+        position = int(rng.integers(0, len(message) - 1))
+        return message[:position] + bytes([int(rng.integers(0, 256))]) + message[position + 1:]
+    return message[:int(rng.integers(1, len(message)))]
+
+class FakeSerial:
+    """
+    An in-process stand-in for serial.Serial. Written bytes (see `feed`) can be read with `read`,
+    `readline` and `in_waiting`, honouring the read timeout like a real port.
+
+    Args:
+        timeout (float, optional): The read timeout in seconds. Defaults to 0.5.
+    """
+    def __init__(self, timeout: float = 0.5) -> None:
+        self.timeout = timeout
+        self.is_open = True
+        self._buffer = bytearray()
+        self._condition = threading.Condition()
+
+    def feed(self, data: bytes) -> None:
+        """
+        Adds bytes to the receive buffer, as if they arrived on the port.
+        """
+        with self._condition:
+            self._buffer += data
+            self._condition.notify_all()
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self._buffer)
+
+    def read(self, size: int = 1) -> bytes:
+        with self._condition:
+            self._check_open()
+            if not self._buffer:
+                self._condition.wait(self.timeout)
+                self._check_open()
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            return data
+
+    def readline(self) -> bytes:
+        with self._condition:
+            self._check_open()
+            deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+            while (end := self._buffer.find(b"\n")) < 0:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    # Timeout, return what arrived like pyserial does
+                    end = len(self._buffer) - 1
+                    break
+                self._condition.wait(remaining)
+                self._check_open()
+            data = bytes(self._buffer[:end + 1])
+            del self._buffer[:end + 1]
+            return data
+
+    def reset_input_buffer(self) -> None:
+        with self._condition:
+            self._buffer.clear()
+
+    def close(self) -> None:
+        with self._condition:
+            self.is_open = False
+            self._condition.notify_all()
+
+    def _check_open(self) -> None:
+        if not self.is_open:
+            raise serial.PortNotOpenError()
+
+class PtyPort:
+    """
+    A pseudo terminal pair (Linux and macOS). The replay writes to the master side, the program under test
+    opens `port_name` like a real serial port, e.g. serial.Serial(pty_port.port_name).
+    """
+    def __init__(self) -> None:
+        import tty
+        self.master_fd, self._slave_fd = os.openpty()
+        # No echo and no line ending translation, the bytes arrive as they were sent
+        tty.setraw(self._slave_fd)
+        self.port_name = os.ttyname(self._slave_fd)
+
+    def feed(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            written = os.write(self.master_fd, view)
+            view = view[written:]
+
+    def close(self) -> None:
+        os.close(self.master_fd)
+        os.close(self._slave_fd)
+
+class Replayer(threading.Thread):
+    """
+    Sends messages to a port on a daemon thread at a fixed rate.
+
+    Messages are sent in bursts of `burst_size` (the LoRa module also forwards several packets at once),
+    the pause after a burst keeps the mean rate. A `corruption_rate` part of the messages is damaged
+    before sending (see corrupt). The monotonic time of sending every message is kept in `send_times`,
+    so the latency of the consumer can be measured for every message (see message_key).
+
+    Args:
+        port (FakeSerial | PtyPort): The port to write to (anything with a `feed` method).
+        messages (list[bytes]): The messages to send.
+        rate (float, optional): Messages per second, None sends as fast as possible. Defaults to 10.0.
+        burst_size (int, optional): The number of messages sent together. Defaults to 1.
+        corruption_rate (float, optional): The ratio of the damaged messages. Defaults to 0.0.
+        loop (bool, optional): Start again after the last message (send_times is not kept). Defaults to False.
+        seed (int, optional): The seed of the corruption. Defaults to None.
+    """
+    def __init__(self, port, messages: list[bytes], rate: float = 10.0, burst_size: int = 1, corruption_rate: float = 0.0, loop: bool = False, seed: int = None) -> None:
+        super().__init__(name="Replayer", daemon=True)
+        self.port = port
+        self.messages = messages
+        self.rate = rate
+        self.burst_size = max(burst_size, 1)
+        self.corruption_rate = corruption_rate
+        self.loop = loop
+        self.rng = np.random.default_rng(seed)
+        self.send_times = np.full(len(messages), np.nan)
+        self.sent_messages = 0
+        self.corrupted_messages = 0
+        self.finished = threading.Event()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        start = time.monotonic()
+        count = len(self.messages)
+        try:
+            while not self._stop_event.is_set():
+                first = self.sent_messages % count if count else 0
+                burst = self.messages[first:first + self.burst_size]
+                if not burst:
+                    break
+                if self.corruption_rate > 0:
+                    damaged = self.rng.random(len(burst)) < self.corruption_rate
+                    self.corrupted_messages += int(damaged.sum())
+                    burst = [corrupt(message, self.rng) if is_damaged else message for message, is_damaged in zip(burst, damaged)]
+                if self.sent_messages < count:
+                    self.send_times[first:first + len(burst)] = time.monotonic()
+                self.port.feed(b"".join(burst))
+                self.sent_messages += len(burst)
+                if not self.loop and self.sent_messages >= count:
+                    break
+                if self.rate:
+                    # Sleep until the planned time of the next burst, so a slow write doesn't lower the rate
+                    self._stop_event.wait(max(start + self.sent_messages / self.rate - time.monotonic(), 0))
+        except OSError as e:
+            logger.error(f"Replay stopped, the port was closed: {e}")
+        self.finished.set()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """
+        Stops sending and waits for the thread to finish.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+def message_key(message: "bytes | protocol.Frame | line_parser.ParsedLine", binary: bool) -> int | tuple[str, ...]:
+    """
+    Returns the key a sent message and its decoded item are matched by: the sequence number of a binary frame,
+    the fields of a text line.
+    """
+    if isinstance(message, bytes):
+        return protocol.HEADER.unpack_from(message)[2] if binary else tuple(message.decode("ascii", errors="replace").split())
+    return message.sequence if binary else tuple(message.line.split())
+
+def measure_ingest(messages: list[bytes], rate: float = None, binary: bool = False, burst_size: int = 1, corruption_rate: float = 0.0, capacity: int = 4096) -> dict[str, float]:
+    """
+    Replays the messages through a FakeSerial into a SerialReader and decodes them like CanSat_real_time.py does.
+
+    With rate=None the messages are sent as fast as possible, which gives the maximum ingest rate. The latency
+    is measured from sending a message to the end of its decoding. The decoded items are matched to the sent
+    messages by message_key, so the dropped and the damaged messages don't shift the latencies of the others.
+
+    Returns:
+        dict[str, float]: The sent, corrupted, dropped and decoded counts, the throughput (decoded messages/s)
+            and the p50/p95/p99 latency in milliseconds.
+    """
+    try:
+        from serial_reader import SerialReader
+        from line_parser import LineParser
+    except ImportError:
+        from program_files.serial_reader import SerialReader
+        from program_files.line_parser import LineParser
+    port = FakeSerial(timeout=0.05)
+    # The messages are decoded on the reader thread, like in CanSat_real_time.py
+    reader = SerialReader(port, capacity, binary=binary, parser=protocol.FrameDecoder() if binary else LineParser())
+    replayer = Replayer(port, messages, rate, burst_size, corruption_rate)
+    # key -> the indices of the messages with that key, in sending order
+    indices: dict = {}
+    for index, message in enumerate(messages):
+        indices.setdefault(message_key(message, binary), deque()).append(index)
+    last_index = -1
+    latencies = []
+    decoded = 0
+    reader.start()
+    start = time.monotonic()
+    replayer.start()
+    while True:
+        done = replayer.finished.is_set() and port.in_waiting == 0
+        if done:
+            # The reader may still be parsing the last bytes it took from the port, stop joins it after they are stored
+            reader.stop()
+        items = reader.drain()
+        if items:
+            now = time.monotonic()
+            for item in items:
+                candidates = indices.get(message_key(item, binary))
+                # The messages are decoded in order, an earlier one with the same key (a wrapped sequence number) was lost
+                while candidates and candidates[0] < last_index:
+                    candidates.popleft()
+                if candidates:
+                    last_index = candidates.popleft()
+                    latencies.append(now - replayer.send_times[last_index])
+        decoded += len(items)
+        if done:
+            break
+        time.sleep(0.001)
+    elapsed = time.monotonic() - start
+    port.close()
+    latencies = np.array(latencies, dtype=np.float64) * 1000
+    latencies = latencies[np.isfinite(latencies)]
+    p50, p95, p99 = np.percentile(latencies, (50, 95, 99)) if len(latencies) else (np.nan, np.nan, np.nan)
+    return {
+        "sent": replayer.sent_messages,
+        "corrupted": replayer.corrupted_messages,
+        "dropped": reader.dropped_lines,
+        "decoded": decoded,
+        "throughput": decoded / elapsed if elapsed else float("inf"),
+        "latency_p50": p50,
+        "latency_p95": p95,
+        "latency_p99": p99,
+    }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replays recorded or synthetic CanSat telemetry without hardware.")
+    parser.add_argument("--file", help="a raw text file or archive segment to replay, e.g. datas/raw_realtime_data.txt")
+    parser.add_argument("--synthetic", action="store_true", help="replay a synthetic flight")
+    parser.add_argument("--duration", type=float, default=200.0, help="the length of the synthetic flight in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--binary", action="store_true", help="send binary frames instead of text lines (synthetic only)")
+    parser.add_argument("--rate", type=float, default=10.0, help="messages per second, 0 sends as fast as possible")
+    parser.add_argument("--burst", type=int, default=1, help="messages sent together")
+    parser.add_argument("--corruption", type=float, default=0.0, help="the ratio of damaged messages")
+    parser.add_argument("--loop", action="store_true", help="start again after the last message")
+    parser.add_argument("--pty", action="store_true", help="replay to a pseudo terminal and print its name")
+    parser.add_argument("--measure", action="store_true", help="measure the ingest rate and latency of the serial path")
+    args = parser.parse_args()
+
+    if args.file:
+        replay_messages = messages_from_file(args.file)
+    else:
+        replay_messages = messages_from_flight(flight_generator.generate_flight(duration=args.duration, seed=args.seed), args.binary)
+    rate = args.rate or None
+
+    if args.measure:
+        results = measure_ingest(replay_messages, rate, args.binary, args.burst, args.corruption)
+        for key, value in results.items():
+            print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
+    elif args.pty:
+        pty_port = PtyPort()
+        print(f"Replaying {len(replay_messages)} messages on {pty_port.port_name}, stop with Ctrl+C")
+        replayer = Replayer(pty_port, replay_messages, rate, args.burst, args.corruption, args.loop, args.seed)
+        replayer.start()
+        try:
+            while not replayer.finished.wait(0.5):
+                pass
+            # Give the reader time to read the last messages before the pseudo terminal is closed
+            time.sleep(1)
+        except KeyboardInterrupt:
+            replayer.stop()
+        pty_port.close()
+        print(f"Sent {replayer.sent_messages} messages, {replayer.corrupted_messages} corrupted")
+    else:
+        parser.error("choose --pty or --measure")
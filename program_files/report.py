@@ -0,0 +1,308 @@
+"""
+This module exports the graphs of a flight report without pickling matplotlib Figures.
+A graph is recorded as a FigureSpec: the calls made on its axes with their arrays and style arguments.
+The spec is stored as a compressed .npz file (the arrays and a JSON description of the calls), and the PNGs
+are rendered from the specs on headless Agg figures in a process pool, one graph per task.
+plot_graph.py rebuilds the interactive figure from the stored data.
+
+Usage:
+    python -m program_files.report graphs/pkls
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+    import downsampling
+    import trajectory
+except ImportError:
+    from program_files.cansattools import logger_creator
+    import program_files.downsampling as downsampling
+    import program_files.trajectory as trajectory
+logger = logger_creator("report")
+
+try:
+    import os
+    import json
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    import numpy as np
+    import matplotlib.pyplot as plt
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from mpl_toolkits.mplot3d import Axes3D # registers the 3d projection
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+DATA_DIRECTORY = "graphs/pkls"
+PNG_DIRECTORY = "graphs/pngs"
+DATA_EXTENSION = ".npz"
+FORMAT_VERSION = 1
+
+# Calls which are not methods of the axes, they get the axes as their first argument when the figure is built
+HELPERS = {
+    "lod_line": lambda ax, *args, **kwargs: downsampling.LODLine(ax, *args, **kwargs),
+    "trajectory": trajectory.plot_trajectory,
+}
+
+SMALL_SEQUENCE = 8 # shorter lists and tuples (figsize, colours, limits) are kept in the JSON description
+
+class AxesSpec:
+    """
+    Records the calls made on an axes, e.g. `ax.plot(times, heights, '-', color='blue')` or `ax.set_title('GPS 2D Map')`.
+    Any axes method can be called, the return value is always None. Besides them:
+        ax.lod_line(x, y, fmt, **kwargs): a downsampling.LODLine
+        ax.trajectory(x, y, z, **kwargs): a track drawn by trajectory.plot_trajectory
+    """
+    def __init__(self, position: tuple = (1, 1, 1), projection: str = None) -> None:
+        self.position = tuple(position)
+        self.projection = projection
+        self.calls: list[tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        def record(*args, **kwargs) -> None:
+            self.calls.append((name, args, kwargs))
+        return record
+
+class FigureSpec:
+    """
+    Describes a graph of the report as arrays and style arguments instead of matplotlib artists, so it can be
+    stored compactly and rendered in another process.
+
+    Figure methods (e.g. `tight_layout()`, `suptitle(...)`) are recorded like the calls of the axes.
+
+    Args:
+        name (str): The name of the graph, the file names are derived from it.
+        **figure_kwargs: Passed to the figure (figsize, dpi, ...).
+
+    Example:
+        fig = FigureSpec("BMP_raw", figsize=(8, 12))
+        axs = fig.subplots(3)
+        axs[0].lod_line(times, temperatures, '-')
+        axs[0].set_title('BMP280 Temperature Data')
+        fig.tight_layout()
+        export([fig])
+    """
+    def __init__(self, name: str, **figure_kwargs) -> None:
+        self.name = name
+        self.figure_kwargs = figure_kwargs
+        self.axes: list[AxesSpec] = []
+        self.calls: list[tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        def record(*args, **kwargs) -> None:
+            self.calls.append((name, args, kwargs))
+        return record
+
+    def add_subplot(self, *position: int, projection: str = None) -> AxesSpec:
+        """
+        Adds an axes like Figure.add_subplot, e.g. add_subplot(111) or add_subplot(3, 1, 2, projection='3d').
+        """
+        if len(position) == 1:
+            position = tuple(int(digit) for digit in str(position[0]))
+        axes = AxesSpec(position or (1, 1, 1), projection)
+        self.axes.append(axes)
+        return axes
+
+    def subplots(self, rows: int = 1, columns: int = 1) -> list[AxesSpec]:
+        """
+        Adds a grid of axes, returns them row by row.
+        """
+        return [self.add_subplot(rows, columns, index) for index in range(1, rows * columns + 1)]
+
+def _encode(value, arrays: dict[str, np.ndarray]):
+    # Arrays are moved to `arrays` and referenced by their key, the rest has to fit into JSON
+    if isinstance(value, (list, tuple)) and len(value) > SMALL_SEQUENCE:
+        try:
+            candidate = np.asarray(value)
+        except ValueError:
+            candidate = None
+        if candidate is not None and candidate.dtype.kind in "biufUS":
+            value = candidate
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind not in "biufUSM":
+            value = np.asarray(value.tolist())
+        key = f"a{len(arrays)}"
+        arrays[key] = value
+        return {"__array__": key}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, tuple):
+        return {"__tuple__": [_encode(item, arrays) for item in value]}
+    if isinstance(value, list):
+        return [_encode(item, arrays) for item in value]
+    if isinstance(value, dict):
+        return {"__dict__": {str(key): _encode(item, arrays) for key, item in value.items()}}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    raise TypeError(f"{type(value).__name__} can't be stored in a graph, use arrays, numbers and strings")
+
+def _decode(value, arrays: dict[str, np.ndarray]):
+    if isinstance(value, list):
+        return [_decode(item, arrays) for item in value]
+    if isinstance(value, dict):
+        if "__array__" in value:
+            return arrays[value["__array__"]]
+        if "__tuple__" in value:
+            return tuple(_decode(item, arrays) for item in value["__tuple__"])
+        return {key: _decode(item, arrays) for key, item in value["__dict__"].items()}
+    return value
+
+def _encode_calls(calls: list[tuple[str, tuple, dict]], arrays: dict[str, np.ndarray]) -> list:
+    return [[name, [_encode(argument, arrays) for argument in args], {key: _encode(item, arrays) for key, item in kwargs.items()}]
+            for name, args, kwargs in calls]
+
+def _decode_calls(calls: list, arrays: dict[str, np.ndarray]) -> list[tuple[str, tuple, dict]]:
+    return [(name, tuple(_decode(argument, arrays) for argument in args), {key: _decode(item, arrays) for key, item in kwargs.items()})
+            for name, args, kwargs in calls]
+
+def save(spec: FigureSpec, directory: str = DATA_DIRECTORY) -> str:
+    """
+    Stores a graph as <directory>/<name>.npz: the arrays of the calls and a JSON description in the "spec" entry.
+
+    Returns:
+        str: The path of the file.
+    """
+    arrays: dict[str, np.ndarray] = {}
+    description = {
+        "version": FORMAT_VERSION,
+        "name": spec.name,
+        "figure": _encode(spec.figure_kwargs, arrays),
+        "axes": [{"position": list(axes.position), "projection": axes.projection, "calls": _encode_calls(axes.calls, arrays)} for axes in spec.axes],
+        "calls": _encode_calls(spec.calls, arrays),
+    }
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, spec.name + DATA_EXTENSION)
+    np.savez_compressed(path, spec=np.array(json.dumps(description)), **arrays)
+    return path
+
+def load(path: str) -> FigureSpec:
+    """
+    Loads a graph stored by save. No code is run while loading, unlike unpickling a Figure.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        description = json.loads(str(data["spec"]))
+        arrays = {key: data[key] for key in data.files if key != "spec"}
+    if description.get("version", 0) > FORMAT_VERSION:
+        logger.warning(f"{path} was stored by a newer version of the report module")
+    spec = FigureSpec(description["name"], **_decode(description["figure"], arrays))
+    for axes in description["axes"]:
+        spec.axes.append(AxesSpec(axes["position"], axes["projection"]))
+        spec.axes[-1].calls = _decode_calls(axes["calls"], arrays)
+    spec.calls = _decode_calls(description["calls"], arrays)
+    return spec
+
+def build_figure(spec: FigureSpec, pyplot: bool = True) -> Figure:
+    """
+    Replays the calls of a graph on a new figure.
+
+    Args:
+        spec (FigureSpec): The graph.
+        pyplot (bool, optional): Create the figure with pyplot, so plt.show() shows it. Otherwise it's a headless
+            Agg figure, which doesn't depend on the backend of the process. Defaults to True.
+
+    Returns:
+        Figure: The built figure.
+    """
+    if pyplot:
+        fig = plt.figure(**spec.figure_kwargs)
+    else:
+        fig = Figure(**spec.figure_kwargs)
+        FigureCanvasAgg(fig)
+    for axes in spec.axes:
+        ax = fig.add_subplot(*axes.position, projection=axes.projection)
+        for name, args, kwargs in axes.calls:
+            try:
+                if name in HELPERS:
+                    HELPERS[name](ax, *args, **kwargs)
+                else:
+                    getattr(ax, name)(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Error replaying {name} of {spec.name}: {e}")
+    for name, args, kwargs in spec.calls:
+        try:
+            getattr(fig, name)(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Error replaying {name} of {spec.name}: {e}")
+    return fig
+
+def render(spec: FigureSpec, png_directory: str = PNG_DIRECTORY) -> str:
+    """
+    Renders a graph to <png_directory>/<name>.png on a headless figure.
+
+    Returns:
+        str: The path of the PNG.
+    """
+    fig = build_figure(spec, pyplot=False)
+    os.makedirs(png_directory, exist_ok=True)
+    path = os.path.join(png_directory, spec.name + ".png")
+    fig.savefig(path, format="png")
+    return path
+
+def export_graph(spec: FigureSpec | str, directory: str = DATA_DIRECTORY, png_directory: str = PNG_DIRECTORY) -> tuple[str, str | None, str | None]:
+    """
+    Stores a graph and renders its PNG. A path means an already stored graph, only its PNG is rendered.
+    It runs in a worker process, so the errors are returned instead of raised.
+
+    Returns:
+        tuple[str, str | None, str | None]: The name of the graph, the path of the PNG (None if it failed) and the error message.
+    """
+    name = spec if isinstance(spec, str) else spec.name
+    try:
+        if isinstance(spec, str):
+            spec = load(spec)
+        else:
+            save(spec, directory)
+        return name, render(spec, png_directory), None
+    except Exception as e:
+        return name, None, str(e)
+
+def export(specs: list[FigureSpec | str], directory: str = DATA_DIRECTORY, png_directory: str = PNG_DIRECTORY,
+           parallel: bool = True, workers: int = None) -> dict[str, str]:
+    """
+    Stores the graphs of a report and renders their PNGs, every graph in its own task of a process pool.
+
+    Args:
+        specs (list[FigureSpec | str]): The graphs, or the paths of already stored graphs to render again.
+        directory (str, optional): The directory of the plot data. Defaults to DATA_DIRECTORY.
+        png_directory (str, optional): The directory of the PNGs. Defaults to PNG_DIRECTORY.
+        parallel (bool, optional): Use a process pool, otherwise everything runs in this process. Defaults to True.
+        workers (int, optional): The number of worker processes. Defaults to the number of CPUs (at most one per graph).
+
+    Returns:
+        dict[str, str]: The PNG path of every exported graph by name.
+    """
+    results = []
+    if not parallel or len(specs) < 2:
+        results = [export_graph(spec, directory, png_directory) for spec in specs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(specs))) as pool:
+            futures = [pool.submit(export_graph, spec, directory, png_directory) for spec in specs]
+            results = [future.result() for future in as_completed(futures)]
+    exported = {}
+    for name, path, error in results:
+        if error is not None:
+            logger.error(f"Error exporting the graph {name}: {error}")
+        else:
+            exported[name] = path
+    return exported
+
+if __name__ == "__main__":
+    import argparse
+    import glob
+    import time
+
+    parser = argparse.ArgumentParser(description="Renders the PNGs of the stored graphs again in a process pool.")
+    parser.add_argument("directory", nargs="?", default=DATA_DIRECTORY, help="the directory of the stored graphs, e.g. graphs/pkls")
+    parser.add_argument("--png-directory", default=PNG_DIRECTORY)
+    parser.add_argument("--sequential", action="store_true", help="render everything in this process")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths = sorted(glob.glob(os.path.join(args.directory, "*" + DATA_EXTENSION)))
+    exported = export(paths, args.directory, args.png_directory, parallel=not args.sequential, workers=args.workers)
+    print(f"{len(exported)} of {len(paths)} graphs rendered in {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,181 @@
+"""
+This module provides a fixed-capacity, array-backed ring buffer for live telemetry series.
+It is used by the real-time plot and can be passed to the analysis functions as plain NumPy arrays.
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+except ImportError:
+    from program_files.cansattools import logger_creator
+logger = logger_creator("ring_buffer")
+
+try:
+    import numpy as np
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+class RingBuffer:
+    """
+    Stores the last `capacity` rows of a telemetry series in preallocated NumPy columns.
+
+    Every column is allocated twice as long as the capacity and every value is written to
+    both halves, so the window is always available as a contiguous, chronologically ordered
+    view without copying. When the buffer is full, the oldest row is discarded, or appended
+    to `spill_file` if it is given, so nothing is lost on long sessions.
+
+    Args:
+        columns (dict[str, type]): The name and NumPy type of every column, e.g. {"time": np.int64, "temperature": np.float64}.
+        capacity (int, optional): The number of rows kept in memory. Defaults to 10000.
+        spill_file (str, optional): A binary file to append the discarded rows to. Defaults to None.
+        spill_chunk (int, optional): The number of discarded rows collected before writing them to the spill file. Defaults to 1024.
+
+    Example:
+        buffer = RingBuffer({"time": np.int64, "temperature": np.float64}, capacity=3000)
+        buffer.append(1200, 21.5)
+        plt.plot(buffer["time"], buffer["temperature"])
+    """
+    def __init__(self, columns: dict[str, type], capacity: int = 10000, spill_file: str = None, spill_chunk: int = 1024) -> None:
+        self.capacity = capacity
+        self.names = list(columns.keys())
+        self.dtype = np.dtype([(name, column_type) for name, column_type in columns.items()])
+        self._data = {name: np.zeros(2 * capacity, dtype=column_type) for name, column_type in columns.items()}
+        self._length = 0
+        self.total_rows = 0 # every row ever appended, including the discarded ones
+
+        self.spill_file = spill_file
+        self._spill_buffer = np.zeros(spill_chunk, dtype=self.dtype) if spill_file is not None else None
+        self._spill_length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.column(name)
+
+    def append(self, *values) -> None:
+        """
+        Appends one row. The values have to be in the order of the columns.
+        """
+        position = self.total_rows % self.capacity
+        if self._length == self.capacity:
+            if self._spill_buffer is not None:
+                self._spill_row(position)
+        else:
+            self._length += 1
+        for name, value in zip(self.names, values):
+            column = self._data[name]
+            column[position] = value
+            column[position + self.capacity] = value
+        self.total_rows += 1
+
+    def extend(self, *columns) -> None:
+        """
+        Appends many rows at once. Every argument is a sequence of values for one column, in the order of the columns.
+        """
+        count = len(columns[0])
+        if count == 0:
+            return
+        if self._spill_buffer is not None:
+            overflow = self._length + count - self.capacity
+            if overflow > 0:
+                self._flush_spill()
+                # The oldest rows of the window and the new rows which don't fit are leaving the buffer
+                evicted = np.zeros(overflow, dtype=self.dtype)
+                from_window = min(overflow, self._length)
+                for name, new_values in zip(self.names, columns):
+                    evicted[name][:from_window] = self.column(name)[:from_window]
+                    evicted[name][from_window:] = np.asarray(new_values)[:overflow - from_window]
+                self._write_spill(evicted)
+
+        # Only the last `capacity` rows can end up in the buffer
+        skipped = max(0, count - self.capacity)
+        positions = (self.total_rows + np.arange(skipped, count)) % self.capacity
+        for name, new_values in zip(self.names, columns):
+            new_values = np.asarray(new_values)[skipped:]
+            column = self._data[name]
+            column[positions] = new_values
+            column[positions + self.capacity] = new_values
+        self.total_rows += count
+        self._length = min(self.capacity, self._length + count)
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Returns a contiguous, read-only view of a column in chronological order.
+        """
+        end = (self.total_rows - 1) % self.capacity + 1 + self.capacity if self.total_rows else self.capacity
+        view = self._data[name][end - self._length:end]
+        view.flags.writeable = False
+        return view
+
+    def columns(self) -> dict[str, np.ndarray]:
+        """
+        Returns every column as a dictionary of views.
+        """
+        return {name: self.column(name) for name in self.names}
+
+    def last(self, name: str, default: int | float = None) -> int | float:
+        """
+        Returns the newest value of a column, or `default` if the buffer is empty.
+        """
+        if self._length == 0:
+            return default
+        return self.column(name)[-1].item()
+
+    def clear(self) -> None:
+        """
+        Empties the buffer. Rows which are still in memory are written to the spill file first.
+        """
+        self.close()
+
+    def close(self) -> None:
+        """
+        Writes the rows still in memory to the spill file (if there is one) and empties the buffer.
+        """
+        if self._spill_buffer is not None:
+            self._flush_spill()
+            if self._length:
+                window = np.zeros(self._length, dtype=self.dtype)
+                for name in self.names:
+                    window[name] = self.column(name)
+                self._write_spill(window)
+        self._length = 0
+
+    def _spill_row(self, position: int) -> None:
+        for name in self.names:
+            self._spill_buffer[name][self._spill_length] = self._data[name][position]
+        self._spill_length += 1
+        if self._spill_length == len(self._spill_buffer):
+            self._flush_spill()
+
+    def _flush_spill(self) -> None:
+        if self._spill_length:
+            self._write_spill(self._spill_buffer[:self._spill_length])
+            self._spill_length = 0
+
+    def _write_spill(self, rows: np.ndarray) -> None:
+        try:
+            with open(self.spill_file, 'ab') as file:
+                rows.tofile(file)
+        except OSError as e:
+            logger.error(f"Error writing the spill file {self.spill_file}: {e}")
+
+    @staticmethod
+    def read_spill(spill_file: str, columns: dict[str, type]) -> np.ndarray:
+        """
+        Reads a spill file back as a structured array.
+
+        Args:
+            spill_file (str): The path of the spill file.
+            columns (dict[str, type]): The columns of the buffer which wrote the file.
+
+        Returns:
+            np.ndarray: The spilled rows in chronological order.
+        """
+        dtype = np.dtype([(name, column_type) for name, column_type in columns.items()])
+        try:
+            return np.fromfile(spill_file, dtype=dtype)
+        except OSError as e:
+            logger.error(f"Error reading the spill file {spill_file}: {e}")
+            return np.zeros(0, dtype=dtype)
@@ -0,0 +1,138 @@
+"""
+This module provides a background reader for the serial port of the ground station.
+It drains the port at line rate, so the plotting loop never blocks on the radio.
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+except ImportError:
+    from program_files.cansattools import logger_creator
+logger = logger_creator("serial_reader")
+
+try:
+    import threading
+    import time
+    from collections import deque
+    import serial
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+class SerialReader(threading.Thread):
+    """
+    Reads lines from a serial port on a daemon thread and stores them in a bounded ring buffer.
+
+    The consumer (usually the FuncAnimation callback) calls `drain` to get every line
+    received since the previous call. The arrival time of every line is kept as well,
+    `drain_timed` returns it for latency measurements. If the consumer falls behind by more than
+    `capacity` lines, the oldest lines are discarded and counted in `dropped_lines`. The counters are only
+    written by the reader thread, a consumer compares them with the values it saw last time.
+
+    In binary mode the reader doesn't wait for line endings, it stores whatever bytes are
+    waiting on the port as one chunk. The chunks have to be passed to a protocol.FrameDecoder.
+
+    If a parser (protocol.FrameDecoder or line_parser.LineParser) is given, the reader feeds the received
+    bytes to it on its own thread and stores the parsed frames or lines instead of the raw bytes, so the
+    consumer only gets valid telemetry and a noisy burst never stalls it.
+
+    Args:
+        ser (serial.Serial): An opened serial port (or any object with a `readline` method).
+            A read timeout should be set on the port, otherwise `stop` has to wait for the next line.
+        capacity (int, optional): The maximum number of lines (or chunks) kept in the buffer. Defaults to 4096.
+        binary (bool, optional): Read raw chunks instead of lines. Defaults to False.
+        parser (optional): An object with a `feed(bytes) -> list` method, run on the received bytes. Defaults to None.
+        metrics (metrics.PipelineMetrics, optional): Records the time of the parser as the "decode" (binary) or "parse" stage. Defaults to None.
+        archive (raw_archive.RawArchive, optional): Every received line or chunk is queued to it before parsing, its own thread writes it. Defaults to None.
+    """
+    def __init__(self, ser, capacity: int = 4096, binary: bool = False, parser=None, metrics=None, archive=None) -> None:
+        super().__init__(name="SerialReader", daemon=True)
+        self.ser = ser
+        self.capacity = capacity
+        self.binary = binary
+        self.parser = parser
+        self.metrics = metrics
+        self.archive = archive
+        # (time.monotonic() of the arrival, line or parsed item)
+        self.buffer: deque[tuple[float, bytes]] = deque(maxlen=capacity)
+        self.received_lines = 0
+        self.dropped_lines = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                if self.binary:
+                    message: bytes = self.ser.read(self.ser.in_waiting or 1)
+                else:
+                    message: bytes = self.ser.readline()
+                # Taken before anything else, so the latencies include every delay of the reader
+                arrival = time.monotonic()
+            except serial.SerialException as e:
+                logger.error(f"Error reading serial port: {e}")
+                self._stop_event.wait(0.5)
+                continue
+            except Exception as e:
+                # The port was closed under us
+                logger.error(f"Serial reader stopped: {e}", exc_info=True)
+                break
+            if not message:
+                # Read timeout, nothing arrived
+                continue
+            if self.archive is not None:
+                self.archive.write(message)
+            if self.parser is None:
+                self._store(arrival, message)
+                continue
+            start = time.perf_counter()
+            try:
+                items = self.parser.feed(message)
+            except Exception as e:
+                # A parser bug must not stop the reception
+                logger.error(f"Error parsing the received data: {e}", exc_info=True)
+                continue
+            if self.metrics is not None:
+                self.metrics.record("decode" if self.binary else "parse", time.perf_counter() - start)
+            for item in items:
+                self._store(arrival, item)
+
+    def _store(self, arrival: float, item) -> None:
+        if len(self.buffer) == self.capacity:
+            self.dropped_lines += 1
+        self.buffer.append((arrival, item))
+        self.received_lines += 1
+
+    def drain(self) -> list[bytes]:
+        """
+        Returns every line that has accumulated since the last call.
+
+        Returns:
+            list[bytes]: The raw lines in the order they were received.
+        """
+        return [message for _, message in self.drain_timed()]
+
+    def drain_timed(self) -> list[tuple[float, bytes]]:
+        """
+        Returns every line that has accumulated since the last call with its arrival time.
+
+        Returns:
+            list[tuple[float, bytes]]: (time.monotonic() of the arrival, raw line) in the order they were received.
+        """
+        lines: list[tuple[float, bytes]] = []
+        try:
+            while True:
+                lines.append(self.buffer.popleft())
+        except IndexError:
+            pass
+        return lines
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """
+        Stops the reader thread and waits for it to finish.
+
+        Args:
+            timeout (float, optional): The maximum time to wait for the thread in seconds. Defaults to 2.0.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
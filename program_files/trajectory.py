@@ -0,0 +1,116 @@
+"""
+This module draws flight tracks as a single collection artist instead of one line per point pair.
+Every segment of the track can have its own colour (time, altitude, a flag), and very long tracks are decimated before drawing.
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+except ImportError:
+    from program_files.cansattools import logger_creator
+logger = logger_creator("trajectory")
+
+try:
+    import numpy as np
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+    from matplotlib.colors import ListedColormap, BoundaryNorm, Normalize
+    from mpl_toolkits.mplot3d.art3d import Line3DCollection
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+FLAG_COLORS = ("tab:blue", "red") # colours of the unflagged and the flagged segments
+
+def decimation_indices(count: int, max_points: int = None) -> np.ndarray:
+    """
+    Returns the indices of the points kept from a track of `count` points: every n-th point and the last one.
+    """
+    if max_points is None or count <= max_points:
+        return np.arange(count)
+    step = -(-count // max(max_points - 1, 1))
+    indices = np.arange(0, count, step)
+    return indices if indices[-1] == count - 1 else np.append(indices, count - 1)
+
+def segment_values(values: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    """
+    Returns one value per segment of the decimated track. A flag (bool) is set if any skipped point of the segment
+    was flagged, so decimation never hides a flag. Other values are taken from the start of the segment.
+    """
+    values = np.asarray(values)
+    if values.dtype == np.bool_:
+        # The flag of a segment belongs to its end point, like missing_data (data was lost before the sample)
+        return np.maximum.reduceat(values, indices[:-1] + 1) if len(indices) > 1 else np.zeros(0, dtype=np.bool_)
+    return values[indices[:-1]]
+
+def segments(*coordinates: np.ndarray) -> np.ndarray:
+    """
+    Builds the (point count - 1, 2, dimensions) array of the segments of a track, without a Python loop.
+    """
+    points = np.column_stack([np.asarray(coordinate, dtype=np.float64) for coordinate in coordinates])
+    return np.stack((points[:-1], points[1:]), axis=1)
+
+def plot_trajectory(ax: plt.Axes, x: np.ndarray, y: np.ndarray, z: np.ndarray = None, values: np.ndarray = None, cmap: str = "viridis",
+                    color: str = None, mask: np.ndarray = None, max_points: int = None, autoscale: bool = True, **kwargs) -> LineCollection:
+    """
+    Draws a track on a 2D or 3D axes as a single LineCollection or Line3DCollection.
+
+    Args:
+        ax (plt.Axes): The axes, a 3D axes if `z` is given.
+        x (np.ndarray): The first coordinates of the points.
+        y (np.ndarray): The second coordinates of the points.
+        z (np.ndarray, optional): The third coordinates of the points. Defaults to None (2D).
+        values (np.ndarray, optional): The value of every point the colours are taken from, e.g. the times or the altitudes.
+            A bool array (e.g. the outlier flags) is drawn with FLAG_COLORS. Defaults to None.
+        cmap (str, optional): The colour map of `values`. Defaults to "viridis".
+        color (str, optional): A single colour, used if `values` is not given. Defaults to "C0".
+        mask (np.ndarray, optional): Only the segments ending at the True points are drawn, e.g. the missing data flags. Defaults to None.
+        max_points (int, optional): The track is decimated to about this many points. Defaults to None (every point).
+        autoscale (bool, optional): Extend the limits of the axes to the track. Defaults to True.
+        **kwargs: Passed to the collection (linewidth, label, zorder, ...).
+
+    Returns:
+        LineCollection: The added collection. Its `set_array` values can be used for a colour bar.
+    """
+    count = len(x)
+    indices = decimation_indices(count, max_points)
+    coordinates = [np.asarray(coordinate)[indices] for coordinate in ((x, y) if z is None else (x, y, z))]
+    lines = segments(*coordinates)
+    if values is not None:
+        kwargs["array"] = segment_values(values, indices)
+        if kwargs["array"].dtype == np.bool_:
+            kwargs["array"] = kwargs["array"].astype(np.int64)
+            kwargs["cmap"] = ListedColormap(FLAG_COLORS)
+            kwargs["norm"] = BoundaryNorm((-0.5, 0.5, 1.5), 2)
+        else:
+            kwargs["cmap"] = cmap
+            kwargs.setdefault("norm", Normalize(*_finite_range(kwargs["array"])))
+    else:
+        kwargs["color"] = color if color is not None else "C0"
+    if mask is not None:
+        selected = segment_values(np.asarray(mask, dtype=np.bool_), indices)
+        lines = lines[selected]
+        if "array" in kwargs:
+            kwargs["array"] = kwargs["array"][selected]
+
+    if z is None:
+        collection = LineCollection(lines, **kwargs)
+        ax.add_collection(collection)
+        if autoscale and len(lines):
+            ax.update_datalim(lines.reshape(-1, 2))
+            ax.autoscale_view()
+    else:
+        had_data = ax.has_data()
+        collection = Line3DCollection(lines, **kwargs)
+        ax.add_collection3d(collection)
+        if autoscale and len(lines):
+            points = lines.reshape(-1, 3)
+            ax.auto_scale_xyz(points[:, 0], points[:, 1], points[:, 2], had_data=had_data)
+    return collection
+
+def _finite_range(values: np.ndarray) -> tuple[float, float]:
+    finite = values[np.isfinite(values)] if values.dtype.kind == "f" else values
+    if len(finite) == 0:
+        return 0.0, 1.0
+    low, high = float(finite.min()), float(finite.max())
+    return (low, high) if high > low else (low - 0.5, high + 0.5)
@@ -0,0 +1,159 @@
+"""
+This module estimates the wind from the GPS track of the CanSat.
+Under the parachute the CanSat drifts with the air, so the horizontal speed of the descent is the wind at that height.
+The track is converted to local metres, and the drift is averaged in altitude bins into a wind profile.
+"""
+
+__author__ = "KarmaDemon"
+
+try:
+    from cansattools import logger_creator
+    import kinematics
+except ImportError:
+    from program_files.cansattools import logger_creator
+    import program_files.kinematics as kinematics
+logger = logger_creator("wind")
+
+try:
+    from collections import namedtuple
+    import numpy as np
+except ImportError as e:
+    logger.error(f"Error importing module: {e}")
+
+EARTH_RADIUS = 6371000.0 # m, mean radius, the local plane is accurate to centimetres over the few kilometres of a flight
+
+# altitudes: the centres of the bins (m), east and north: the wind velocity (m/s, the direction it blows towards),
+# speed (m/s), direction: where the wind blows from (degrees, 270 = western wind), counts: the samples of every bin.
+# Bins without samples are left out.
+WindProfile = namedtuple("WindProfile", ["altitudes", "east", "north", "speed", "direction", "counts"])
+
+def to_enu(latitudes: np.ndarray, longitudes: np.ndarray, altitudes: np.ndarray, origin: tuple[float, float, float] = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Converts GPS fixes to local east, north, up coordinates in metres.
+
+    Args:
+        latitudes (np.ndarray): The latitudes in degrees.
+        longitudes (np.ndarray): The longitudes in degrees.
+        altitudes (np.ndarray): The altitudes in metres.
+        origin (tuple[float, float, float], optional): The (latitude, longitude, altitude) of the origin. Defaults to the first fix.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: The east, north and up coordinates.
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    altitudes = np.asarray(altitudes, dtype=np.float64)
+    if origin is None:
+        origin = (latitudes[0], longitudes[0], altitudes[0]) if len(latitudes) else (0.0, 0.0, 0.0)
+    origin_latitude, origin_longitude, origin_altitude = origin
+    north = np.radians(latitudes - origin_latitude) * EARTH_RADIUS
+    east = np.radians(longitudes - origin_longitude) * EARTH_RADIUS * np.cos(np.radians(origin_latitude))
+    return east, north, altitudes - origin_altitude
+
+def descent_mask(altitudes: np.ndarray, ground_margin: float = 20.0) -> np.ndarray:
+    """
+    Flags the samples of the parachute descent: after the apogee and more than `ground_margin` metres above the landing.
+    """
+    altitudes = np.asarray(altitudes, dtype=np.float64)
+    mask = np.zeros(len(altitudes), dtype=np.bool_)
+    if len(altitudes) == 0:
+        return mask
+    apogee = int(np.nanargmax(altitudes))
+    mask[apogee + 1:] = altitudes[apogee + 1:] > altitudes[-1] + ground_margin
+    return mask
+
+def estimate_profile(times: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray, altitudes: np.ndarray, missing_data: np.ndarray = None,
+                     valid: np.ndarray = None, bin_size: float = 50.0, min_samples: int = 2) -> WindProfile:
+    """
+    Estimates the wind profile from the drift of the descent.
+
+    The horizontal velocity of every fix is the central difference of the local coordinates (see kinematics),
+    without spanning the gaps flagged as missing data. The velocities of the descent are averaged per altitude bin.
+
+    Args:
+        times (np.ndarray): The timestamps in milliseconds.
+        latitudes (np.ndarray): The latitudes in degrees.
+        longitudes (np.ndarray): The longitudes in degrees.
+        altitudes (np.ndarray): The altitudes in metres.
+        missing_data (np.ndarray, optional): The missing data flags. Defaults to None.
+        valid (np.ndarray, optional): The fixes to use, e.g. the ones which are not outliers. Defaults to every fix.
+        bin_size (float, optional): The height of an altitude bin in metres. Defaults to 50.
+        min_samples (int, optional): Bins with fewer samples are left out. Defaults to 2.
+
+    Returns:
+        WindProfile: The wind of every altitude bin, from the lowest to the highest.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    altitudes = np.asarray(altitudes, dtype=np.float64)
+    if valid is None:
+        valid = np.ones(len(times), dtype=np.bool_)
+    valid = np.asarray(valid, dtype=np.bool_)
+    segments = kinematics.segment_ids(len(times), missing_data)[valid]
+    east, north, _ = to_enu(latitudes, longitudes, altitudes)
+    times, east, north, altitudes = times[valid] / 1000, east[valid], north[valid], altitudes[valid]
+
+    east_speed = kinematics.central_derivative(times, east, segments)
+    north_speed = kinematics.central_derivative(times, north, segments)
+    # A fix without a neighbour in its segment has no velocity
+    isolated = np.ones(len(times), dtype=np.bool_)
+    if len(times) > 1:
+        same_segment = segments[1:] == segments[:-1]
+        isolated[1:] &= ~same_segment
+        isolated[:-1] &= ~same_segment
+    used = descent_mask(altitudes) & ~isolated
+
+    if not used.any():
+        logger.warning("There is no usable descent in the GPS data, the wind can't be estimated")
+        empty = np.zeros(0)
+        return WindProfile(empty, empty, empty, empty, empty, np.zeros(0, dtype=np.int64))
+    bins = np.floor(altitudes[used] / bin_size).astype(np.int64)
+    first_bin = bins.min()
+    bins -= first_bin
+    counts = np.bincount(bins)
+    filled = counts >= max(min_samples, 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_east = np.bincount(bins, weights=east_speed[used]) / counts
+        mean_north = np.bincount(bins, weights=north_speed[used]) / counts
+    mean_east, mean_north, counts = mean_east[filled], mean_north[filled], counts[filled]
+    centres = (np.flatnonzero(filled) + first_bin + 0.5) * bin_size
+    return WindProfile(centres, mean_east, mean_north, np.hypot(mean_east, mean_north), wind_direction(mean_east, mean_north), counts)
+
+def wind_direction(east: np.ndarray, north: np.ndarray) -> np.ndarray:
+    """
+    Converts wind velocities to the meteorological direction: where the wind blows from, in degrees clockwise from north.
+    """
+    return np.degrees(np.arctan2(-np.asarray(east), -np.asarray(north))) % 360
+
+def average_wind(profile: WindProfile) -> tuple[float, float]:
+    """
+    Returns the average wind speed (m/s) and direction (degrees, where it blows from) of a profile, weighted by the samples of the bins.
+    The velocities are averaged as vectors, so the directions 350 and 10 average to 0, not 180.
+    """
+    if len(profile.counts) == 0:
+        return 0.0, 0.0
+    east = np.average(profile.east, weights=profile.counts)
+    north = np.average(profile.north, weights=profile.counts)
+    return float(np.hypot(east, north)), float(wind_direction(east, north))
+
+def wind_at(profile: WindProfile, altitudes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Interpolates the east and north wind of a profile at any altitudes (an array of any shape).
+    Above and below the profile the wind of the highest and the lowest bin is used.
+    """
+    altitudes = np.asarray(altitudes, dtype=np.float64)
+    if len(profile.altitudes) == 0:
+        return np.zeros(altitudes.shape), np.zeros(altitudes.shape)
+    return np.interp(altitudes, profile.altitudes, profile.east), np.interp(altitudes, profile.altitudes, profile.north)
+
+def wind_grid(profile: WindProfile, altitudes: np.ndarray) -> np.ndarray:
+    """
+    Broadcasts the profile onto a grid: returns the (east, north, up) wind vector of every grid point as an array
+    of shape altitudes.shape + (3,). The wind only depends on the altitude, the vertical wind is 0.
+
+    Example:
+        latitude_grid, longitude_grid, altitude_grid = np.meshgrid(latitudes, longitudes, altitudes)
+        vectors = wind_grid(profile, altitude_grid)
+        ax.quiver(latitude_grid, longitude_grid, altitude_grid, vectors[..., 1], vectors[..., 0], vectors[..., 2])
+    """
+    east, north = wind_at(profile, altitudes)
+    return np.stack((east, north, np.zeros_like(east)), axis=-1)